@@ -0,0 +1,99 @@
+"""
+数据库连接模块
+集中创建引擎和会话工厂，供 main.py 与命令行工具共用（导入时不会启动调度器）
+
+SQLite 连接建立时统一设置 WAL、synchronous=NORMAL、busy_timeout 等参数：
+WAL 模式下读不阻塞写、写不阻塞读，多个线程/工作进程并发写入时等待锁释放而不是直接报 database is locked
+"""
+import os
+from typing import Dict
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from utils.session_tracker import SessionTracker, TrackedSession
+
+# 数据库文件默认放在 backend 目录下，不受启动时工作目录影响
+DEFAULT_DATABASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dca.db")
+DATABASE_PATH = os.path.abspath(os.getenv("DCA_DATABASE_PATH", DEFAULT_DATABASE_PATH))
+DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
+
+# 等待写锁的最长时间（毫秒）
+BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# 每个连接建立时执行的 PRAGMA
+SQLITE_PRAGMAS: Dict[str, str] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",  # WAL 模式下 NORMAL 只在检查点时 fsync，断电最多丢失最近的事务，不会损坏数据库
+    "busy_timeout": str(BUSY_TIMEOUT_MS),
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)),
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-65536"),  # 负数单位为KB，即64MB
+    "temp_store": "MEMORY",
+}
+
+# 连接池：API线程、执行引擎、调度和对账线程共用
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "20"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# 调试模式：追踪每个会话的创建位置和存活时间，用于定位未关闭的会话
+SESSION_TRACKING = os.getenv("DB_SESSION_TRACKING", "").lower() in ("1", "true", "yes")
+
+
+def create_sqlite_engine(url: str = DATABASE_URL, pragmas: Dict[str, str] = SQLITE_PRAGMAS, **kwargs):
+    """
+    创建应用 PRAGMA 的 SQLite 引擎
+
+    Args:
+        url: 数据库地址
+        pragmas: 连接建立时执行的 PRAGMA，为空时不做设置
+        kwargs: 传给 create_engine 的其他参数（如连接池配置）
+    """
+    options = {
+        "connect_args": {"check_same_thread": False, "timeout": BUSY_TIMEOUT_MS / 1000},
+        "pool_size": POOL_SIZE,
+        "max_overflow": POOL_MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+    }
+    options.update(kwargs)
+    sqlite_engine = create_engine(url, **options)
+
+    if pragmas:
+        @event.listens_for(sqlite_engine, "connect")
+        def _apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for name, value in pragmas.items():
+                    cursor.execute(f"PRAGMA {name}={value}")
+            finally:
+                cursor.close()
+
+    return sqlite_engine
+
+
+def get_database_settings(target_engine=None) -> Dict:
+    """读取数据库当前生效的 PRAGMA 和连接池状态（调试用）"""
+    target_engine = target_engine or engine
+    settings = {"path": DATABASE_PATH, "pool": target_engine.pool.status()}
+    with target_engine.connect() as connection:
+        for name in SQLITE_PRAGMAS:
+            settings[name] = connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+    return settings
+
+
+def get_session_stats() -> Dict:
+    """读取会话追踪统计，未开启追踪时只返回连接池占用情况"""
+    stats = session_tracker.get_stats() if session_tracker is not None else {"enabled": False}
+    stats["pool_checked_out"] = engine.pool.checkedout()
+    return stats
+
+
+engine = create_sqlite_engine()
+session_tracker = SessionTracker() if SESSION_TRACKING else None
+if session_tracker is not None:
+    SessionLocal = sessionmaker(
+        autocommit=False, autoflush=False, bind=engine,
+        class_=TrackedSession, info={"tracker": session_tracker}
+    )
+else:
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
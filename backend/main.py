@@ -1,12 +1,13 @@
-from fastapi import FastAPI, HTTPException, Body
+from fastapi import FastAPI, HTTPException, Body, Query, Header, Request, Response, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import func, or_, and_, text
+from sqlalchemy.orm import Session
 from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime, timedelta
+import asyncio
 import threading
 import json
 import logging
@@ -15,33 +16,42 @@ import time
 import pytz
 
 # 导入自定义模块
-from models import Base, UserConfig, DCAPlan, Transaction, AssetHistory, encrypt_text, decrypt_text
-from okx_api import OKXClient, get_popular_coins_public
+from models import Base, UserConfig, DCAPlan, Transaction, AssetHistory, encrypt_text, decrypt_text, get_relay_session_fernet
+from database import engine, SessionLocal, get_database_settings, get_session_stats
+from okx_api import get_popular_coins_public
 from proxy_api import OKXProxyClient
 
 # 导入服务
 from services.config_service import ConfigService
 from services.market_service import MarketService
-
-# 配置日志
+from services.position_service import PositionService
+from services.execution_engine import ExecutionEngine
+from services.order_batcher import OrderBatcher
+from services.dispatcher import PlanDispatcher, build_schedule_spec
+from services.scheduler_store import SchedulerStateStore
+from services.leader_election import LeaderElection
+from services.sync_state import SyncStateService, PLAN_VERSION, CONFIG_VERSION, FILL_VERSION, TRANSACTION_VERSION
+from services.transaction_service import FILL_PENDING, apply_fill_columns, resolve_trade_fields, encode_cursor, decode_cursor
+from services.fill_reconciler import FillReconciler
+from services.event_stream import EventBroadcaster, LiveStatePublisher
+from services.proxy_relay import ProxyRelay, SessionError, SESSION_EXPIRED
+from services.asset_series import AssetSeriesStore, SAMPLE_INTERVAL as ASSET_SAMPLE_INTERVAL
+from migrations import run_migrations
+from services.ticker_feed import TickerFeed
+from utils.ticker_snapshot import TickerSnapshot, TickerSnapshotError, shared_ticker_snapshots
+from utils.logging_config import setup_logging, log_payload
+from utils.cache import shared_caches, EVENT_TRANSACTION, EVENT_PLAN, EVENT_CONFIG
+from utils.etag import BOOT_ID, compute_etag, conditional_response, set_etag
+from utils.fast_json import fast_json_response
+from utils.compression import CompressionMiddleware
+
+# 配置日志：请求线程只入队，由后台线程写入轮转的JSON-lines文件
 log_dir = os.path.dirname(os.path.abspath(__file__))
 log_file = os.path.join(log_dir, 'dca_service.log')
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler(log_file)
-    ]
-)
+setup_logging(log_file)
 logger = logging.getLogger("dca-service")
 
-DATABASE_URL = "sqlite:///./dca.db"
-
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
 app = FastAPI()
 
 # 允许所有来源跨域（开发环境用，生产建议指定域名）
@@ -51,28 +61,95 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+# 超过阈值的响应按 Accept-Encoding 压缩（br/gzip），SSE 等流式响应不压缩
+app.add_middleware(CompressionMiddleware)
+
 # 使用Asia/Shanghai时区
 TIMEZONE = pytz.timezone('Asia/Shanghai')
 
-# 配置调度器，使用Asia/Shanghai时区
+# 配置调度器，使用Asia/Shanghai时区；以暂停状态启动，只有主进程恢复运行
 scheduler = BackgroundScheduler(timezone=TIMEZONE)
-scheduler.start()
-lock = threading.Lock()
+scheduler.start(paused=True)
+
+# 创建数据库表并执行迁移（在同一个写锁事务中，多个工作进程同时启动时串行执行）
+run_migrations(engine, Base.metadata)
+
+# 多工作进程同步：任务、配置修改后递增版本号，其他进程在选举心跳中刷新本地状态
+sync_state = SyncStateService(engine)
+
+def notify_config_changed():
+    """配置修改：使本进程缓存失效，并通知其他工作进程"""
+    shared_caches.emit(EVENT_CONFIG)
+    sync_state.bump(CONFIG_VERSION)
+
+
+def notify_transactions_changed():
+    """交易记录或成交信息写入：使本进程资产缓存失效，并通知其他工作进程"""
+    shared_caches.emit(EVENT_TRANSACTION)
+    try:
+        sync_state.bump(TRANSACTION_VERSION)
+    except Exception as e:
+        logger.warning(f"递增交易版本号失败: {str(e)}")
 
-# 创建数据库表
-Base.metadata.create_all(bind=engine)
 
 # 初始化配置服务
-config_service = ConfigService(SessionLocal)
+config_service = ConfigService(SessionLocal, on_change=notify_config_changed)
+
+# 初始化持仓台账服务
+position_service = PositionService(SessionLocal)
+
+# 资产时间序列：定时采样并汇总到小时/天精度
+asset_series = AssetSeriesStore(SessionLocal, TIMEZONE)
 
 # 导入工具模块
 from utils.environment import is_local_environment
-from utils.client_factory import create_okx_client
+from utils.client_factory import (
+    create_okx_client, create_async_okx_client, get_direct_okx_client, get_direct_async_okx_client,
+    get_client_registry_stats, get_relay_registry_stats
+)
+
+def fetch_feed_tickers():
+    """行情推送的REST回退：拉取全量现货行情（绕过客户端缓存）"""
+    api_config = config_service.get_decrypted_api_config()
+    if not api_config:
+        return {"code": "ERROR", "msg": "未配置API密钥", "data": []}
+    client = create_okx_client(
+        api_key=api_config['api_key'],
+        secret_key=api_config['secret_key'],
+        passphrase=api_config['passphrase']
+    )
+    return client._request('GET', 'market/tickers', params={'instType': 'SPOT'}, use_cache=False)
+
+# 行情推送服务，在启动事件中开始订阅
+ticker_feed = TickerFeed(rest_fetcher=fetch_feed_tickers)
 
 # 初始化市场服务（必须在create_okx_client函数定义之后）
-market_service = MarketService(SessionLocal, config_service, create_okx_client)
+market_service = MarketService(SessionLocal, config_service, create_okx_client, create_async_okx_client, ticker_feed)
+
+def refresh_ticker_feed_symbols():
+    """根据配置币种和启用的定投计划更新行情订阅列表"""
+    try:
+        coins = MarketService._normalize_coins(config_service.get_coin_config())
+        symbols = {f"{coin}-USDT" for coin in coins}
+        db = SessionLocal()
+        try:
+            rows = db.query(DCAPlan.symbol).filter(DCAPlan.status == "enabled").distinct().all()
+            symbols.update(row.symbol for row in rows)
+        finally:
+            db.close()
+        ticker_feed.set_symbols(symbols)
+    except Exception as e:
+        logger.exception(f"更新行情订阅列表异常: {str(e)}")
+
+def get_feed_snapshot(net_balances):
+    """从行情推送的内存价格表读取持仓币种行情，任一币种缺失或过期时返回None"""
+    found, missing = ticker_feed.get_tickers(f"{symbol}-USDT" for symbol in net_balances)
+    if missing:
+        return None
+    return TickerSnapshot(found.values())
 
 # Pydantic 模型
 class DCAPlanCreate(BaseModel):
@@ -107,18 +184,55 @@ class ConfigResponse(BaseModel):
     passphrase: str = ""
     selected_coins: List[str] = []
 
-def get_db():
-    db = SessionLocal()
+def get_db(request: Request):
+    """请求级数据库会话依赖：请求结束后（包括抛出异常时）由 FastAPI 关闭会话"""
+    db = SessionLocal(info={"site": f"{request.method} {request.url.path}"})
     try:
         yield db
     finally:
         db.close()
 
 
+def record_transaction(db, plan, status, response_data, fill_status=None):
+    """
+    保存交易记录并提交：同时填充成交列和执行次数，成功交易在同一事务中计入持仓台账
+
+    Args:
+        fill_status: 成交对账状态，为空时按响应中的成交详情推断
+    """
+    # 执行次数为该任务截至本条记录的成功执行次数
+    success_count = db.query(func.count(Transaction.id)).filter(
+        Transaction.plan_id == plan.id,
+        Transaction.status == "success"
+    ).scalar() or 0
+    
+    transaction = Transaction(
+        plan_id=plan.id,
+        symbol=plan.symbol,
+        amount=plan.amount,
+        direction=plan.direction or "buy",
+        status=status,
+        response=json.dumps(response_data),
+        execution_count=success_count + 1 if status == "success" else success_count,
+        executed_at=datetime.now(TIMEZONE)
+    )
+    apply_fill_columns(transaction, response_data)
+    if fill_status:
+        transaction.fill_status = fill_status
+    db.add(transaction)
+    db.flush()
+    if status == "success":
+        position_service.apply_transaction(db, transaction)
+    db.commit()
+    notify_transactions_changed()
+    return transaction
+
+
 def execute_dca_task(plan_id: int):
     """执行DCA任务"""
     logger.info(f"执行定投任务 ID: {plan_id}")
-    with lock:
+    # 同一任务串行执行，配合下方的当日执行记录检查保证幂等
+    with execution_engine.plan_lock(plan_id):
         db = SessionLocal()
         try:
             # 获取任务信息
@@ -173,132 +287,86 @@ def execute_dca_task(plan_id: int):
             if side == "sell":
                 # 获取币种信息，例如BTC-USDT中的BTC
                 base_currency = plan.symbol.split('-')[0]
-                balance_result = client.get_trading_balance()
+                # 同一币种的卖出串行执行：查询余额到下单之间不能被其他卖出任务插入
+                with execution_engine.currency_lock(base_currency):
+                    balance_result = client.get_trading_balance()
                 
-                if balance_result.get('code') != '0':
-                    logger.error(f"任务 {plan_id} 获取账户余额失败: {balance_result.get('msg', '未知错误')}")
-                    # 记录失败交易
-                    transaction = Transaction(
-                        plan_id=plan.id,
-                        symbol=plan.symbol,
-                        amount=plan.amount,
-                        direction=plan.direction,
-                        status="failed",
-                        response=json.dumps({"error": f"获取账户余额失败: {balance_result.get('msg', '未知错误')}"}),
-                        executed_at=datetime.now(TIMEZONE)
-                    )
-                    db.add(transaction)
-                    db.commit()
-                    return
+                    if balance_result.get('code') != '0':
+                        logger.error(f"任务 {plan_id} 获取账户余额失败: {balance_result.get('msg', '未知错误')}")
+                        # 记录失败交易
+                        record_transaction(db, plan, "failed", {"error": f"获取账户余额失败: {balance_result.get('msg', '未知错误')}"})
+                        return
                 
-                # 查找对应币种的可用余额
-                available_amount = 0
-                for item in balance_result.get('data', []):
-                    for balance in item.get('details', []):
-                        if balance.get('ccy') == base_currency:
-                            available_amount = float(balance.get('availBal', 0))
-                            break
+                    # 查找对应币种的可用余额
+                    available_amount = 0
+                    for item in balance_result.get('data', []):
+                        for balance in item.get('details', []):
+                            if balance.get('ccy') == base_currency:
+                                available_amount = float(balance.get('availBal', 0))
+                                break
                 
-                if available_amount <= 0:
-                    logger.error(f"任务 {plan_id} 卖出失败: {base_currency}余额不足")
-                    # 记录失败交易
-                    transaction = Transaction(
-                        plan_id=plan.id,
-                        symbol=plan.symbol,
-                        amount=plan.amount,
-                        direction=plan.direction,
-                        status="failed",
-                        response=json.dumps({"error": f"{base_currency}余额不足"}),
-                        executed_at=datetime.now(TIMEZONE)
-                    )
-                    db.add(transaction)
-                    db.commit()
-                    return
+                    if available_amount <= 0:
+                        logger.error(f"任务 {plan_id} 卖出失败: {base_currency}余额不足")
+                        # 记录失败交易
+                        record_transaction(db, plan, "failed", {"error": f"{base_currency}余额不足"})
+                        return
                 
-                # 获取当前市场价格，计算可以卖出的数量
-                ticker_result = client.get_ticker(plan.symbol)
-                if ticker_result.get('code') != '0':
-                    logger.error(f"任务 {plan_id} 获取市场价格失败: {ticker_result.get('msg', '未知错误')}")
-                    # 记录失败交易
-                    transaction = Transaction(
-                        plan_id=plan.id,
-                        symbol=plan.symbol,
-                        amount=plan.amount,
-                        direction=plan.direction,
-                        status="failed",
-                        response=json.dumps({"error": f"获取市场价格失败: {ticker_result.get('msg', '未知错误')}"}),
-                        executed_at=datetime.now(TIMEZONE)
-                    )
-                    db.add(transaction)
-                    db.commit()
-                    return
+                    # 获取当前市场价格，计算可以卖出的数量（不使用客户端缓存的旧价格）
+                    ticker_result = client._request('GET', 'market/ticker', params={'instId': plan.symbol}, use_cache=False)
+                    if ticker_result.get('code') != '0':
+                        logger.error(f"任务 {plan_id} 获取市场价格失败: {ticker_result.get('msg', '未知错误')}")
+                        # 记录失败交易
+                        record_transaction(db, plan, "failed", {"error": f"获取市场价格失败: {ticker_result.get('msg', '未知错误')}"})
+                        return
                 
-                current_price = float(ticker_result['data'][0].get('last', 0))
-                if current_price <= 0:
-                    logger.error(f"任务 {plan_id} 获取市场价格异常: {current_price}")
-                    # 记录失败交易
-                    transaction = Transaction(
-                        plan_id=plan.id,
-                        symbol=plan.symbol,
-                        amount=plan.amount,
-                        direction=plan.direction,
-                        status="failed",
-                        response=json.dumps({"error": f"获取市场价格异常: {current_price}"}),
-                        executed_at=datetime.now(TIMEZONE)
-                    )
-                    db.add(transaction)
-                    db.commit()
-                    return
+                    current_price = float(ticker_result['data'][0].get('last', 0))
+                    if current_price <= 0:
+                        logger.error(f"任务 {plan_id} 获取市场价格异常: {current_price}")
+                        # 记录失败交易
+                        record_transaction(db, plan, "failed", {"error": f"获取市场价格异常: {current_price}"})
+                        return
                 
-                # 计算卖出数量：如果plan.amount小于等于可用余额*当前价格，则按照plan.amount/当前价格计算卖出数量
-                # 否则卖出全部可用余额
-                if plan.amount <= available_amount * current_price:
-                    sell_size = plan.amount / current_price
-                else:
-                    sell_size = available_amount
+                    # 计算卖出数量：如果plan.amount小于等于可用余额*当前价格，则按照plan.amount/当前价格计算卖出数量
+                    # 否则卖出全部可用余额
+                    if plan.amount <= available_amount * current_price:
+                        sell_size = plan.amount / current_price
+                    else:
+                        sell_size = available_amount
                 
-                # 确保卖出数量不超过可用余额
-                sell_size = min(sell_size, available_amount)
+                    # 确保卖出数量不超过可用余额
+                    sell_size = min(sell_size, available_amount)
                 
-                # 处理精度问题：OKX对不同币种有不同的精度要求
-                # 通常BTC是8位小数，ETH是6位小数，其他币种可能有不同要求
-                # 这里我们根据币种类型设置合适的精度
-                if base_currency == 'BTC':
-                    sell_size = round(sell_size, 8)  # BTC通常使用8位小数
-                elif base_currency == 'ETH':
-                    sell_size = round(sell_size, 6)  # ETH通常使用6位小数
-                else:
-                    sell_size = round(sell_size, 4)  # 其他币种默认使用4位小数
+                    # 处理精度问题：OKX对不同币种有不同的精度要求
+                    # 通常BTC是8位小数，ETH是6位小数，其他币种可能有不同要求
+                    # 这里我们根据币种类型设置合适的精度
+                    if base_currency == 'BTC':
+                        sell_size = round(sell_size, 8)  # BTC通常使用8位小数
+                    elif base_currency == 'ETH':
+                        sell_size = round(sell_size, 6)  # ETH通常使用6位小数
+                    else:
+                        sell_size = round(sell_size, 4)  # 其他币种默认使用4位小数
                 
-                # 确保数量大于0
-                if sell_size <= 0:
-                    logger.error(f"任务 {plan_id} 卖出失败: 计算后的卖出数量为0")
-                    # 记录失败交易
-                    transaction = Transaction(
-                        plan_id=plan.id,
-                        symbol=plan.symbol,
-                        amount=plan.amount,
-                        direction=plan.direction,
-                        status="failed",
-                        response=json.dumps({"error": "计算后的卖出数量为0"}),
-                        executed_at=datetime.now(TIMEZONE)
-                    )
-                    db.add(transaction)
-                    db.commit()
-                    return
+                    # 确保数量大于0
+                    if sell_size <= 0:
+                        logger.error(f"任务 {plan_id} 卖出失败: 计算后的卖出数量为0")
+                        # 记录失败交易
+                        record_transaction(db, plan, "failed", {"error": "计算后的卖出数量为0"})
+                        return
                 
-                logger.info(f"任务 {plan_id} 卖出 {base_currency}: 金额 {plan.amount} USDT, 数量 {sell_size} {base_currency}, 当前价格 {current_price} USDT")
+                    logger.info(f"任务 {plan_id} 卖出 {base_currency}: 金额 {plan.amount} USDT, 数量 {sell_size} {base_currency}, 当前价格 {current_price} USDT")
                 
-                # 执行卖出订单
-                order_result = client.place_order(
-                    symbol=plan.symbol,
-                    side=side,
-                    order_type="market",
-                    size=str(sell_size)
-                )
+                    # 执行卖出订单
+                    order_result = order_batcher.place_order(
+                        client,
+                        symbol=plan.symbol,
+                        side=side,
+                        order_type="market",
+                        size=str(sell_size)
+                    )
             else:
-                # 买入逻辑保持不变
-                order_result = client.place_order(
+                # 买入订单，同一窗口内触发的任务合并为一次批量下单
+                order_result = order_batcher.place_order(
+                    client,
                     symbol=plan.symbol,
                     side=side,
                     order_type="market",
@@ -310,171 +378,33 @@ def execute_dca_task(plan_id: int):
             
             # 创建交易记录
             if order_result.get('code') == '0':
-                # 成功执行，尝试获取订单详情来获取成交价格和数量
                 order_id = None
-                fill_details = None
                 if order_result.get('data') and len(order_result['data']) > 0:
                     order_id = order_result['data'][0].get('ordId')
                 
-                # 获取成交详情
-                if order_id:
-                    import time
-                    # 等待5秒让成交数据生成（增加等待时间）
-                    time.sleep(5)
-                    
-                    # 对于市价单，我们需要特别处理
-                    # 市价买单：sz表示买入金额，需要从成交明细获取实际成交数量
-                    # 市价卖单：sz表示卖出数量，需要从成交明细获取实际成交金额
-                    
-                    # 先尝试获取成交明细，这是最准确的
-                    fills_result = client.get_order_fills(order_id)
-                    logger.info(f"任务 {plan_id} 成交明细响应: {fills_result}")
-                    
-                    if fills_result.get('code') == '0' and fills_result.get('data') and len(fills_result['data']) > 0:
-                        # 成交明细可能有多条记录，我们需要汇总
-                        total_fill_px = 0
-                        total_fill_sz = 0
-                        total_fill_amt = 0
-                        fill_count = 0
-                        
-                        for fill_info in fills_result['data']:
-                            try:
-                                fill_px = float(fill_info.get('fillPx', 0))
-                                fill_sz = float(fill_info.get('fillSz', 0))
-                                
-                                if fill_px > 0 and fill_sz > 0:
-                                    total_fill_px += fill_px * fill_sz  # 加权价格
-                                    total_fill_sz += fill_sz
-                                    total_fill_amt += fill_px * fill_sz
-                                    fill_count += 1
-                            except (ValueError, TypeError) as e:
-                                logger.warning(f"解析成交明细数据异常: {str(e)}")
-                        
-                        # 计算加权平均价格
-                        if total_fill_sz > 0:
-                            avg_fill_px = total_fill_px / total_fill_sz
-                            
-                            fill_details = {
-                                'fillPx': str(avg_fill_px),  # 成交均价
-                                'fillSz': str(total_fill_sz),  # 累计成交数量
-                                'fillAmt': str(total_fill_amt),  # 成交金额
-                                'ordId': order_id
-                            }
-                            logger.info(f"任务 {plan_id} 从成交明细汇总获取成交信息: {fill_details}")
-                    
-                    # 如果成交明细没有数据，尝试获取订单详情
-                    if not fill_details:
-                        for attempt in range(3):  # 最多重试3次
-                            try:
-                                order_detail = client.get_order_detail(order_id)
-                                logger.info(f"任务 {plan_id} 订单详情响应 (尝试{attempt+1}): {order_detail}")
-                                
-                                if order_detail.get('code') == '0' and order_detail.get('data'):
-                                    order_info = order_detail['data'][0]
-                                    
-                                    # 检查订单状态是否已完成
-                                    if order_info.get('state') in ['filled', 'partially_filled']:
-                                        # 从订单详情中获取成交价格和数量
-                                        avg_px = order_info.get('avgPx')
-                                        acc_fill_sz = order_info.get('accFillSz')
-                                        fill_amt = None
-                                        
-                                        # 计算成交金额
-                                        if avg_px and acc_fill_sz:
-                                            try:
-                                                fill_amt = str(float(avg_px) * float(acc_fill_sz))
-                                            except (ValueError, TypeError):
-                                                pass
-                                        
-                                        # 确保值不为空
-                                        if avg_px and acc_fill_sz:
-                                            fill_details = {
-                                                'fillPx': avg_px,  # 成交均价
-                                                'fillSz': acc_fill_sz,  # 累计成交数量
-                                                'fillAmt': fill_amt,  # 成交金额
-                                                'ordId': order_id
-                                            }
-                                            logger.info(f"任务 {plan_id} 从订单详情获取成交信息: {fill_details}")
-                                            break
-                                    else:
-                                        logger.info(f"任务 {plan_id} 订单状态: {order_info.get('state')} (尝试{attempt+1})")
-                                
-                                if attempt < 2:  # 不是最后一次尝试
-                                    time.sleep(3)  # 等待3秒再重试
-                                    
-                            except Exception as e:
-                                logger.warning(f"任务 {plan_id} 获取订单详情异常 (尝试{attempt+1}): {str(e)}")
-                                if attempt < 2:  # 不是最后一次尝试
-                                    time.sleep(3)  # 等待3秒再重试
-                    
-                    # 如果仍然没有获取到成交信息，使用原始订单信息和当前市场价格估算
-                    if not fill_details:
-                        logger.warning(f"任务 {plan_id} 无法从API获取成交详情，使用估算值")
-                        
-                        # 获取当前市场价格
-                        try:
-                            ticker_result = client.get_ticker(plan.symbol)
-                            if ticker_result.get('code') == '0' and ticker_result.get('data'):
-                                current_price = float(ticker_result['data'][0].get('last', 0))
-                                
-                                # 根据订单类型估算成交信息
-                                if side == "buy":
-                                    # 买入：使用订单金额和当前价格估算
-                                    est_size = float(plan.amount) / current_price
-                                    fill_details = {
-                                        'fillPx': str(current_price),
-                                        'fillSz': str(est_size),
-                                        'fillAmt': str(plan.amount),
-                                        'ordId': order_id,
-                                        'estimated': True  # 标记为估算值
-                                    }
-                                else:
-                                    # 卖出：使用卖出数量和当前价格估算
-                                    if 'sell_size' in locals():
-                                        est_amount = float(sell_size) * current_price
-                                        fill_details = {
-                                            'fillPx': str(current_price),
-                                            'fillSz': str(sell_size),
-                                            'fillAmt': str(est_amount),
-                                            'ordId': order_id,
-                                            'estimated': True  # 标记为估算值
-                                        }
-                                
-                                logger.info(f"任务 {plan_id} 使用估算值作为成交信息: {fill_details}")
-                        except Exception as e:
-                            logger.warning(f"任务 {plan_id} 估算成交信息异常: {str(e)}")
-                
-                # 构建完整的响应数据，包含成交详情
+                # 交易记录立即保存，成交价格和数量由后台对账补全，下单不再等待成交
                 complete_response = {
                     "order_result": order_result,
-                    "fill_details": fill_details
+                    "fill_details": None,
+                    "order_size": str(sell_size) if side == "sell" else str(plan.amount)
                 }
                 
-                transaction = Transaction(
-                    plan_id=plan.id,
-                    symbol=plan.symbol,
-                    amount=plan.amount,
-                    direction=plan.direction or "buy",
-                    status="success",
-                    response=json.dumps(complete_response),
-                    executed_at=datetime.now(TIMEZONE)
+                transaction = record_transaction(
+                    db, plan, "success", complete_response,
+                    fill_status=FILL_PENDING if order_id else None
                 )
-                db.add(transaction)
-                db.commit()
+                if order_id and fill_reconciler.running:
+                    fill_reconciler.enqueue(
+                        transaction.id, order_id, plan.symbol, side, plan.amount,
+                        complete_response["order_size"]
+                    )
+                elif order_id:
+                    # 非主进程不运行对账，通知主进程加载
+                    sync_state.bump(FILL_VERSION)
                 logger.info(f"任务 {plan_id} 交易记录已保存")
             else:
                 # 执行失败
-                transaction = Transaction(
-                    plan_id=plan.id,
-                    symbol=plan.symbol,
-                    amount=plan.amount,
-                    direction=plan.direction or "buy",
-                    status="failed",
-                    response=json.dumps(order_result),
-                    executed_at=datetime.now(TIMEZONE)
-                )
-                db.add(transaction)
-                db.commit()
+                record_transaction(db, plan, "failed", order_result)
                 logger.error(f"任务 {plan_id} 执行失败: {order_result.get('msg', '未知错误')}")
         except Exception as e:
             logger.exception(f"任务 {plan_id} 执行异常: {str(e)}")
@@ -482,160 +412,199 @@ def execute_dca_task(plan_id: int):
         finally:
             db.close()
 
-# 调度任务
-def schedule_task(plan, check_missed=False):
-    job_id = f"dca_task_{plan.id}"
-    
-    # 如果已存在任务，先移除
-    if scheduler.get_job(job_id):
-        scheduler.remove_job(job_id)
-        logger.info(f"移除现有任务调度 {job_id}")
-    
-    # 如果任务已禁用，不再调度
-    if plan.status != "enabled":
-        logger.info(f"任务 {plan.id} 已禁用，不再调度")
-        return
+
+# 定投执行引擎：有上限的线程池 + 任务级/币种级锁
+execution_engine = ExecutionEngine(execute_dca_task)
+
+# 批量下单：同一窗口内的订单合并为一次 trade/batch-orders 请求
+order_batcher = OrderBatcher()
+
+
+def get_okx_client():
+    """使用已保存的API配置获取OKX客户端，配置不完整时返回None"""
+    api_config = config_service.get_decrypted_api_config()
+    if not api_config:
+        return None
+    return create_okx_client(
+        api_key=api_config["api_key"],
+        secret_key=api_config["secret_key"],
+        passphrase=api_config["passphrase"]
+    )
+
+
+# 成交对账：后台批量轮询 pending_fill 状态的订单
+fill_reconciler = FillReconciler(
+    SessionLocal, get_okx_client, position_service, on_applied=notify_transactions_changed
+)
+
+
+def dispatch_dca_task(plan_id: int, scheduled_time: Optional[str] = None):
+    """
+    调度器触发时将任务提交到执行引擎，立即返回
     
-    # 解析时间
-    try:
-        hour, minute = plan.time.split(":")
-        hour = int(hour)
-        minute = int(minute)
-    except (ValueError, TypeError) as e:
-        logger.error(f"任务 {plan.id} 时间格式错误: {plan.time}, 错误: {str(e)}")
+    Args:
+        scheduled_time: 计划执行时间 "HH:MM"，用于统计实际开始时间相对计划的延迟
+    """
+    scheduled_at = None
+    if scheduled_time:
+        try:
+            hour, minute = map(int, scheduled_time.split(":"))
+            now = datetime.now(TIMEZONE)
+            planned = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if planned <= now:
+                scheduled_at = planned.timestamp()
+        except (ValueError, TypeError):
+            pass
+    execution_engine.submit(plan_id, scheduled_at)
+
+def dispatch_due_plans(plan_ids: List[int], fire_time: datetime):
+    """
+    调度器回调：同一时刻到期的任务一次性提交到执行引擎，由执行引擎并发执行
+
+    本地的主进程标记可能因心跳延迟而过时，分发前和每个任务下单前都从数据库确认仍持有租约，
+    避免租约已被其他进程接管时两个进程重复下单
+    """
+    if not leader_election.holds_lease():
+        logger.warning(f"当前进程未持有主进程租约，跳过 {len(plan_ids)} 个到期任务")
         return
-    
-    # 根据频率创建触发器
-    if plan.frequency == "daily":
-        trigger = CronTrigger(hour=hour, minute=minute, timezone=TIMEZONE)
-        logger.info(f"任务 {plan.id} 调度为每天 {hour:02d}:{minute:02d}")
-    elif plan.frequency == "weekly" and plan.day_of_week is not None:
-        trigger = CronTrigger(day_of_week=plan.day_of_week, hour=hour, minute=minute, timezone=TIMEZONE)
-        logger.info(f"任务 {plan.id} 调度为每周 {plan.day_of_week} {hour:02d}:{minute:02d}")
-    elif plan.frequency == "monthly":
-        if plan.month_days and len(plan.month_days) > 0:
-            try:
-                month_days = json.loads(plan.month_days)
-                # 为每个日期创建单独的任务
-                for day in month_days:
-                    day_job_id = f"dca_task_{plan.id}_day_{day}"
-                    if scheduler.get_job(day_job_id):
-                        scheduler.remove_job(day_job_id)
-                        logger.info(f"移除现有月度任务调度 {day_job_id}")
-                    
-                    day_trigger = CronTrigger(day=day, hour=hour, minute=minute, timezone=TIMEZONE)
-                    scheduler.add_job(
-                        execute_dca_task,
-                        trigger=day_trigger,
-                        args=[plan.id],
-                        id=day_job_id,
-                        replace_existing=True,
-                        misfire_grace_time=86400,  # 允许任务最多延迟1天执行
-                        coalesce=True,  # 合并错过的执行
-                        max_instances=1  # 最多同时运行1个实例
-                    )
-                    logger.info(f"任务 {plan.id} 调度为每月 {day}日 {hour:02d}:{minute:02d}, job_id={day_job_id}")
-                
-                # 已经为每个日期创建了单独的任务，不需要再创建主任务
-                return
-            except (json.JSONDecodeError, ValueError) as e:
-                logger.error(f"解析月份日期失败: {str(e)}, 原始数据: {plan.month_days}")
-                # 如果解析失败，回退到默认行为：每月1日执行
-                trigger = CronTrigger(day=1, hour=hour, minute=minute, timezone=TIMEZONE)
-                logger.info(f"任务 {plan.id} 解析月份日期失败，回退到每月1日 {hour:02d}:{minute:02d}")
-        else:
-            # 如果没有指定日期，默认每月1日执行
-            trigger = CronTrigger(day=1, hour=hour, minute=minute, timezone=TIMEZONE)
-            logger.info(f"任务 {plan.id} 调度为每月1日 {hour:02d}:{minute:02d}")
+    scheduled_at = fire_time.timestamp()
+    for plan_id in plan_ids:
+        execution_engine.submit(plan_id, scheduled_at, guard=leader_election.holds_lease)
+
+
+# 定投任务调度器：每个任务在最小堆中只有一个节点，同一时刻到期的任务合并分发；
+# 调度状态保存在 scheduler_state 表中，重启时直接恢复
+plan_dispatcher = PlanDispatcher(dispatch_due_plans, TIMEZONE, state_store=SchedulerStateStore(SessionLocal))
+
+
+# 调度任务
+def schedule_task(plan, check_missed=False):
+    shared_caches.emit(EVENT_PLAN)
+    if leader_election.is_leader:
+        next_run_time = plan_dispatcher.schedule(plan)
+        if next_run_time is None:
+            logger.info(f"任务 {plan.id} 已禁用或配置无效，不再调度")
+            return
+        logger.info(f"任务 {plan.id} 下次执行时间: {next_run_time.strftime('%Y-%m-%d %H:%M:%S')}")
     else:
-        logger.error(f"任务 {plan.id} 频率配置错误: {plan.frequency}")
-        return
-    
-    # 添加任务（针对每日和每周的情况，或者月份解析失败的情况）
-    scheduler.add_job(
-        execute_dca_task,
-        trigger=trigger,
-        args=[plan.id],
-        id=job_id,
-        replace_existing=True,
-        misfire_grace_time=86400,  # 允许任务最多延迟1天执行
-        coalesce=True,  # 合并错过的执行
-        max_instances=1  # 最多同时运行1个实例
-    )
-    logger.info(f"成功添加任务调度 {job_id}")
+        # 非主进程不持有调度，通知主进程重新读取该任务
+        sync_state.bump(PLAN_VERSION)
+        if plan.status != "enabled" or build_schedule_spec(plan) is None:
+            return
     
-    # 检查任务是否成功添加
-    job = scheduler.get_job(job_id)
-    if job:
-        next_run = job.next_run_time.strftime("%Y-%m-%d %H:%M:%S") if job.next_run_time else "未调度"
-        logger.info(f"任务 {plan.id} 下次执行时间: {next_run}")
+    # 检查是否需要立即执行一次任务（仅当check_missed为True时）
+    if check_missed:
+        now = datetime.now(TIMEZONE)
+        # 如果下次执行时间比当前时间晚很多（超过一个周期），可能是因为今天的执行时间已经过去
+        # 检查今天是否已经执行过
+        today = now.date()
+        today_start = datetime.combine(today, datetime.min.time()).replace(tzinfo=TIMEZONE)
+        today_end = datetime.combine(today, datetime.max.time()).replace(tzinfo=TIMEZONE)
         
-        # 检查是否需要立即执行一次任务（仅当check_missed为True时）
-        if check_missed and job.next_run_time:
-            now = datetime.now(TIMEZONE)
-            # 如果下次执行时间比当前时间晚很多（超过一个周期），可能是因为今天的执行时间已经过去
-            # 检查今天是否已经执行过
-            today = now.date()
-            today_start = datetime.combine(today, datetime.min.time()).replace(tzinfo=TIMEZONE)
-            today_end = datetime.combine(today, datetime.max.time()).replace(tzinfo=TIMEZONE)
+        db = SessionLocal()
+        try:
+            # 检查今天是否已经执行过该任务
+            existing_transaction = db.query(Transaction).filter(
+                Transaction.plan_id == plan.id,
+                Transaction.executed_at >= today_start,
+                Transaction.executed_at <= today_end
+            ).first()
             
-            db = SessionLocal()
-            try:
-                # 检查今天是否已经执行过该任务
-                existing_transaction = db.query(Transaction).filter(
-                    Transaction.plan_id == plan.id,
-                    Transaction.executed_at >= today_start,
-                    Transaction.executed_at <= today_end
-                ).first()
-                
-                # 如果今天没有执行过，并且当前时间已经超过了计划执行时间，则立即执行一次
-                plan_hour, plan_minute = map(int, plan.time.split(":"))
-                plan_time_today = datetime.combine(today, datetime.min.time()).replace(tzinfo=TIMEZONE)
-                plan_time_today = plan_time_today.replace(hour=plan_hour, minute=plan_minute)
+            # 如果今天没有执行过，并且当前时间已经超过了计划执行时间，则立即执行一次
+            plan_hour, plan_minute = map(int, plan.time.split(":"))
+            plan_time_today = datetime.combine(today, datetime.min.time()).replace(tzinfo=TIMEZONE)
+            plan_time_today = plan_time_today.replace(hour=plan_hour, minute=plan_minute)
+            
+            if not existing_transaction and now >= plan_time_today:
+                # 检查是否符合执行条件（每周或每月的特定日期）
+                should_execute = False
                 
-                if not existing_transaction and now >= plan_time_today:
-                    # 检查是否符合执行条件（每周或每月的特定日期）
-                    should_execute = False
-                    
-                    if plan.frequency == "daily":
+                if plan.frequency == "daily":
+                    should_execute = True
+                elif plan.frequency == "weekly" and plan.day_of_week is not None:
+                    # 检查今天是否是指定的星期几
+                    if now.weekday() == plan.day_of_week:
                         should_execute = True
-                    elif plan.frequency == "weekly" and plan.day_of_week is not None:
-                        # 检查今天是否是指定的星期几
-                        if now.weekday() == plan.day_of_week:
+                elif plan.frequency == "monthly" and plan.month_days:
+                    # 检查今天是否是指定的月份日期
+                    try:
+                        month_days = json.loads(plan.month_days)
+                        if now.day in month_days:
                             should_execute = True
-                    elif plan.frequency == "monthly" and plan.month_days:
-                        # 检查今天是否是指定的月份日期
-                        try:
-                            month_days = json.loads(plan.month_days)
-                            if now.day in month_days:
-                                should_execute = True
-                        except (json.JSONDecodeError, ValueError):
-                            pass
-                    
-                    if should_execute:
-                        logger.info(f"任务 {plan.id} 编辑后时间已过，立即执行一次")
-                        # 在新线程中执行，避免阻塞当前线程
-                        import threading
-                        threading.Thread(target=execute_dca_task, args=[plan.id]).start()
-            finally:
-                db.close()
-    else:
-        logger.error(f"任务 {plan.id} 调度失败，未找到对应的任务")
+                    except (json.JSONDecodeError, ValueError):
+                        pass
+                
+                if should_execute:
+                    logger.info(f"任务 {plan.id} 编辑后时间已过，立即执行一次")
+                    # 提交到执行引擎，避免阻塞当前线程
+                    dispatch_dca_task(plan.id, plan.time)
+        finally:
+            db.close()
+
 
+# 移除任务调度
+def unschedule_task(plan_id: int) -> bool:
+    shared_caches.emit(EVENT_PLAN)
+    if leader_election.is_leader:
+        return plan_dispatcher.remove(plan_id)
+    sync_state.bump(PLAN_VERSION)
+    return True
 
-# 初始化所有任务的调度
+
+# 初始化所有任务的调度：从调度状态恢复，只重新计算有修改的任务
 def init_scheduler():
     logger.info("初始化定时任务调度")
-    db = SessionLocal()
     try:
-        plans = db.query(DCAPlan).filter(DCAPlan.status == "enabled").all()
-        for plan in plans:
-            schedule_task(plan)
-        logger.info(f"成功调度 {len(plans)} 个定投任务")
+        summary = plan_dispatcher.restore()
+        logger.info(f"定投任务调度恢复完成: {summary}")
     except Exception as e:
         logger.exception(f"初始化定时任务异常: {str(e)}")
-    finally:
-        db.close()
+    plan_dispatcher.start()
+
+
+def on_become_leader():
+    """成为主进程：恢复任务调度、定时任务和成交对账"""
+    init_scheduler()
+    scheduler.resume()
+    fill_reconciler.start()
+    try:
+        asset_series.import_daily_history()
+    except Exception as e:
+        logger.exception(f"导入资产历史记录到时间序列失败: {str(e)}")
+
+
+def on_leadership_lost():
+    """失去主进程身份：停止调度和对账，只继续处理HTTP请求"""
+    plan_dispatcher.stop()
+    scheduler.pause()
+    fill_reconciler.stop()
+
+
+def on_sync_tick(is_leader: bool):
+    """选举心跳：检查其他工作进程写入的修改并刷新本地状态"""
+    changed = sync_state.poll_changes()
+    if CONFIG_VERSION in changed:
+        config_service.invalidate()
+        shared_caches.emit(EVENT_CONFIG)
+    if PLAN_VERSION in changed:
+        shared_caches.emit(EVENT_PLAN)
+    if TRANSACTION_VERSION in changed:
+        shared_caches.emit(EVENT_TRANSACTION)
+    if CONFIG_VERSION in changed or PLAN_VERSION in changed:
+        refresh_ticker_feed_symbols()
+    if is_leader and PLAN_VERSION in changed:
+        logger.info(f"同步其他进程修改的定投任务: {plan_dispatcher.sync()}")
+    if is_leader and FILL_VERSION in changed:
+        fill_reconciler.load_pending()
+
+
+# 主进程选举：多个工作进程中只有持有租约的进程调度定投任务
+leader_election = LeaderElection(
+    engine,
+    on_elected=on_become_leader,
+    on_demoted=on_leadership_lost,
+    on_tick=on_sync_tick
+)
 
 # 记录资产历史数据的定时任务
 @scheduler.scheduled_job('cron', hour=0, minute=0, timezone=TIMEZONE)
@@ -682,6 +651,7 @@ def record_asset_history():
             )
             db.add(history)
             db.commit()
+            history_cache.clear()
             logger.info(f"定投策略资产历史数据记录成功: {record_time}")
         except Exception as e:
             db.rollback()
@@ -692,167 +662,9 @@ def record_asset_history():
         logger.exception(f"记录资产历史数据任务异常: {str(e)}")
 
 # 资产历史数据缓存
-history_cache = {
-    "data": {},  # 按天数缓存: {days: {data: result, timestamp: time}}
-    "ttl": 60    # 缓存1分钟，减少缓存时间
-}
-
-
-# 调度任务
-def schedule_task(plan, check_missed=False):
-    job_id = f"dca_task_{plan.id}"
-    
-    # 如果已存在任务，先移除
-    if scheduler.get_job(job_id):
-        scheduler.remove_job(job_id)
-        logger.info(f"移除现有任务调度 {job_id}")
-    
-    # 如果任务已禁用，不再调度
-    if plan.status != "enabled":
-        logger.info(f"任务 {plan.id} 已禁用，不再调度")
-        return
-    
-    # 解析时间
-    try:
-        hour, minute = plan.time.split(":")
-        hour = int(hour)
-        minute = int(minute)
-    except (ValueError, TypeError) as e:
-        logger.error(f"任务 {plan.id} 时间格式错误: {plan.time}, 错误: {str(e)}")
-        return
-    
-    # 根据频率创建触发器
-    if plan.frequency == "daily":
-        trigger = CronTrigger(hour=hour, minute=minute, timezone=TIMEZONE)
-        logger.info(f"任务 {plan.id} 调度为每天 {hour:02d}:{minute:02d}")
-    elif plan.frequency == "weekly" and plan.day_of_week is not None:
-        trigger = CronTrigger(day_of_week=plan.day_of_week, hour=hour, minute=minute, timezone=TIMEZONE)
-        logger.info(f"任务 {plan.id} 调度为每周 {plan.day_of_week} {hour:02d}:{minute:02d}")
-    elif plan.frequency == "monthly":
-        if plan.month_days and len(plan.month_days) > 0:
-            try:
-                month_days = json.loads(plan.month_days)
-                # 为每个日期创建单独的任务
-                for day in month_days:
-                    day_job_id = f"dca_task_{plan.id}_day_{day}"
-                    if scheduler.get_job(day_job_id):
-                        scheduler.remove_job(day_job_id)
-                        logger.info(f"移除现有月度任务调度 {day_job_id}")
-                    
-                    day_trigger = CronTrigger(day=day, hour=hour, minute=minute, timezone=TIMEZONE)
-                    scheduler.add_job(
-                        execute_dca_task,
-                        trigger=day_trigger,
-                        args=[plan.id],
-                        id=day_job_id,
-                        replace_existing=True,
-                        misfire_grace_time=86400,  # 允许任务最多延迟1天执行
-                        coalesce=True,  # 合并错过的执行
-                        max_instances=1  # 最多同时运行1个实例
-                    )
-                    logger.info(f"任务 {plan.id} 调度为每月 {day}日 {hour:02d}:{minute:02d}, job_id={day_job_id}")
-                
-                # 已经为每个日期创建了单独的任务，不需要再创建主任务
-                return
-            except (json.JSONDecodeError, ValueError) as e:
-                logger.error(f"解析月份日期失败: {str(e)}, 原始数据: {plan.month_days}")
-                # 如果解析失败，回退到默认行为：每月1日执行
-                trigger = CronTrigger(day=1, hour=hour, minute=minute, timezone=TIMEZONE)
-                logger.info(f"任务 {plan.id} 解析月份日期失败，回退到每月1日 {hour:02d}:{minute:02d}")
-        else:
-            # 如果没有指定日期，默认每月1日执行
-            trigger = CronTrigger(day=1, hour=hour, minute=minute, timezone=TIMEZONE)
-            logger.info(f"任务 {plan.id} 调度为每月1日 {hour:02d}:{minute:02d}")
-    else:
-        logger.error(f"任务 {plan.id} 频率配置错误: {plan.frequency}")
-        return
-    
-    # 添加任务（针对每日和每周的情况，或者月份解析失败的情况）
-    scheduler.add_job(
-        execute_dca_task,
-        trigger=trigger,
-        args=[plan.id],
-        id=job_id,
-        replace_existing=True,
-        misfire_grace_time=86400,  # 允许任务最多延迟1天执行
-        coalesce=True,  # 合并错过的执行
-        max_instances=1  # 最多同时运行1个实例
-    )
-    logger.info(f"成功添加任务调度 {job_id}")
-    
-    # 检查任务是否成功添加
-    job = scheduler.get_job(job_id)
-    if job:
-        next_run = job.next_run_time.strftime("%Y-%m-%d %H:%M:%S") if job.next_run_time else "未调度"
-        logger.info(f"任务 {plan.id} 下次执行时间: {next_run}")
-        
-        # 检查是否需要立即执行一次任务（仅当check_missed为True时）
-        if check_missed and job.next_run_time:
-            now = datetime.now(TIMEZONE)
-            # 如果下次执行时间比当前时间晚很多（超过一个周期），可能是因为今天的执行时间已经过去
-            # 检查今天是否已经执行过
-            today = now.date()
-            today_start = datetime.combine(today, datetime.min.time()).replace(tzinfo=TIMEZONE)
-            today_end = datetime.combine(today, datetime.max.time()).replace(tzinfo=TIMEZONE)
-            
-            db = SessionLocal()
-            try:
-                # 检查今天是否已经执行过该任务
-                existing_transaction = db.query(Transaction).filter(
-                    Transaction.plan_id == plan.id,
-                    Transaction.executed_at >= today_start,
-                    Transaction.executed_at <= today_end
-                ).first()
-                
-                # 如果今天没有执行过，并且当前时间已经超过了计划执行时间，则立即执行一次
-                plan_hour, plan_minute = map(int, plan.time.split(":"))
-                plan_time_today = datetime.combine(today, datetime.min.time()).replace(tzinfo=TIMEZONE)
-                plan_time_today = plan_time_today.replace(hour=plan_hour, minute=plan_minute)
-                
-                if not existing_transaction and now >= plan_time_today:
-                    # 检查是否符合执行条件（每周或每月的特定日期）
-                    should_execute = False
-                    
-                    if plan.frequency == "daily":
-                        should_execute = True
-                    elif plan.frequency == "weekly" and plan.day_of_week is not None:
-                        # 检查今天是否是指定的星期几
-                        if now.weekday() == plan.day_of_week:
-                            should_execute = True
-                    elif plan.frequency == "monthly" and plan.month_days:
-                        # 检查今天是否是指定的月份日期
-                        try:
-                            month_days = json.loads(plan.month_days)
-                            if now.day in month_days:
-                                should_execute = True
-                        except (json.JSONDecodeError, ValueError):
-                            pass
-                    
-                    if should_execute:
-                        logger.info(f"任务 {plan.id} 编辑后时间已过，立即执行一次")
-                        # 在新线程中执行，避免阻塞当前线程
-                        import threading
-                        threading.Thread(target=execute_dca_task, args=[plan.id]).start()
-            finally:
-                db.close()
-    else:
-        logger.error(f"任务 {plan.id} 调度失败，未找到对应的任务")
+history_cache = shared_caches.region("asset_history", ttl=60, max_size=64, invalidate_on=(EVENT_CONFIG,))
 
 
-# 初始化所有任务的调度
-def init_scheduler():
-    logger.info("初始化定时任务调度")
-    db = SessionLocal()
-    try:
-        plans = db.query(DCAPlan).filter(DCAPlan.status == "enabled").all()
-        for plan in plans:
-            schedule_task(plan)
-        logger.info(f"成功调度 {len(plans)} 个定投任务")
-    except Exception as e:
-        logger.exception(f"初始化定时任务异常: {str(e)}")
-    finally:
-        db.close()
-
 # 记录资产历史数据的定时任务
 @scheduler.scheduled_job('cron', hour=0, minute=0, timezone=TIMEZONE)
 def record_asset_history():
@@ -898,6 +710,7 @@ def record_asset_history():
             )
             db.add(history)
             db.commit()
+            history_cache.clear()
             logger.info(f"定投策略资产历史数据记录成功: {record_time}")
         except Exception as e:
             db.rollback()
@@ -909,89 +722,103 @@ def record_asset_history():
 
 
 @app.get("/api/assets/history")
-def get_asset_history(days: int = 30):
+def get_asset_history(request: Request, response: Response, days: int = 30, db: Session = Depends(get_db)):
     """获取指定天数的资产历史数据（简化版本：只显示到前一天）"""
-    global history_cache
-    
-    # 检查缓存
-    cache_key = f"{days}"
-    current_time = time.time()
-    
-    if (cache_key in history_cache["data"] and 
-        current_time - history_cache["data"][cache_key]["timestamp"] < history_cache["ttl"]):
-        logger.info(f"从缓存返回资产历史数据: days={days}")
-        return history_cache["data"][cache_key]["data"]
-    
-    db = next(get_db())
-    
     try:
-        # 计算日期范围（只到昨天，不包含今天）
-        today = datetime.now(TIMEZONE).date()
-        end_date = today - timedelta(days=1)  # 昨天
-        start_date = end_date - timedelta(days=days-1)  # 往前推days天
-        
-        # 确保查询范围不包含今天
-        end_datetime = datetime.combine(end_date, datetime.max.time()).replace(tzinfo=TIMEZONE)
-        start_datetime = datetime.combine(start_date, datetime.min.time()).replace(tzinfo=TIMEZONE)
-        
-        logger.info(f"查询资产历史数据: 从 {start_date} 到 {end_date}")
-        
-        # 获取历史数据（只查询已存储的历史记录，严格排除今天）
-        history_records = db.query(
-            AssetHistory.recorded_at,
-            AssetHistory.total_assets,
-            AssetHistory.total_investment,
-            AssetHistory.total_profit
-        ).filter(
-            AssetHistory.recorded_at >= start_datetime,
-            AssetHistory.recorded_at <= end_datetime
-        ).order_by(AssetHistory.recorded_at.asc()).all()
-        
-        # 格式化结果
-        result = []
-        for record in history_records:
-            result.append({
-                "date": record.recorded_at.isoformat(),
-                "totalAssets": float(record.total_assets),
-                "totalInvestment": float(record.total_investment),
-                "totalProfit": float(record.total_profit)
-            })
-        
-        # 缓存结果
-        history_cache["data"][cache_key] = {
-            "data": result,
-            "timestamp": current_time
-        }
-        
-        logger.info(f"资产历史数据查询完成: days={days}, records={len(result)}")
-        return result
-        
+        # 版本：查询范围（随日期变化）和历史记录的最大ID/条数；缓存键包含版本，其他进程写入后不会读到旧结果
+        max_id, count = db.query(func.max(AssetHistory.id), func.count(AssetHistory.id)).one()
+        version = (days, datetime.now(TIMEZONE).date().isoformat(), max_id, count)
+        not_modified = conditional_response(request, response, "history", *version)
+        if not_modified is not None:
+            return not_modified
+        return fast_json_response(
+            history_cache.get_or_compute(version, lambda: query_asset_history(db, days)), response
+        )
     except Exception as e:
         logger.exception(f"获取资产历史数据异常: {str(e)}")
         return []
-    finally:
-        db.close()
 
-# 启动时初始化调度器
-@app.on_event("startup")
-def startup_event():
-    logger.info("服务启动，初始化调度器")
-    init_scheduler()
+
+def query_asset_history(db, days: int):
+    """查询指定天数的资产历史数据（只到前一天）"""
+    # 计算日期范围（只到昨天，不包含今天）
+    today = datetime.now(TIMEZONE).date()
+    end_date = today - timedelta(days=1)  # 昨天
+    start_date = end_date - timedelta(days=days-1)  # 往前推days天
     
-    # 启动时记录一次资产数据
+    # 确保查询范围不包含今天
+    end_datetime = datetime.combine(end_date, datetime.max.time()).replace(tzinfo=TIMEZONE)
+    start_datetime = datetime.combine(start_date, datetime.min.time()).replace(tzinfo=TIMEZONE)
+    
+    logger.info(f"查询资产历史数据: 从 {start_date} 到 {end_date}")
+    
+    # 获取历史数据（只查询已存储的历史记录，严格排除今天）
+    history_records = db.query(
+        AssetHistory.recorded_at,
+        AssetHistory.total_assets,
+        AssetHistory.total_investment,
+        AssetHistory.total_profit
+    ).filter(
+        AssetHistory.recorded_at >= start_datetime,
+        AssetHistory.recorded_at <= end_datetime
+    ).order_by(AssetHistory.recorded_at.asc()).all()
+    
+    # 格式化结果
+    result = []
+    for record in history_records:
+        result.append({
+            "date": record.recorded_at.isoformat(),
+            "totalAssets": float(record.total_assets),
+            "totalInvestment": float(record.total_investment),
+            "totalProfit": float(record.total_profit)
+        })
+    
+    logger.info(f"资产历史数据查询完成: days={days}, records={len(result)}")
+    return result
+
+
+# 定时采样定投策略资产数据，写入资产时间序列（调度器只在主进程运行）
+@scheduler.scheduled_job('interval', seconds=ASSET_SAMPLE_INTERVAL, coalesce=True, max_instances=1)
+def record_asset_sample():
     try:
-        logger.info("启动时记录资产数据")
-        # 使用线程执行，避免阻塞启动过程
-        import threading
-        threading.Thread(target=record_asset_history).start()
+        asset_data = get_assets_overview(force_refresh=True)
+        if "error" in asset_data:
+            logger.warning(f"资产采样跳过: {asset_data['error']}")
+            return
+        asset_series.record(
+            asset_data["totalAssets"], asset_data["totalInvestment"], asset_data["totalProfit"]
+        )
     except Exception as e:
-        logger.exception(f"启动时记录资产数据异常: {str(e)}")
+        logger.exception(f"资产采样异常: {str(e)}")
+
+
+# 时间窗口单位对应的秒数
+SERIES_WINDOW_UNITS = {"h": 3600, "d": 86400, "w": 7 * 86400, "m": 30 * 86400, "y": 365 * 86400}
+
 
+@app.get("/api/assets/series")
+def get_asset_series(window: str = "30d", max_points: int = Query(300, ge=10, le=2000)):
+    """
+    获取资产时间序列，按窗口自动选择原始/小时/天精度
+
+    window: 时间窗口，如 1d、7d、3m、1y，all 表示全部数据
+    """
+    window = window.strip().lower()
+    if window == "all":
+        start_ts = None
+    else:
+        unit = SERIES_WINDOW_UNITS.get(window[-1:])
+        if unit is None or not window[:-1].isdigit() or int(window[:-1]) <= 0:
+            raise HTTPException(status_code=400, detail="window 格式应为数字加单位(h/d/w/m/y)或 all")
+        start_ts = time.time() - int(window[:-1]) * unit
+    
+    result = asset_series.query(start_ts, max_points=max_points)
+    result["window"] = window
+    return fast_json_response(result)
 
 # 添加手动执行任务接口
 @app.post("/api/dca-plan/{plan_id}/execute")
-def manual_execute_plan(plan_id: int):
-    db = next(get_db())
+def manual_execute_plan(plan_id: int, db: Session = Depends(get_db)):
     db_plan = db.query(DCAPlan).filter(DCAPlan.id == plan_id).first()
     if not db_plan:
         raise HTTPException(status_code=404, detail="Plan not found")
@@ -999,15 +826,20 @@ def manual_execute_plan(plan_id: int):
     if db_plan.status != "enabled":
         raise HTTPException(status_code=400, detail="Cannot execute disabled plan")
     
+    # 等待执行期间不占用连接（执行引擎使用独立会话）
+    db.close()
+    
     logger.info(f"手动执行任务 {plan_id}")
-    execute_dca_task(plan_id)
+    future = execution_engine.submit(plan_id)
+    if future is None:
+        return {"message": f"任务 {plan_id} 正在执行中"}
+    future.result()
     
     return {"message": f"任务 {plan_id} 已手动执行"}
 
 # 定投计划相关接口
 @app.post("/api/dca-plan", response_model=DCAPlanOut)
-def create_dca_plan(plan: DCAPlanCreate):
-    db = next(get_db())
+def create_dca_plan(plan: DCAPlanCreate, db: Session = Depends(get_db)):
     db_plan = DCAPlan(**plan.dict(), status="enabled")
     db.add(db_plan)
     db.commit()
@@ -1015,19 +847,18 @@ def create_dca_plan(plan: DCAPlanCreate):
     
     # 调度任务
     schedule_task(db_plan)
+    refresh_ticker_feed_symbols()
     logger.info(f"创建新任务: {db_plan.id}, 币种: {db_plan.symbol}, 金额: {db_plan.amount}, 频率: {db_plan.frequency}")
     
     return db_plan
 
 @app.get("/api/dca-plan", response_model=List[DCAPlanOut])
-def list_dca_plans():
-    db = next(get_db())
+def list_dca_plans(db: Session = Depends(get_db)):
     plans = db.query(DCAPlan).all()
     return plans
 
 @app.put("/api/dca-plan/{plan_id}", response_model=DCAPlanOut)
-def update_dca_plan(plan_id: int, plan: DCAPlanCreate):
-    db = next(get_db())
+def update_dca_plan(plan_id: int, plan: DCAPlanCreate, db: Session = Depends(get_db)):
     db_plan = db.query(DCAPlan).filter(DCAPlan.id == plan_id).first()
     if not db_plan:
         raise HTTPException(status_code=404, detail="Plan not found")
@@ -1062,47 +893,33 @@ def update_dca_plan(plan_id: int, plan: DCAPlanCreate):
     
     # 更新调度，如果时间设置有变化，则检查是否需要立即执行
     schedule_task(db_plan, check_missed=time_changed)
+    refresh_ticker_feed_symbols()
     
     return db_plan
 
 @app.delete("/api/dca-plan/{plan_id}")
-def delete_dca_plan(plan_id: int):
-    db = next(get_db())
+def delete_dca_plan(plan_id: int, db: Session = Depends(get_db)):
     db_plan = db.query(DCAPlan).filter(DCAPlan.id == plan_id).first()
     if not db_plan:
         raise HTTPException(status_code=404, detail="Plan not found")
     
     # 移除调度
-    job_id = f"dca_task_{plan_id}"
-    if scheduler.get_job(job_id):
-        scheduler.remove_job(job_id)
-        logger.info(f"移除任务调度 {job_id}")
-    
-    # 如果是月度任务，还需要移除每个日期的单独任务
-    if db_plan.frequency == "monthly" and db_plan.month_days:
-        try:
-            month_days = json.loads(db_plan.month_days)
-            for day in month_days:
-                day_job_id = f"dca_task_{plan_id}_day_{day}"
-                if scheduler.get_job(day_job_id):
-                    scheduler.remove_job(day_job_id)
-                    logger.info(f"移除月度任务调度 {day_job_id}")
-        except (json.JSONDecodeError, ValueError):
-            pass
+    if unschedule_task(plan_id):
+        logger.info(f"移除任务调度 {plan_id}")
     
     # 删除计划
     logger.info(f"删除任务 {plan_id}")
     db.delete(db_plan)
     db.commit()
+    refresh_ticker_feed_symbols()
     
     return {"ok": True}
 
 @app.put("/api/dca-plan/{plan_id}/status")
-def update_plan_status(plan_id: int, status: str = Body(..., embed=True)):
+def update_plan_status(plan_id: int, status: str = Body(..., embed=True), db: Session = Depends(get_db)):
     if status not in ["enabled", "disabled"]:
         raise HTTPException(status_code=400, detail="Status must be 'enabled' or 'disabled'")
     
-    db = next(get_db())
     db_plan = db.query(DCAPlan).filter(DCAPlan.id == plan_id).first()
     if not db_plan:
         raise HTTPException(status_code=404, detail="Plan not found")
@@ -1113,21 +930,34 @@ def update_plan_status(plan_id: int, status: str = Body(..., embed=True)):
     
     # 更新调度
     schedule_task(db_plan)
+    refresh_ticker_feed_symbols()
     
     return {"id": plan_id, "status": status}
 
 # 获取交易记录
-@app.get("/api/transactions")
-@app.get("/api/transactions")
-def get_transactions(
+def query_transactions(
+    db,
     symbol: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     direction: Optional[str] = None,
-    limit: int = 100
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    plan_id: Optional[int] = None,
+    status: Optional[str] = None
 ):
-    db = next(get_db())
+    """
+    按 (executed_at, id) 倒序查询交易记录，支持游标分页
     
+    游标条件与 executed_at 相关索引的顺序一致（SQLite 索引隐含 rowid），
+    深分页只需定位索引位置，无需 OFFSET 扫描
+    
+    Returns:
+        (交易记录列表, 下一页游标；没有更多数据时为None)
+    
+    Raises:
+        ValueError: 游标或日期格式无效
+    """
     # 联表查询，获取任务名称
     query = db.query(
         Transaction.id,
@@ -1138,6 +968,13 @@ def get_transactions(
         Transaction.status,
         Transaction.response,
         Transaction.executed_at,
+        Transaction.execution_count,
+        Transaction.fill_px,
+        Transaction.fill_sz,
+        Transaction.fill_amt,
+        Transaction.ord_id,
+        Transaction.is_estimated,
+        Transaction.error_code,
         DCAPlan.title.label('plan_title')
     ).outerjoin(DCAPlan, Transaction.plan_id == DCAPlan.id)
     
@@ -1155,114 +992,48 @@ def get_transactions(
     if direction:
         query = query.filter(Transaction.direction == direction)
     
-    transactions = query.order_by(Transaction.executed_at.desc()).limit(limit).all()
-    
-    # 计算每个任务的执行次数并解析交易详情
+    if plan_id is not None:
+        query = query.filter(Transaction.plan_id == plan_id)
+    
+    if status:
+        query = query.filter(Transaction.status == status)
+    
+    if cursor:
+        cursor_executed_at, cursor_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Transaction.executed_at < cursor_executed_at,
+            and_(Transaction.executed_at == cursor_executed_at, Transaction.id < cursor_id)
+        ))
+    
+    # 多取一条用于判断是否还有下一页
+    transactions = query.order_by(Transaction.executed_at.desc(), Transaction.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(transactions) > limit:
+        transactions = transactions[:limit]
+        if transactions:
+            last = transactions[-1]
+            next_cursor = encode_cursor(last.executed_at, last.id)
+    
+    # 执行次数在写入时已计算，这里只整理交易详情
     result = []
     for transaction in transactions:
-        # 计算该任务在此交易之前的执行次数
-        try:
-            execution_count = db.query(Transaction).filter(
-                Transaction.plan_id == transaction.plan_id,
-                Transaction.executed_at <= transaction.executed_at,
-                Transaction.status == "success"
-            ).count()
-        except Exception as e:
-            logger.warning(f"计算执行次数失败: {str(e)}")
-            execution_count = 1
-        
-        # 解析交易响应获取成交价格和数量
+        # 成交价格和数量直接读取成交列，缺少成交详情的旧记录才回退解析响应
         trade_price = None
         trade_quantity = None
-        
-        if transaction.status == "success" and transaction.response:
-            try:
-                response_data = json.loads(transaction.response)
-                logger.info(f"解析交易记录 ID: {transaction.id}, 响应数据: {response_data}")
-                
-                # 检查是否有成交详情
-                if 'fill_details' in response_data and response_data['fill_details']:
-                    fill_data = response_data['fill_details']
-                    # 成交价格和数量
-                    if 'fillPx' in fill_data and fill_data['fillPx']:
-                        try:
-                            trade_price = float(fill_data['fillPx'])
-                        except (ValueError, TypeError):
-                            pass
-                            
-                    if 'fillSz' in fill_data and fill_data['fillSz']:
-                        try:
-                            trade_quantity = float(fill_data['fillSz'])
-                        except (ValueError, TypeError):
-                            pass
-                
-                # 如果没有fill_details或者解析失败，尝试从order_result中获取
-                if (trade_price is None or trade_quantity is None) and 'order_result' in response_data:
-                    if response_data['order_result'].get('data'):
-                        order_data = response_data['order_result']['data'][0]
-                        
-                        # 尝试多种可能的字段名获取价格
-                        for price_field in ['avgPx', 'px', 'fillPx']:
-                            if price_field in order_data and order_data[price_field]:
-                                try:
-                                    trade_price = float(order_data[price_field])
-                                    break
-                                except (ValueError, TypeError):
-                                    pass
-                        
-                        # 尝试多种可能的字段名获取数量
-                        for size_field in ['accFillSz', 'sz', 'fillSz']:
-                            if size_field in order_data and order_data[size_field]:
-                                try:
-                                    trade_quantity = float(order_data[size_field])
-                                    break
-                                except (ValueError, TypeError):
-                                    pass
-                
-                # 如果是市价买单，可能需要特殊处理
-                # 市价买单中，sz表示买入金额，而不是买入数量
-                if trade_price and trade_price > 0 and transaction.direction == "buy" and trade_quantity is None:
-                    # 如果有价格但没有数量，尝试用金额除以价格计算数量
-                    if 'order_result' in response_data and response_data['order_result'].get('data'):
-                        order_data = response_data['order_result']['data'][0]
-                        if 'sz' in order_data and order_data['sz']:
-                            try:
-                                amount = float(order_data['sz'])
-                                trade_quantity = amount / trade_price
-                            except (ValueError, TypeError, ZeroDivisionError):
-                                pass
-                
-                # 如果是市价卖单，可能需要特殊处理
-                # 市价卖单中，sz表示卖出数量
-                if trade_quantity and trade_quantity > 0 and transaction.direction == "sell" and trade_price is None:
-                    # 如果有数量但没有价格，尝试用金额除以数量计算价格
-                    if 'order_result' in response_data and response_data['order_result'].get('data'):
-                        order_data = response_data['order_result']['data'][0]
-                        if 'sz' in order_data and order_data['sz']:
-                            try:
-                                amount = float(transaction.amount)  # 使用交易记录中的金额
-                                trade_price = amount / trade_quantity
-                            except (ValueError, TypeError, ZeroDivisionError):
-                                pass
-                
-                # 如果仍然没有获取到价格和数量，尝试使用交易记录中的金额和当前市场价格估算
-                if trade_price is None or trade_quantity is None:
-                    # 这里我们可以添加获取当前市场价格的逻辑，但为了简单起见，暂时不实现
-                    pass
-                        
-            except (json.JSONDecodeError, KeyError, ValueError, TypeError) as e:
-                logger.warning(f"解析交易响应失败: {str(e)}, 响应数据: {transaction.response}")
-                # 如果解析失败，保持为None
-                pass
-            
-            # 记录解析结果
-            logger.info(f"交易记录 ID: {transaction.id}, 解析结果: 价格={trade_price}, 数量={trade_quantity}")
+        if transaction.status == "success":
+            trade_price, trade_quantity = resolve_trade_fields(
+                transaction.response,
+                transaction.direction,
+                transaction.amount,
+                transaction.fill_px,
+                transaction.fill_sz
+            )
         
         result.append({
             "id": transaction.id,
             "plan_id": transaction.plan_id,
             "plan_title": transaction.plan_title or f"任务{transaction.plan_id}",
-            "execution_count": execution_count,
+            "execution_count": transaction.execution_count if transaction.execution_count is not None else 1,
             "symbol": transaction.symbol,
             "amount": transaction.amount,
             "direction": transaction.direction,
@@ -1270,10 +1041,80 @@ def get_transactions(
             "response": transaction.response,
             "executed_at": transaction.executed_at,
             "trade_price": trade_price,
-            "trade_quantity": trade_quantity
+            "trade_quantity": trade_quantity,
+            "fill_amount": transaction.fill_amt,
+            "order_id": transaction.ord_id,
+            "is_estimated": bool(transaction.is_estimated),
+            "error_code": transaction.error_code
         })
     
-    return result
+    return result, next_cursor
+
+
+def get_transactions_version(db):
+    """
+    交易记录列表的数据版本：最大交易ID、交易版本号（成交对账修改已有记录时递增）
+    以及任务的最后修改时间和数量（列表中包含任务名称）
+    """
+    row = db.execute(text(
+        "SELECT (SELECT MAX(id) FROM transactions), "
+        "(SELECT MAX(updated_at) FROM dca_plans), (SELECT COUNT(*) FROM dca_plans), "
+        "(SELECT version FROM sync_state WHERE name = :name)"
+    ), {"name": TRANSACTION_VERSION}).one()
+    return tuple(row)
+
+
+@app.get("/api/transactions")
+@app.get("/api/transactions")
+def get_transactions(
+    request: Request,
+    response: Response,
+    symbol: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    direction: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """获取交易记录列表，下一页游标通过 X-Next-Cursor 响应头返回"""
+    not_modified = conditional_response(
+        request, response, "transactions", get_transactions_version(db),
+        symbol, start_date, end_date, direction, limit, cursor
+    )
+    if not_modified is not None:
+        return not_modified
+    try:
+        result, next_cursor = query_transactions(db, symbol, start_date, end_date, direction, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return fast_json_response(result, response)
+
+
+@app.get("/api/transactions/page")
+def get_transactions_page(
+    symbol: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    direction: Optional[str] = None,
+    plan_id: Optional[int] = None,
+    status: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """游标分页获取交易记录，返回 {"data": [...], "next_cursor": ...}"""
+    try:
+        result, next_cursor = query_transactions(
+            db, symbol, start_date, end_date, direction, limit, cursor, plan_id, status
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return fast_json_response({"data": result, "next_cursor": next_cursor})
 
 # 配置中心相关接口
 @app.post("/api/config/api")
@@ -1296,7 +1137,9 @@ def get_api_config():
 
 @app.post("/api/config/coins")
 def save_coin_config(config: CoinConfig):
-    return config_service.save_coin_config(config.selected_coins)
+    result = config_service.save_coin_config(config.selected_coins)
+    refresh_ticker_feed_symbols()
+    return result
 
 @app.get("/api/config/coins", response_model=List[str])
 def get_coin_config():
@@ -1321,210 +1164,185 @@ def test_api_connection(config: ApiConfig = Body(...)):
     )
 
 # 获取资产概览
-# 资产数据缓存
-assets_cache = {
-    "data": None,
-    "timestamp": 0,
-    "ttl": 300  # 缓存有效期，单位秒
-}
+# 资产数据缓存：交易写入、任务或配置修改时失效
+assets_cache = shared_caches.region(
+    "assets_overview", ttl=300, max_size=1, invalidate_on=(EVENT_TRANSACTION, EVENT_PLAN, EVENT_CONFIG)
+)
+ASSETS_OVERVIEW_KEY = "overview"
+
+def aggregate_dca_positions(db):
+    """
+    从持仓台账读取定投持仓和投入金额
+    
+    Returns:
+        (净持仓映射 {币种: 数量}, 总投入)；没有成功交易时返回 None
+    """
+    return position_service.get_positions(db)
+
+
+def load_dca_positions():
+    """使用独立会话汇总定投持仓（供线程池调用）"""
+    db = SessionLocal()
+    try:
+        return aggregate_dca_positions(db)
+    finally:
+        db.close()
+
+
+def value_dca_positions(net_balances, snapshot):
+    """
+    使用全量行情快照为净持仓估值（按instId索引查找，无需遍历全部行情）
+    
+    Returns:
+        (总资产, 资产列表)
+    """
+    assets = []
+    total_assets = 0
+    for symbol, balance in net_balances.items():
+        if balance <= 0:
+            continue
+        ticker = snapshot.get(f"{symbol}-USDT")
+        if ticker is None or ticker['last'] <= 0:
+            logger.warning(f"未找到 {symbol} 的价格数据")
+            continue
+        
+        price = ticker['last']
+        value_in_usdt = balance * price
+        
+        logger.debug("%s: 数量=%s, 价格=%s, 价值=%s", symbol, balance, price, value_in_usdt)
+        
+        assets.append({
+            "currency": symbol,
+            "amount": balance,
+            "valueInUsdt": value_in_usdt
+        })
+        
+        total_assets += value_in_usdt
+    
+    return total_assets, assets
+
+
+def value_dca_positions_by_ticker(net_balances, ticker_results):
+    """
+    使用逐个查询的行情为净持仓估值（批量接口失败时的回退路径）
+    
+    Args:
+        ticker_results: {币种: 单个币种行情接口响应}
+    """
+    assets = []
+    total_assets = 0
+    for symbol, balance in net_balances.items():
+        ticker_result = ticker_results.get(symbol)
+        if balance <= 0 or not ticker_result:
+            continue
+        try:
+            if ticker_result.get('code') == '0' and ticker_result.get('data'):
+                price = float(ticker_result['data'][0].get('last', 0))
+                value_in_usdt = balance * price
+                
+                assets.append({
+                    "currency": symbol,
+                    "amount": balance,
+                    "valueInUsdt": value_in_usdt
+                })
+                
+                total_assets += value_in_usdt
+        except Exception as e:
+            logger.exception(f"处理 {symbol} 资产时出错: {str(e)}")
+            continue
+    
+    return total_assets, assets
+
 
 def calculate_dca_assets_and_investment(db, client):
     """计算定投策略的资产价值、投入和收益"""
-    # 获取所有成功的交易记录
-    transactions = db.query(Transaction).filter(Transaction.status == "success").all()
+    positions = aggregate_dca_positions(db)
     
     # 如果没有交易记录，直接返回0值
-    if not transactions:
+    if positions is None:
         return 0, [], 0, None
+    net_balances, total_investment = positions
     
-    # 按币种统计买入和卖出数量
-    coin_balances = {}  # 格式: {symbol: {'bought': 数量, 'sold': 数量, 'investment': 投入金额}}
-    total_investment = 0
+    # 批量获取价格数据，减少API调用次数
+    assets = []
+    total_assets = 0
     
-    logger.info(f"开始处理 {len(transactions)} 条交易记录")
+    logger.debug("开始计算资产价值，净持仓: %s", net_balances)
     
-    for tx in transactions:
-        symbol = tx.symbol.split('-')[0]  # 例如从"BTC-USDT"提取"BTC"
-        logger.info(f"处理交易: ID={tx.id}, 币种={symbol}, 方向={tx.direction}, 金额={tx.amount}")
-        
-        if symbol not in coin_balances:
-            coin_balances[symbol] = {'bought': 0, 'sold': 0, 'investment': 0}
-        
+    if net_balances:
         try:
-            # 解析交易响应获取实际成交数量和金额
-            if tx.response:
-                response_data = json.loads(tx.response)
-                logger.info(f"交易 {tx.id} 响应数据: {response_data}")
-                
-                # 检查是否有成交详情
-                if 'fill_details' in response_data and response_data['fill_details']:
-                    fill_data = response_data['fill_details']
-                    
-                    # 获取成交数量
-                    if 'fillSz' in fill_data and fill_data['fillSz']:
-                        try:
-                            fill_size = float(fill_data['fillSz'])
-                            
-                            # 买入交易增加持仓数量和投入金额
-                            if tx.direction == "buy":
-                                coin_balances[symbol]['bought'] += fill_size
-                                
-                                # 获取成交金额
-                                if 'fillAmt' in fill_data and fill_data['fillAmt']:
-                                    try:
-                                        fill_amount = float(fill_data['fillAmt'])
-                                        coin_balances[symbol]['investment'] += fill_amount
-                                        total_investment += fill_amount
-                                    except (ValueError, TypeError):
-                                        # 如果无法获取成交金额，使用订单金额
-                                        coin_balances[symbol]['investment'] += tx.amount
-                                        total_investment += tx.amount
-                                else:
-                                    coin_balances[symbol]['investment'] += tx.amount
-                                    total_investment += tx.amount
-                            
-                            # 卖出交易减少持仓数量和投入金额
-                            elif tx.direction == "sell":
-                                coin_balances[symbol]['sold'] += fill_size
-                                
-                                # 获取成交金额
-                                if 'fillAmt' in fill_data and fill_data['fillAmt']:
-                                    try:
-                                        fill_amount = float(fill_data['fillAmt'])
-                                        coin_balances[symbol]['investment'] -= fill_amount
-                                        total_investment -= fill_amount
-                                    except (ValueError, TypeError):
-                                        # 如果无法获取成交金额，使用订单金额
-                                        coin_balances[symbol]['investment'] -= tx.amount
-                                        total_investment -= tx.amount
-                                else:
-                                    coin_balances[symbol]['investment'] -= tx.amount
-                                    total_investment -= tx.amount
-                                
-                        except (ValueError, TypeError):
-                            # 如果无法解析成交数量，使用默认逻辑
-                            if tx.direction == "buy":
-                                coin_balances[symbol]['investment'] += tx.amount
-                                total_investment += tx.amount
-                            elif tx.direction == "sell":
-                                coin_balances[symbol]['investment'] -= tx.amount
-                                total_investment -= tx.amount
-                    else:
-                        # 如果无法获取成交数量，使用默认逻辑
-                        if tx.direction == "buy":
-                            coin_balances[symbol]['investment'] += tx.amount
-                            total_investment += tx.amount
-                        elif tx.direction == "sell":
-                            coin_balances[symbol]['investment'] -= tx.amount
-                            total_investment -= tx.amount
-                else:
-                    # 如果没有成交详情，使用默认逻辑
-                    if tx.direction == "buy":
-                        coin_balances[symbol]['investment'] += tx.amount
-                        total_investment += tx.amount
-                    elif tx.direction == "sell":
-                        coin_balances[symbol]['investment'] -= tx.amount
-                        total_investment -= tx.amount
+            # 优先读取内存中的实时行情，否则使用共享的全量行情快照
+            snapshot = get_feed_snapshot(net_balances)
+            if snapshot is None:
+                try:
+                    snapshot = shared_ticker_snapshots.get(
+                        lambda: client._request('GET', 'market/tickers', params={'instType': 'SPOT'}, use_cache=False)
+                    )
+                except TickerSnapshotError as e:
+                    logger.error(f"批量获取价格失败: {str(e)}")
+            
+            if snapshot is not None:
+                valued = value_dca_positions(net_balances, snapshot)
             else:
-                # 如果没有响应数据，使用默认逻辑
-                if tx.direction == "buy":
-                    coin_balances[symbol]['investment'] += tx.amount
-                    total_investment += tx.amount
-                elif tx.direction == "sell":
-                    coin_balances[symbol]['investment'] -= tx.amount
-                    total_investment -= tx.amount
-                
-        except (json.JSONDecodeError, KeyError) as e:
-            # 如果解析失败，使用默认逻辑
-            if tx.direction == "buy":
-                coin_balances[symbol]['investment'] += tx.amount
-                total_investment += tx.amount
-            elif tx.direction == "sell":
-                coin_balances[symbol]['investment'] -= tx.amount
-                total_investment -= tx.amount
-    
-    # 计算每种币的净持仓数量
-    net_balances = {}
-    for symbol, data in coin_balances.items():
-        net_balance = data['bought'] - data['sold']
-        if net_balance > 0:
-            net_balances[symbol] = net_balance
+                # 回退到单个获取，所有币种合并为一次批量请求（代理模式下只有一次往返）
+                symbols = [symbol for symbol, balance in net_balances.items() if balance > 0]
+                results = client.batch_request([
+                    {'method': 'GET', 'endpoint': 'market/ticker', 'params': {'instId': f"{symbol}-USDT"}}
+                    for symbol in symbols
+                ])
+                ticker_results = dict(zip(symbols, results))
+                valued = value_dca_positions_by_ticker(net_balances, ticker_results)
+            
+            total_assets, assets = valued
+        except Exception as e:
+            logger.exception(f"批量获取价格异常: {str(e)}")
+    
+    logger.info(f"资产计算完成: 总资产={total_assets}, 币种数量={len(assets)}")
+    return total_assets, assets, total_investment, None
+
+
+async def calculate_dca_assets_and_investment_async(client):
+    """计算定投策略的资产价值、投入和收益（asyncio版本，数据库汇总在线程池中执行）"""
+    positions = await asyncio.to_thread(load_dca_positions)
+    
+    # 如果没有交易记录，直接返回0值
+    if positions is None:
+        return 0, [], 0, None
+    net_balances, total_investment = positions
     
-    # 批量获取价格数据，减少API调用次数
     assets = []
     total_assets = 0
     
-    logger.info(f"开始计算资产价值，净持仓: {net_balances}")
+    logger.debug("开始计算资产价值，净持仓: %s", net_balances)
     
     if net_balances:
         try:
-            # 批量获取所有币种的价格
-            symbols_to_fetch = [f"{symbol}-USDT" for symbol in net_balances.keys()]
-            logger.info(f"批量获取价格: {symbols_to_fetch}")
-            
-            # 使用批量接口获取所有价格
-            all_tickers_result = client._request('GET', 'market/tickers', params={'instType': 'SPOT'})
+            snapshot = get_feed_snapshot(net_balances)
+            if snapshot is None:
+                try:
+                    snapshot = await shared_ticker_snapshots.get_async(
+                        lambda: client._request('GET', 'market/tickers', params={'instType': 'SPOT'}, use_cache=False)
+                    )
+                except TickerSnapshotError as e:
+                    logger.error(f"批量获取价格失败: {str(e)}")
             
-            if all_tickers_result.get('code') == '0':
-                # 创建价格映射
-                price_map = {}
-                for ticker in all_tickers_result.get('data', []):
-                    inst_id = ticker.get('instId', '')
-                    if inst_id in symbols_to_fetch:
-                        try:
-                            price = float(ticker.get('last', 0))
-                            if price > 0:
-                                symbol = inst_id.split('-')[0]
-                                price_map[symbol] = price
-                        except (ValueError, TypeError):
-                            continue
-                
-                logger.info(f"获取到价格映射: {price_map}")
-                
-                # 计算每个币种的价值
-                for symbol, balance in net_balances.items():
-                    if balance > 0 and symbol in price_map:
-                        price = price_map[symbol]
-                        value_in_usdt = balance * price
-                        
-                        logger.info(f"{symbol}: 数量={balance}, 价格={price}, 价值={value_in_usdt}")
-                        
-                        assets.append({
-                            "currency": symbol,
-                            "amount": balance,
-                            "valueInUsdt": value_in_usdt
-                        })
-                        
-                        total_assets += value_in_usdt
-                    elif balance > 0:
-                        logger.warning(f"未找到 {symbol} 的价格数据")
+            if snapshot is not None:
+                valued = value_dca_positions(net_balances, snapshot)
             else:
-                logger.error(f"批量获取价格失败: {all_tickers_result}")
-                # 回退到单个获取
-                for symbol, balance in net_balances.items():
-                    if balance > 0:
-                        try:
-                            ticker_symbol = f"{symbol}-USDT"
-                            ticker_result = client.get_ticker(ticker_symbol)
-                            
-                            if ticker_result.get('code') == '0' and ticker_result.get('data'):
-                                price = float(ticker_result['data'][0].get('last', 0))
-                                value_in_usdt = balance * price
-                                
-                                assets.append({
-                                    "currency": symbol,
-                                    "amount": balance,
-                                    "valueInUsdt": value_in_usdt
-                                })
-                                
-                                total_assets += value_in_usdt
-                        except Exception as e:
-                            logger.exception(f"处理 {symbol} 资产时出错: {str(e)}")
-                            continue
+                # 回退到单个获取，所有币种合并为一次批量请求（代理模式下只有一次往返）
+                symbols = [symbol for symbol, balance in net_balances.items() if balance > 0]
+                results = await client.batch_request([
+                    {'method': 'GET', 'endpoint': 'market/ticker', 'params': {'instId': f"{symbol}-USDT"}}
+                    for symbol in symbols
+                ])
+                ticker_results = dict(zip(symbols, results))
+                valued = value_dca_positions_by_ticker(net_balances, ticker_results)
+            
+            total_assets, assets = valued
         except Exception as e:
             logger.exception(f"批量获取价格异常: {str(e)}")
     
-    logger.info(f"资产计算完成: 总资产={total_assets}, 资产列表={assets}")
+    logger.info(f"资产计算完成: 总资产={total_assets}, 币种数量={len(assets)}")
     return total_assets, assets, total_investment, None
 
 
@@ -1586,7 +1404,7 @@ def get_strategy_info(db):
 
 
 @app.get("/api/account/total-assets")
-def get_total_assets():
+async def get_total_assets():
     """获取OKX账户总资产"""
     try:
         # 获取API配置
@@ -1595,13 +1413,13 @@ def get_total_assets():
             return {"totalAssets": 0, "error": "未配置API密钥"}
         
         # 创建客户端
-        client = create_okx_client(
+        client = create_async_okx_client(
             api_key=api_config['api_key'],
             secret_key=api_config['secret_key'],
             passphrase=api_config['passphrase']
         )
-        result = client.get_account_balance()
-        logger.info(f"OKX账户余额API响应: {result}")
+        result = await client.get_account_balance()
+        log_payload("OKX账户余额API响应", result)
         
         # 检查API响应
         if result.get('code') != '0':
@@ -1626,7 +1444,7 @@ def get_total_assets():
         return {"totalAssets": 0, "error": f"获取总资产异常: {str(e)}"}
 
 @app.get("/api/account/usdt-balance")
-def get_usdt_balance():
+async def get_usdt_balance():
     """获取OKX账户中的USDT余额"""
     # 获取API配置
     api_config = config_service.get_decrypted_api_config()
@@ -1636,15 +1454,15 @@ def get_usdt_balance():
     try:
         
         # 创建OKX客户端
-        client = create_okx_client(
+        client = create_async_okx_client(
             api_key=api_config['api_key'], 
             secret_key=api_config['secret_key'], 
             passphrase=api_config['passphrase']
         )
         
         # 获取账户余额 - 使用正确的API调用
-        balance_result = client.get_account_balance()
-        logger.info(f"获取账户余额API响应: {balance_result}")
+        balance_result = await client.get_account_balance()
+        log_payload("获取账户余额API响应", balance_result)
         
         if balance_result.get('code') != '0':
             error_msg = balance_result.get('msg', '未知错误')
@@ -1654,7 +1472,6 @@ def get_usdt_balance():
         # 查找USDT余额
         usdt_balance = 0
         data = balance_result.get('data', [])
-        logger.info(f"余额数据: {data}")
         
         for item in data:
             details = item.get('details', [])
@@ -1664,7 +1481,6 @@ def get_usdt_balance():
                     avail_bal = balance.get('availBal', '0')
                     try:
                         usdt_balance = float(avail_bal)
-                        logger.info(f"找到USDT余额: {usdt_balance}")
                         break
                     except (ValueError, TypeError) as e:
                         logger.warning(f"解析USDT余额失败: {avail_bal}, 错误: {str(e)}")
@@ -1675,60 +1491,98 @@ def get_usdt_balance():
             total_eq = item.get('totalEq', '0')
             try:
                 total_assets = float(total_eq)
-                logger.info(f"找到总资产: {total_assets}")
                 break
             except (ValueError, TypeError):
                 logger.warning(f"无法解析总资产值: {total_eq}")
         
         logger.info(f"最终USDT余额: {usdt_balance}, 总资产: {total_assets}")
-        import json
-        result = {
+        return {
             "balance": float(usdt_balance),
             "totalAssets": float(total_assets)
         }
-        logger.info(f"返回结果JSON: {json.dumps(result)}")
-        return result
-        logger.info(f"返回结果: {result}")
-        return result
     
     except Exception as e:
         logger.exception(f"获取USDT余额异常: {str(e)}")
         return {"balance": 0, "error": f"获取余额异常: {str(e)}"}
 
-@app.get("/api/assets/overview")
-def get_assets_overview(force_refresh: bool = False):
-    """获取定投策略的资产概览数据，包括总资产、总投入、总收益和资产分布"""
-    global assets_cache
+def _assets_error_result(error):
+    """构建资产概览的错误结果（同样写入缓存，避免频繁重试）"""
+    result = {
+        "totalAssets": 0,
+        "totalInvestment": 0,
+        "totalProfit": 0,
+        "assetDistribution": [],
+        "error": error,
+        "lastUpdated": datetime.now(TIMEZONE).isoformat()
+    }
+    return result
+
+def _build_assets_overview(total_assets, assets, total_investment, error):
+    """根据资产计算结果构建资产概览"""
+    logger.info(f"资产计算结果: 总资产={total_assets}, 总投入={total_investment}, 资产数量={len(assets)}")
+    
+    if error:
+        logger.error(f"计算资产数据时出错: {error}")
+        return _assets_error_result(error)
+    
+    # 2. 计算总收益
+    total_profit = total_assets - total_investment
     
-    # 检查缓存是否有效
-    current_time = time.time()
-    if not force_refresh and assets_cache["data"] and (current_time - assets_cache["timestamp"]) < assets_cache["ttl"]:
-        return assets_cache["data"]
+    # 3. 计算资产分布
+    full_asset_distribution = calculate_asset_distribution(assets, total_assets)
+    
+    # 简化资产分布数据，只返回前端需要的字段
+    simplified_distribution = []
+    for asset in full_asset_distribution:
+        simplified_distribution.append({
+            "currency": asset["currency"],
+            "percentage": asset["percentage"],
+            "valueInUsdt": asset["valueInUsdt"]
+        })
+    
+    # 获取策略信息
+    db_for_strategy = SessionLocal()
+    try:
+        strategy_info = get_strategy_info(db_for_strategy)
+    finally:
+        db_for_strategy.close()
+    
+    # 构建结果
+    result = {
+        "totalAssets": total_assets,
+        "totalInvestment": total_investment,
+        "totalProfit": total_profit,
+        "assetDistribution": simplified_distribution,
+        "strategyInfo": strategy_info,
+        "lastUpdated": datetime.now(TIMEZONE).isoformat()
+    }
     
+    return result
+
+def get_assets_overview(force_refresh: bool = False):
+    """获取定投策略的资产概览数据（同步版本，供定时任务使用）"""
+    if force_refresh:
+        result = compute_assets_overview()
+        assets_cache.set(ASSETS_OVERVIEW_KEY, result)
+        return result
+    return assets_cache.get_or_compute(ASSETS_OVERVIEW_KEY, compute_assets_overview)
+
+def compute_assets_overview():
+    """计算资产概览（同步版本）"""
     # 获取API配置
     api_config = config_service.get_decrypted_api_config()
     
     if not api_config:
-        result = {
-            "totalAssets": 0,
-            "totalInvestment": 0,
-            "totalProfit": 0,
-            "assetDistribution": [],
-            "error": "API配置不完整，请先在配置中心设置OKX API密钥",
-            "lastUpdated": datetime.now(TIMEZONE).isoformat()
-        }
         # 即使没有配置也要缓存结果，避免频繁查询数据库
-        assets_cache["data"] = result
-        assets_cache["timestamp"] = current_time
-        return result
+        return _assets_error_result("API配置不完整，请先在配置中心设置OKX API密钥")
     
     try:
-        api_key = api_config["api_key"]
-        secret_key = api_config["secret_key"]
-        passphrase = api_config["passphrase"]
-        
         # 创建OKX客户端
-        client = create_okx_client(api_key=api_key, secret_key=secret_key, passphrase=passphrase)
+        client = create_okx_client(
+            api_key=api_config["api_key"],
+            secret_key=api_config["secret_key"],
+            passphrase=api_config["passphrase"]
+        )
         
         # 1. 计算定投策略的资产价值、投入和收益
         logger.info("开始计算定投策略资产数据")
@@ -1737,75 +1591,61 @@ def get_assets_overview(force_refresh: bool = False):
             total_assets, assets, total_investment, error = calculate_dca_assets_and_investment(db, client)
         finally:
             db.close()
-        logger.info(f"资产计算结果: 总资产={total_assets}, 总投入={total_investment}, 资产数量={len(assets)}")
-        
-        if error:
-            logger.error(f"计算资产数据时出错: {error}")
-            result = {
-                "totalAssets": 0,
-                "totalInvestment": 0,
-                "totalProfit": 0,
-                "assetDistribution": [],
-                "error": error,
-                "lastUpdated": datetime.now(TIMEZONE).isoformat()
-            }
-            # 缓存错误结果，避免频繁重试
-            assets_cache["data"] = result
-            assets_cache["timestamp"] = current_time
-            return result
-        
-        # 2. 计算总收益
-        total_profit = total_assets - total_investment
         
-        # 3. 计算资产分布
-        full_asset_distribution = calculate_asset_distribution(assets, total_assets)
-        
-        # 简化资产分布数据，只返回前端需要的字段
-        simplified_distribution = []
-        for asset in full_asset_distribution:
-            simplified_distribution.append({
-                "currency": asset["currency"],
-                "percentage": asset["percentage"],
-                "valueInUsdt": asset["valueInUsdt"]
-            })
-        
-        # 获取策略信息
-        db_for_strategy = SessionLocal()
-        try:
-            strategy_info = get_strategy_info(db_for_strategy)
-        finally:
-            db_for_strategy.close()
-        
-        # 构建结果
-        result = {
-            "totalAssets": total_assets,
-            "totalInvestment": total_investment,
-            "totalProfit": total_profit,
-            "assetDistribution": simplified_distribution,
-            "strategyInfo": strategy_info,
-            "lastUpdated": datetime.now(TIMEZONE).isoformat()
-        }
+        return _build_assets_overview(total_assets, assets, total_investment, error)
+    
+    except Exception as e:
+        logger.exception(f"获取资产概览异常: {str(e)}")
+        return _assets_error_result(f"服务器异常: {str(e)}")
+
+@app.get("/api/assets/overview")
+async def get_assets_overview_api(request: Request, response: Response, force_refresh: bool = False):
+    """获取定投策略的资产概览数据，包括总资产、总投入、总收益和资产分布"""
+    # 缓存中的概览未变化时直接返回304（缓存版本号只在本进程内有效，ETag 带上进程标识）
+    version = assets_cache.peek_version(ASSETS_OVERVIEW_KEY)
+    if version is not None and not force_refresh:
+        not_modified = conditional_response(request, response, BOOT_ID, "overview", version)
+        if not_modified is not None:
+            return not_modified
+    
+    if force_refresh:
+        result = await compute_assets_overview_async()
+        assets_cache.set(ASSETS_OVERVIEW_KEY, result)
+    else:
+        result = await assets_cache.get_or_compute_async(ASSETS_OVERVIEW_KEY, compute_assets_overview_async)
+    
+    version = assets_cache.peek_version(ASSETS_OVERVIEW_KEY)
+    if version is not None:
+        set_etag(response, compute_etag(BOOT_ID, "overview", version))
+    return result
+
+async def compute_assets_overview_async():
+    """计算资产概览（asyncio版本）"""
+    # 获取API配置
+    api_config = config_service.get_decrypted_api_config()
+    
+    if not api_config:
+        # 即使没有配置也要缓存结果，避免频繁查询数据库
+        return _assets_error_result("API配置不完整，请先在配置中心设置OKX API密钥")
+    
+    try:
+        client = create_async_okx_client(
+            api_key=api_config["api_key"],
+            secret_key=api_config["secret_key"],
+            passphrase=api_config["passphrase"]
+        )
         
-        # 更新缓存
-        assets_cache["data"] = result
-        assets_cache["timestamp"] = current_time
+        # 1. 计算定投策略的资产价值、投入和收益
+        logger.info("开始计算定投策略资产数据")
+        total_assets, assets, total_investment, error = await calculate_dca_assets_and_investment_async(client)
         
-        return result
+        return await asyncio.to_thread(
+            _build_assets_overview, total_assets, assets, total_investment, error
+        )
     
     except Exception as e:
         logger.exception(f"获取资产概览异常: {str(e)}")
-        result = {
-            "totalAssets": 0,
-            "totalInvestment": 0,
-            "totalProfit": 0,
-            "assetDistribution": [],
-            "error": f"服务器异常: {str(e)}",
-            "lastUpdated": datetime.now(TIMEZONE).isoformat()
-        }
-        # 缓存错误结果，避免频繁重试
-        assets_cache["data"] = result
-        assets_cache["timestamp"] = current_time
-        return result
+        return _assets_error_result(f"服务器异常: {str(e)}")
 
 def get_strategy_info(db):
     """获取策略基本信息"""
@@ -1845,24 +1685,30 @@ def health_check():
 
 
 @app.get("/api/market/tickers")
-def get_market_tickers():
+async def get_market_tickers(request: Request, response: Response):
     """获取配置币种的行情数据"""
-    return market_service.get_configured_coins_market_data()
+    # 有内存行情时按行情时间戳判断是否变化；需要请求交易所时不做条件判断
+    version = market_service.get_configured_tickers_version()
+    if version is not None:
+        not_modified = conditional_response(request, response, "tickers", version)
+        if not_modified is not None:
+            return not_modified
+    return fast_json_response(await market_service.get_configured_coins_market_data_async(), response)
 
 @app.get("/api/market/ticker/{symbol}")
-def get_ticker_info(symbol: str):
+async def get_ticker_info(symbol: str):
     """获取单个币种的行情信息"""
-    return market_service.get_ticker_info(symbol)
+    return await market_service.get_ticker_info_async(symbol)
 
 @app.get("/api/market/summary")
-def get_market_summary():
+async def get_market_summary():
     """获取市场概览数据"""
-    return market_service.get_market_summary()
+    return await market_service.get_market_summary_async()
 
 @app.get("/api/market/search")
-def search_coins(keyword: str, limit: int = 20):
+async def search_coins(keyword: str, limit: int = 20):
     """搜索币种"""
-    return market_service.search_coins(keyword, limit)
+    return await market_service.search_coins_async(keyword, limit)
 
 @app.get("/api/debug/status")
 def debug_status():
@@ -1872,22 +1718,44 @@ def debug_status():
         "environment": env,
         "timezone": str(TIMEZONE),
         "scheduler_running": scheduler.running,
-        "jobs_count": len(scheduler.get_jobs())
+        "jobs_count": len(scheduler.get_jobs()),
+        "leader": leader_election.get_stats(),
+        "dispatcher": plan_dispatcher.get_stats(),
+        "ticker_feed": ticker_feed.get_stats(),
+        "ticker_snapshot": shared_ticker_snapshots.get_stats(),
+        "config_snapshot": config_service.get_snapshot_stats(),
+        "execution": execution_engine.get_stats(),
+        "order_batch": order_batcher.get_stats(),
+        "fill_reconciler": fill_reconciler.get_stats(),
+        "asset_series": asset_series.get_stats(),
+        "caches": shared_caches.get_stats(),
+        "proxy_relay": proxy_relay.get_stats(),
+        "stream": {**event_broadcaster.get_stats(), "publisher": live_publisher.get_stats()}
+    }
+
+@app.get("/api/debug/clients")
+def debug_clients():
+    """OKX客户端注册表、连接池和缓存统计（relay 为代理转发接口使用的单独注册表）"""
+    return {**get_client_registry_stats(), "relay": get_relay_registry_stats()}
+
+@app.get("/api/debug/db")
+def debug_db():
+    """数据库PRAGMA、连接池与会话追踪统计（设置 DB_SESSION_TRACKING=1 后可查看未关闭会话的存活时间和打开位置）"""
+    return {
+        "database": get_database_settings(),
+        "sessions": get_session_stats()
     }
 
 
 @app.get("/api/plans")
-def get_dca_plans():
+def get_dca_plans(db: Session = Depends(get_db)):
     """获取所有DCA计划"""
-    db = next(get_db())
     plans = db.query(DCAPlan).order_by(DCAPlan.created_at.desc()).all()
     return [DCAPlanOut.from_orm(plan) for plan in plans]
 
 @app.post("/api/plans")
-def create_dca_plan(plan: DCAPlanCreate):
+def create_dca_plan(plan: DCAPlanCreate, db: Session = Depends(get_db)):
     """创建DCA计划"""
-    db = next(get_db())
-    
     try:
         new_plan = DCAPlan(
             title=plan.title,
@@ -1907,6 +1775,7 @@ def create_dca_plan(plan: DCAPlanCreate):
         
         # 调度任务
         schedule_task(new_plan)
+        refresh_ticker_feed_symbols()
         
         return DCAPlanOut.from_orm(new_plan)
         
@@ -1916,10 +1785,8 @@ def create_dca_plan(plan: DCAPlanCreate):
         raise HTTPException(status_code=500, detail=f"创建计划失败: {str(e)}")
 
 @app.put("/api/plans/{plan_id}")
-def update_dca_plan(plan_id: int, plan: DCAPlanCreate):
+def update_dca_plan(plan_id: int, plan: DCAPlanCreate, db: Session = Depends(get_db)):
     """更新DCA计划"""
-    db = next(get_db())
-    
     try:
         existing_plan = db.query(DCAPlan).filter(DCAPlan.id == plan_id).first()
         if not existing_plan:
@@ -1939,6 +1806,7 @@ def update_dca_plan(plan_id: int, plan: DCAPlanCreate):
         
         # 重新调度任务
         schedule_task(existing_plan, check_missed=True)
+        refresh_ticker_feed_symbols()
         
         return DCAPlanOut.from_orm(existing_plan)
         
@@ -1950,23 +1818,20 @@ def update_dca_plan(plan_id: int, plan: DCAPlanCreate):
         raise HTTPException(status_code=500, detail=f"更新计划失败: {str(e)}")
 
 @app.delete("/api/plans/{plan_id}")
-def delete_dca_plan(plan_id: int):
+def delete_dca_plan(plan_id: int, db: Session = Depends(get_db)):
     """删除DCA计划"""
-    db = next(get_db())
-    
     try:
         plan = db.query(DCAPlan).filter(DCAPlan.id == plan_id).first()
         if not plan:
             raise HTTPException(status_code=404, detail="计划不存在")
         
         # 移除调度任务
-        job_id = f"dca_task_{plan_id}"
-        if scheduler.get_job(job_id):
-            scheduler.remove_job(job_id)
+        unschedule_task(plan_id)
         
         # 删除计划
         db.delete(plan)
         db.commit()
+        refresh_ticker_feed_symbols()
         
         return {"message": "计划删除成功"}
         
@@ -1978,10 +1843,8 @@ def delete_dca_plan(plan_id: int):
         raise HTTPException(status_code=500, detail=f"删除计划失败: {str(e)}")
 
 @app.post("/api/plans/{plan_id}/toggle")
-def toggle_dca_plan(plan_id: int):
+def toggle_dca_plan(plan_id: int, db: Session = Depends(get_db)):
     """启用/禁用DCA计划"""
-    db = next(get_db())
-    
     try:
         plan = db.query(DCAPlan).filter(DCAPlan.id == plan_id).first()
         if not plan:
@@ -1993,6 +1856,7 @@ def toggle_dca_plan(plan_id: int):
         
         # 重新调度任务
         schedule_task(plan)
+        refresh_ticker_feed_symbols()
         
         return {"message": f"计划已{'启用' if plan.status == 'enabled' else '禁用'}"}
         
@@ -2003,35 +1867,155 @@ def toggle_dca_plan(plan_id: int):
         logger.exception(f"切换DCA计划状态异常: {str(e)}")
         raise HTTPException(status_code=500, detail=f"操作失败: {str(e)}")
 
-# 代理接口
+# 代理接口：复用按凭证缓存的直连客户端，公共行情在调用方之间共享短时缓存
+proxy_relay = ProxyRelay(get_direct_okx_client, get_direct_async_okx_client, get_relay_session_fernet)
+
+def _session_expired_result(e):
+    return {"code": SESSION_EXPIRED, "msg": str(e)}
+
+@app.post("/api/proxy/okx/session")
+def open_proxy_session(request_data: dict):
+    """用凭证换取会话令牌，之后的代理请求只需携带 token，不再发送密钥"""
+    return proxy_relay.open_session(
+        request_data.get('api_key'), request_data.get('secret_key'), request_data.get('passphrase')
+    )
+
 @app.post("/api/proxy/okx")
 def proxy_okx_request(request_data: dict):
-    """代理OKX API请求"""
+    """代理OKX API请求，凭证通过 token 或 api_key/secret_key/passphrase 提供"""
     try:
         method = request_data.get('method')
         endpoint = request_data.get('endpoint')
         params = request_data.get('params', {})
         data = request_data.get('data', {})
-        api_key = request_data.get('api_key')
-        secret_key = request_data.get('secret_key')
-        passphrase = request_data.get('passphrase')
+        try:
+            credentials = proxy_relay.resolve_credentials(request_data)
+        except SessionError as e:
+            return _session_expired_result(e)
         
-        if not all([method, endpoint, api_key, secret_key, passphrase]):
+        if not all([method, endpoint, credentials]):
             return {"code": "ERROR", "msg": "缺少必要参数"}
         
-        # 创建直连的OKX客户端（在服务器上）
-        client = OKXClient(api_key=api_key, secret_key=secret_key, passphrase=passphrase)
-        
-        # 转发请求
-        result = client._request(method, endpoint, params, data)
-        return result
+        # 转发请求（服务器上的直连客户端）
+        return proxy_relay.forward(credentials, method, endpoint, params or None, data or None)
         
     except Exception as e:
         logger.exception(f"代理请求异常: {str(e)}")
         return {"code": "ERROR", "msg": f"代理请求失败: {str(e)}"}
 
-# 启动时初始化调度器
+@app.post("/api/proxy/okx/batch")
+async def proxy_okx_batch_request(request_data: dict):
+    """
+    批量代理OKX API请求：一次往返转发多个子请求，在服务器上并发执行
+
+    请求体包含凭证（token 或 api_key/secret_key/passphrase）和 requests（子请求列表，每项包含
+    method, endpoint，可选 params, data）；返回 {"code": "0", "data": [...]}，结果顺序与子请求一致，
+    单个子请求失败不影响其他子请求
+    """
+    calls = request_data.get('requests')
+    try:
+        credentials = proxy_relay.resolve_credentials(request_data)
+    except SessionError as e:
+        return _session_expired_result(e)
+    
+    if not credentials or not isinstance(calls, list):
+        return {"code": "ERROR", "msg": "缺少必要参数"}
+    
+    try:
+        return await proxy_relay.forward_batch(credentials, calls)
+    except Exception as e:
+        logger.exception(f"批量代理请求异常: {str(e)}")
+        return {"code": "ERROR", "msg": f"批量代理请求失败: {str(e)}"}
+
+# 启动时竞争主进程，主进程初始化调度器
+# 实时事件推送：单个生产者读取行情、资产和交易状态，变化部分广播给所有SSE连接
+def read_live_assets():
+    """读取缓存中的资产汇总（不触发计算）"""
+    overview = assets_cache.peek(ASSETS_OVERVIEW_KEY)
+    if not overview or "error" in overview:
+        return None
+    return {key: overview.get(key) for key in ("totalAssets", "totalInvestment", "totalProfit", "lastUpdated")}
+
+
+def read_new_transactions(after_id: Optional[int]):
+    """读取 after_id 之后新写入的交易记录（每次最多100条），以及当前的交易版本号"""
+    db = SessionLocal()
+    try:
+        version = db.execute(
+            text("SELECT version FROM sync_state WHERE name = :name"), {"name": TRANSACTION_VERSION}
+        ).scalar()
+        if after_id is None:
+            return [], db.query(func.max(Transaction.id)).scalar(), version
+        rows = db.query(
+            Transaction.id, Transaction.plan_id, Transaction.symbol, Transaction.amount,
+            Transaction.direction, Transaction.status, Transaction.fill_status, Transaction.executed_at
+        ).filter(Transaction.id > after_id).order_by(Transaction.id.asc()).limit(100).all()
+        data = [{
+            "id": row.id,
+            "planId": row.plan_id,
+            "symbol": row.symbol,
+            "amount": row.amount,
+            "direction": row.direction,
+            "status": row.status,
+            "fillStatus": row.fill_status,
+            "executedAt": row.executed_at.isoformat() if row.executed_at else None
+        } for row in rows]
+        return data, rows[-1].id if rows else after_id, version
+    finally:
+        db.close()
+
+
+event_broadcaster = EventBroadcaster(snapshot_provider=lambda: live_publisher.snapshot())
+live_publisher = LiveStatePublisher(
+    event_broadcaster,
+    ticker_reader=market_service.get_cached_configured_tickers,
+    assets_reader=read_live_assets,
+    transaction_reader=read_new_transactions
+)
+
+
+@app.get("/api/stream")
+async def event_stream(request: Request, last_event_id: Optional[str] = Header(None)):
+    """
+    SSE 实时事件流
+
+    事件类型：snapshot（连接时的完整状态）、tickers（变化的行情）、assets（资产汇总）、
+    execution（新执行的交易）、transactions_changed（已有交易被修改）；
+    断线重连时浏览器自动携带 Last-Event-ID，缓冲区内的事件会补发
+    """
+    return StreamingResponse(
+        event_broadcaster.stream(request, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.on_event("startup")
 def startup_event():
-    logger.info("服务启动，初始化调度器")
-    init_scheduler()
+    logger.info("服务启动，竞争主进程")
+    # 成为主进程时恢复任务调度并继续对账未补全成交信息的订单
+    leader_election.start()
+    
+    # 启动行情推送，订阅配置币种和启用计划的交易对
+    refresh_ticker_feed_symbols()
+    ticker_feed.start()
+    live_publisher.start()
+    
+    if not leader_election.is_leader:
+        return
+    
+    # 启动时记录一次资产数据
+    try:
+        logger.info("启动时记录资产数据")
+        # 使用线程执行，避免阻塞启动过程
+        threading.Thread(target=record_asset_history).start()
+    except Exception as e:
+        logger.exception(f"启动时记录资产数据异常: {str(e)}")
+
+@app.on_event("shutdown")
+def shutdown_event():
+    # 主进程释放租约并停止调度和对账，其他进程随即接管
+    leader_election.stop()
+    live_publisher.stop()
+    ticker_feed.stop()
+    execution_engine.shutdown()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+后台管理命令
+
+用法:
+    python manage.py migrate             # 执行数据库迁移
+    python manage.py rebuild-positions   # 根据交易记录重建持仓台账
+    python manage.py bench-db            # 对比默认配置与调优配置下写入时的读取延迟
+    python manage.py bench-json          # 对比默认与快速JSON序列化的耗时及压缩前后的传输字节数
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from database import engine, SessionLocal, create_sqlite_engine
+from migrations import run_migrations
+from models import Base, Transaction
+
+
+def migrate(args):
+    executed = run_migrations(engine, Base.metadata)
+    if executed:
+        print(f"已执行迁移: {', '.join(executed)}")
+    else:
+        print("数据库已是最新版本")
+
+
+def rebuild_positions(args):
+    from services.position_service import PositionService
+
+    # 台账依赖成交列，重建前确保迁移已执行
+    run_migrations(engine, Base.metadata)
+    result = PositionService(SessionLocal).rebuild()
+    print(f"持仓台账重建完成: {result['transactions']} 条交易, {result['symbols']} 个币种")
+
+
+def _bench_profile(label, make_engine, seconds, readers):
+    """在临时数据库上持续写入，同时统计并发读取的延迟"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bench_engine = make_engine(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+        Base.metadata.create_all(bind=bench_engine)
+        with bench_engine.begin() as connection:
+            connection.execute(Transaction.__table__.insert(), [
+                {"plan_id": i % 20, "symbol": "BTC-USDT", "amount": 10, "direction": "buy",
+                 "status": "success", "response": "{}", "executed_at": datetime.utcnow()}
+                for i in range(5000)
+            ])
+
+        stop = threading.Event()
+        latencies, errors, writes = [], [0], [0]
+        lock = threading.Lock()
+
+        def writer():
+            while not stop.is_set():
+                try:
+                    with bench_engine.begin() as connection:
+                        connection.execute(Transaction.__table__.insert(), [
+                            {"plan_id": 1, "symbol": "ETH-USDT", "amount": 10, "direction": "buy",
+                             "status": "success", "response": "{}" * 200, "executed_at": datetime.utcnow()}
+                            for _ in range(50)
+                        ])
+                    writes[0] += 1
+                except Exception:
+                    errors[0] += 1
+
+        def reader():
+            query = Transaction.__table__.select().order_by(Transaction.executed_at.desc()).limit(50)
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    with bench_engine.connect() as connection:
+                        connection.execute(query).all()
+                    with lock:
+                        latencies.append((time.perf_counter() - started) * 1000)
+                except Exception:
+                    with lock:
+                        errors[0] += 1
+
+        threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        bench_engine.dispose()
+
+    latencies.sort()
+    count = len(latencies)
+
+    def pick(q):
+        return latencies[min(count - 1, int(count * q))] if count else 0
+
+    print(f"{label:<10} 读取 {count:>6} 次  p50 {pick(0.5):7.2f}ms  p95 {pick(0.95):7.2f}ms  "
+          f"p99 {pick(0.99):7.2f}ms  max {pick(1):8.2f}ms  写入批次 {writes[0]:>5}  错误 {errors[0]}")
+
+
+def bench_db(args):
+    from sqlalchemy import create_engine
+
+    print(f"并发读取线程 {args.readers} 个，每组 {args.seconds} 秒，写入线程持续批量插入")
+    _bench_profile(
+        "默认配置",
+        lambda url: create_engine(url, connect_args={"check_same_thread": False}),
+        args.seconds, args.readers
+    )
+    _bench_profile("调优配置", create_sqlite_engine, args.seconds, args.readers)
+
+
+def _bench_payloads(rows):
+    """构造与交易记录、资产历史、行情接口结构相同的测试数据"""
+    from datetime import timedelta
+
+    now = datetime.utcnow()
+    transactions = []
+    for i in range(rows):
+        raw = {"code": "0", "msg": "", "data": [{
+            "ordId": str(600000000000000000 + i), "clOrdId": f"dca{i}", "tag": "",
+            "sCode": "0", "sMsg": "Order placed", "ts": str(1700000000000 + i)
+        }], "inTime": str(1700000000000000 + i), "outTime": str(1700000000001000 + i)}
+        transactions.append({
+            "id": i + 1, "plan_id": i % 20, "plan_title": f"BTC定投任务{i % 20}",
+            "execution_count": i // 20 + 1, "symbol": "BTC-USDT", "amount": 10.0 + i % 7 * 0.1,
+            "direction": "buy", "status": "success", "response": json.dumps(raw),
+            "executed_at": now - timedelta(minutes=i), "trade_price": 43210.5 + i * 0.37,
+            "trade_quantity": 0.000231 + i * 1e-7, "fill_amount": 9.98, "order_id": raw["data"][0]["ordId"],
+            "is_estimated": False, "error_code": None
+        })
+    history = [
+        {"date": (now - timedelta(days=i)).isoformat(), "totalAssets": 10000.0 + i * 13.7,
+         "totalInvestment": 9000.0 + i * 10, "totalProfit": 1000.0 + i * 3.7}
+        for i in range(rows)
+    ]
+    tickers = [
+        {"symbol": f"C{i}-USDT", "price": 1.2345 + i, "change24h": -1.23, "volume24h": 123456789.12,
+         "high24h": 2.0 + i, "low24h": 1.0 + i, "timestamp": 1700000000000 + i}
+        for i in range(min(rows, 200))
+    ]
+    return {"transactions": transactions, "assets/history": history, "market/tickers": tickers}
+
+
+def _bench_time(func, repeat):
+    """多次执行取最短耗时（毫秒）"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_json(args):
+    from fastapi.encoders import jsonable_encoder
+    from utils.compression import compress, supported_encodings
+    from utils.fast_json import backend_name, dumps
+
+    def default_render(content):
+        # FastAPI 默认路径：jsonable_encoder 转换后由 JSONResponse 序列化
+        return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                          indent=None, separators=(",", ":")).encode("utf-8")
+
+    print(f"每个接口 {args.rows} 条数据，取 {args.repeat} 次中的最短耗时；快速序列化使用 {backend_name()}")
+    for name, payload in _bench_payloads(args.rows).items():
+        default_body = default_render(payload)
+        fast_body = dumps(payload)
+        if json.loads(default_body) != json.loads(fast_body):
+            print(f"{name}: 快速序列化结果与默认结果不一致")
+            continue
+        default_ms = _bench_time(lambda: default_render(payload), args.repeat)
+        fast_ms = _bench_time(lambda: dumps(payload), args.repeat)
+        print(f"/api/{name:<16} 序列化 默认 {default_ms:8.2f}ms  快速 {fast_ms:8.2f}ms  "
+              f"({default_ms / fast_ms:4.1f}x)  原始 {len(fast_body):>9} B")
+        for encoding in supported_encodings():
+            compressed = compress(fast_body, encoding)
+            compress_ms = _bench_time(lambda: compress(fast_body, encoding), args.repeat)
+            print(f"{'':<22}{encoding:<4} 压缩 {compress_ms:8.2f}ms  传输 {len(compressed):>9} B  "
+                  f"({len(compressed) / len(fast_body):6.1%})")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="OKX定投服务管理命令")
+    subparsers = parser.add_subparsers(dest="command")
+
+    migrate_parser = subparsers.add_parser("migrate", help="执行数据库迁移")
+    migrate_parser.set_defaults(func=migrate)
+
+    rebuild_parser = subparsers.add_parser("rebuild-positions", help="根据交易记录重建持仓台账")
+    rebuild_parser.set_defaults(func=rebuild_positions)
+
+    bench_parser = subparsers.add_parser("bench-db", help="对比默认配置与调优配置下写入时的读取延迟（使用临时数据库）")
+    bench_parser.add_argument("--seconds", type=float, default=5, help="每组测试时长（秒）")
+    bench_parser.add_argument("--readers", type=int, default=4, help="并发读取线程数")
+    bench_parser.set_defaults(func=bench_db)
+
+    bench_json_parser = subparsers.add_parser("bench-json", help="对比默认与快速JSON序列化的耗时及压缩前后的传输字节数")
+    bench_json_parser.add_argument("--rows", type=int, default=1000, help="每个接口的数据条数")
+    bench_json_parser.add_argument("--repeat", type=int, default=20, help="重复次数")
+    bench_json_parser.set_defaults(func=bench_json)
+
+    args = parser.parse_args()
+    if not getattr(args, "func", None):
+        parser.print_help()
+        sys.exit(1)
+
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
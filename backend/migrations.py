@@ -0,0 +1,182 @@
+"""
+数据库迁移模块
+create_all 只会创建缺失的表，不会给已有表添加列；这里按版本号顺序执行一次性迁移，
+已执行的版本记录在 schema_migrations 表中。
+
+多个工作进程启动时会同时执行迁移：全部迁移在同一个 BEGIN IMMEDIATE 事务中进行，
+后到的进程等待写锁释放后重新读取 schema_migrations，不会重复加列或重复登记版本
+"""
+import logging
+import os
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import bindparam, inspect, text
+
+from database import BUSY_TIMEOUT_MS
+from models import Transaction
+from services.transaction_service import extract_fill_columns, load_response
+
+logger = logging.getLogger(__name__)
+
+# 回填时每批处理的行数
+BACKFILL_BATCH_SIZE = 500
+
+# 等待其他进程完成迁移的最长时间（毫秒），回填历史数据可能远超普通写入的 busy_timeout
+MIGRATION_LOCK_TIMEOUT_MS = int(os.getenv("MIGRATION_LOCK_TIMEOUT_MS", "300000"))
+
+
+def _add_missing_columns(connection, table: str, columns: List[Tuple[str, str]]) -> None:
+    """为已有表补充缺失的列"""
+    existing = {column['name'] for column in inspect(connection).get_columns(table)}
+    for name, ddl_type in columns:
+        if name not in existing:
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl_type}"))
+            logger.info(f"表 {table} 新增列 {name}")
+
+
+def _backfill_fill_columns(connection, fields: Tuple[str, ...]) -> None:
+    """从 response JSON 分批回填 Transaction 的指定成交列"""
+    table = Transaction.__table__
+    statement = (
+        table.update()
+        .where(table.c.id == bindparam("row_id"))
+        .values({field: bindparam(field) for field in fields})
+    )
+    last_id, total = 0, 0
+    while True:
+        rows = connection.execute(
+            table.select()
+            .with_only_columns(table.c.id, table.c.status, table.c.response)
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            columns = extract_fill_columns(load_response(row.response), row.status)
+            updates.append({"row_id": row.id, **{field: columns[field] for field in fields}})
+        connection.execute(statement, updates)
+        last_id = rows[-1].id
+        total += len(rows)
+    logger.info(f"交易成交列回填完成: {total} 条")
+
+
+def migrate_transaction_fill_columns(connection) -> None:
+    """Transaction 新增成交列，并从 response JSON 分批回填历史数据"""
+    _add_missing_columns(connection, "transactions", [
+        ("fill_px", "FLOAT"),
+        ("fill_sz", "FLOAT"),
+        ("fill_amt", "FLOAT"),
+        ("ord_id", "VARCHAR"),
+        ("is_estimated", "BOOLEAN DEFAULT 0"),
+        ("error_code", "VARCHAR"),
+    ])
+    _backfill_fill_columns(connection, ("fill_px", "fill_sz", "fill_amt", "ord_id", "is_estimated", "error_code"))
+
+
+def migrate_transaction_execution_count(connection) -> None:
+    """
+    用窗口函数一次性计算并回填 execution_count：
+    即该任务截至本条交易（含）的成功执行次数。按 (executed_at, id) 逐行累计，
+    同一时间戳的多条交易按插入顺序递增，不会因默认的 RANGE 窗口而得到相同的计数
+    """
+    rows = connection.execute(text("""
+        SELECT id, SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END) OVER (
+            PARTITION BY plan_id ORDER BY executed_at, id ROWS UNBOUNDED PRECEDING
+        ) AS cnt
+        FROM transactions
+    """)).all()
+    for start in range(0, len(rows), BACKFILL_BATCH_SIZE):
+        connection.execute(
+            text("UPDATE transactions SET execution_count = :cnt WHERE id = :id"),
+            [{"id": row.id, "cnt": row.cnt} for row in rows[start:start + BACKFILL_BATCH_SIZE]]
+        )
+    logger.info(f"交易执行次数回填完成: {len(rows)} 条")
+
+
+def migrate_transaction_symbol_index(connection) -> None:
+    """按币种筛选交易记录并按时间分页时使用的索引"""
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS idx_symbol_executed_at ON transactions (symbol, executed_at)"
+    ))
+
+
+def migrate_transaction_fill_status(connection) -> None:
+    """
+    Transaction 新增成交对账状态列
+
+    历史记录按已有成交详情回填为 filled/estimated；没有成交详情的旧记录保持为空，
+    不会进入对账队列
+    """
+    _add_missing_columns(connection, "transactions", [("fill_status", "VARCHAR")])
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_transactions_fill_status ON transactions (fill_status)"
+    ))
+    _backfill_fill_columns(connection, ("fill_status",))
+
+
+def migrate_asset_history_index(connection) -> None:
+    """按时间范围查询资产历史记录使用的索引"""
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_asset_history_recorded_at ON asset_history (recorded_at)"
+    ))
+
+
+# 迁移列表：(版本号, 迁移函数)，只能在末尾追加；迁移函数在调用方的事务中执行，不要自行提交
+MIGRATIONS: List[Tuple[str, Callable]] = [
+    ("0001_transaction_fill_columns", migrate_transaction_fill_columns),
+    ("0002_transaction_execution_count", migrate_transaction_execution_count),
+    ("0003_transaction_symbol_index", migrate_transaction_symbol_index),
+    ("0004_transaction_fill_status", migrate_transaction_fill_status),
+    ("0005_asset_history_index", migrate_asset_history_index),
+]
+
+
+def run_migrations(engine, metadata=None) -> List[str]:
+    """
+    执行尚未执行的迁移
+
+    先用 BEGIN IMMEDIATE 取得写锁，再在锁内创建缺失的表、读取已执行版本并执行迁移，
+    最后一次性提交；任一迁移失败时整体回滚
+
+    Args:
+        engine: 数据库引擎
+        metadata: 需要先创建缺失表的元数据（如 Base.metadata），为空时不创建
+
+    Returns:
+        本次执行的迁移版本号列表
+    """
+    executed: List[str] = []
+    with engine.connect() as connection:
+        # pysqlite 不会自动发出 BEGIN，这里显式开启写事务；其他进程在锁等待时间内等待
+        connection.exec_driver_sql(f"PRAGMA busy_timeout={MIGRATION_LOCK_TIMEOUT_MS}")
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            if metadata is not None:
+                metadata.create_all(bind=connection)
+            connection.execute(text(
+                "CREATE TABLE IF NOT EXISTS schema_migrations (version VARCHAR PRIMARY KEY, applied_at DATETIME)"
+            ))
+            applied = {row[0] for row in connection.execute(text("SELECT version FROM schema_migrations"))}
+
+            for version, migration in MIGRATIONS:
+                if version in applied:
+                    continue
+                logger.info(f"执行数据库迁移: {version}")
+                migration(connection)
+                connection.execute(
+                    text("INSERT INTO schema_migrations (version, applied_at) VALUES (:version, :applied_at)"),
+                    {"version": version, "applied_at": datetime.utcnow()}
+                )
+                executed.append(version)
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+        finally:
+            # 连接归还连接池后恢复普通的等待时间
+            connection.exec_driver_sql(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    return executed
@@ -1,10 +1,13 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Float, Index
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Float, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 import base64
 import os
+import threading
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 
 Base = declarative_base()
 
@@ -49,14 +52,59 @@ class Transaction(Base):
     execution_count = Column(Integer, default=1)  # 任务执行次数
     executed_at = Column(DateTime, default=datetime.utcnow, index=True)
     
+    # 从 response 中提取的成交字段，写入时填充，旧数据由迁移回填
+    fill_px = Column(Float, nullable=True)  # 成交均价
+    fill_sz = Column(Float, nullable=True)  # 成交数量
+    fill_amt = Column(Float, nullable=True)  # 成交金额
+    ord_id = Column(String, nullable=True)  # 订单ID
+    is_estimated = Column(Boolean, default=False)  # 成交信息是否为估算值
+    error_code = Column(String, nullable=True)  # 失败交易的错误码
+    fill_status = Column(String, nullable=True, index=True)  # 成交对账状态: pending_fill, filled, estimated, canceled
+    
     # 添加复合索引来优化常用查询
     __table_args__ = (
         Index('idx_plan_executed_at', 'plan_id', 'executed_at'),
         Index('idx_status_executed_at', 'status', 'executed_at'),
         Index('idx_symbol_direction_status', 'symbol', 'direction', 'status'),
         Index('idx_plan_status_executed', 'plan_id', 'status', 'executed_at'),
+        Index('idx_symbol_executed_at', 'symbol', 'executed_at'),
     )
 
+# 持仓台账模型：按币种增量维护成功交易的累计持仓，避免每次全量扫描交易记录
+class PositionLedger(Base):
+    __tablename__ = "position_ledger"
+    symbol = Column(String, primary_key=True)  # 币种，如 BTC
+    bought_qty = Column(Float, default=0)  # 累计买入数量
+    sold_qty = Column(Float, default=0)  # 累计卖出数量
+    net_investment = Column(Float, default=0)  # 净投入金额（买入累加、卖出扣减）
+    last_tx_id = Column(Integer, default=0)  # 已计入台账的最后一条交易ID
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# 调度状态模型：持久化每个启用任务的调度参数和触发时间，启动时直接恢复而不必重新计算
+class SchedulerState(Base):
+    __tablename__ = "scheduler_state"
+    plan_id = Column(Integer, primary_key=True)
+    plan_hash = Column(String)  # 调度参数的摘要，用于判断任务定义是否变化
+    spec = Column(Text)  # 调度参数 JSON
+    next_fire_at = Column(DateTime, nullable=True)  # 下次触发时间（UTC）
+    last_fire_at = Column(DateTime, nullable=True)  # 上次触发时间（UTC）
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# 主进程租约模型：多个工作进程竞争同一行租约，持有者负责调度和成交对账
+class LeaderLease(Base):
+    __tablename__ = "leader_lease"
+    name = Column(String, primary_key=True)  # 租约名称，如 scheduler
+    holder = Column(String, nullable=True)  # 持有者标识（主机名:进程号:随机后缀）
+    expires_at = Column(Float, default=0)  # 租约到期时间戳
+    renewed_at = Column(Float, nullable=True)  # 最近一次续约时间戳
+
+# 同步版本模型：任务、配置修改后递增版本号，其他工作进程据此刷新本地状态
+class SyncState(Base):
+    __tablename__ = "sync_state"
+    name = Column(String, primary_key=True)  # plan_version, config_version
+    version = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 # 资产历史记录模型
 class AssetHistory(Base):
     __tablename__ = "asset_history"
@@ -65,33 +113,94 @@ class AssetHistory(Base):
     total_investment = Column(Float)
     total_profit = Column(Float)
     asset_distribution = Column(Text)  # JSON字符串存储
-    recorded_at = Column(DateTime, default=datetime.utcnow)
+    recorded_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+# 资产时间序列模型：原始采样和按小时/按天汇总的数据存放在同一张表，按精度区分
+class AssetSample(Base):
+    __tablename__ = "asset_samples"
+    id = Column(Integer, primary_key=True)
+    resolution = Column(String, nullable=False)  # 精度: raw, 1h, 1d
+    bucket_at = Column(DateTime, nullable=False)  # 采样时间或汇总区间起点（UTC）
+    total_assets = Column(Float)  # 区间内最后一次采样的值
+    total_investment = Column(Float)
+    total_profit = Column(Float)
+    assets_min = Column(Float)  # 区间内总资产最小值
+    assets_max = Column(Float)  # 区间内总资产最大值
+    sample_count = Column(Integer, default=1)  # 区间内采样次数
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_asset_samples_resolution_bucket', 'resolution', 'bucket_at', unique=True),
+    )
 
 # 加密密钥管理
+_fernet = None
+_relay_session_fernet = None
+_fernet_lock = threading.Lock()
+
+# 从主密钥派生代理会话令牌密钥时使用的 HKDF info，派生出的密钥只用于会话令牌
+RELAY_SESSION_KEY_INFO = b"okx-dca relay session token v1"
+
+# 密钥文件默认与数据库一样放在 backend 目录下，不受启动时工作目录影响
+DEFAULT_ENCRYPTION_KEY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "encryption_key.key")
+ENCRYPTION_KEY_PATH = os.path.abspath(os.getenv("DCA_ENCRYPTION_KEY_PATH", DEFAULT_ENCRYPTION_KEY_PATH))
+
 def get_encryption_key():
     """获取或生成加密密钥"""
-    key_file = "encryption_key.key"
+    key_file = ENCRYPTION_KEY_PATH
     if os.path.exists(key_file):
         with open(key_file, "rb") as f:
             return f.read()
-    else:
-        key = Fernet.generate_key()
-        with open(key_file, "wb") as f:
-            f.write(key)
-        return key
+    key = Fernet.generate_key()
+    try:
+        # 独占创建：多个工作进程同时首次启动时只有一个写入，其余读取同一个密钥
+        fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(key_file, "rb") as f:
+            return f.read()
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+def get_fernet():
+    """获取加解密器（密钥文件只在首次使用时读取一次）"""
+    global _fernet
+    if _fernet is None:
+        with _fernet_lock:
+            if _fernet is None:
+                _fernet = Fernet(get_encryption_key())
+    return _fernet
+
+def derive_relay_session_key(master_key):
+    """用 HKDF 从主密钥派生代理会话令牌密钥（Fernet 格式）"""
+    derived = HKDF(
+        algorithm=hashes.SHA256(), length=32, salt=None, info=RELAY_SESSION_KEY_INFO
+    ).derive(base64.urlsafe_b64decode(master_key))
+    return base64.urlsafe_b64encode(derived)
+
+def get_relay_session_fernet():
+    """
+    获取代理会话令牌的加解密器
+
+    与数据库凭证使用不同的密钥：优先读取 RELAY_SESSION_KEY 环境变量（Fernet 密钥），
+    未设置时从主密钥派生，多个工作进程得到相同的密钥
+    """
+    global _relay_session_fernet
+    if _relay_session_fernet is None:
+        with _fernet_lock:
+            if _relay_session_fernet is None:
+                key = os.getenv("RELAY_SESSION_KEY") or derive_relay_session_key(get_encryption_key())
+                _relay_session_fernet = Fernet(key)
+    return _relay_session_fernet
 
 def encrypt_text(text):
     """加密文本"""
     if not text:
         return ""
-    key = get_encryption_key()
-    f = Fernet(key)
-    return f.encrypt(text.encode()).decode()
+    return get_fernet().encrypt(text.encode()).decode()
 
 def decrypt_text(encrypted_text):
     """解密文本"""
     if not encrypted_text:
         return ""
-    key = get_encryption_key()
-    f = Fernet(key)
-    return f.decrypt(encrypted_text.encode()).decode()
\ No newline at end of file
+    return get_fernet().decrypt(encrypted_text.encode()).decode()
@@ -8,7 +8,51 @@ import json
 import time
 from typing import Dict, Any, Optional, List
 from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 import threading
+from utils.ticker_snapshot import shared_ticker_snapshots, TickerSnapshotError
+from utils.cache import CacheRegion
+
+
+# 单次批量请求最多包含的子请求数
+MAX_BATCH_CALLS = 20
+
+# 账户和交易接口返回的是私有实时状态（余额、订单、成交），不使用响应缓存：
+# 客户端按凭证复用，缓存会让卖出时按已变化的余额计算数量
+UNCACHED_PREFIXES = ('account/', 'trade/')
+
+
+def _is_success(result: Dict[str, Any]) -> bool:
+    """只缓存成功的响应"""
+    return result.get('code') == '0'
+
+
+def session_pool_stats(session: requests.Session) -> List[Dict[str, Any]]:
+    """统计 requests 会话各主机连接池的使用情况"""
+    pools = []
+    # http:// 和 https:// 挂载的是同一个适配器，去重后统计
+    adapters = {id(adapter): adapter for adapter in session.adapters.values()}
+    for adapter in adapters.values():
+        pool_manager = getattr(adapter, 'poolmanager', None)
+        if pool_manager is None:
+            continue
+        for pool_key in list(pool_manager.pools.keys()):
+            pool = pool_manager.pools.get(pool_key)
+            if pool is None:
+                continue
+            pools.append({
+                "host": pool.host,
+                "num_connections": pool.num_connections,
+                "num_requests": pool.num_requests,
+                "idle_connections": pool.pool.qsize() if pool.pool else 0
+            })
+    return pools
+
+
+def batch_error(msg: str) -> Dict[str, Any]:
+    """批量请求中单个子请求的错误结果"""
+    return {'code': 'ERROR', 'msg': msg, 'data': []}
+
 
 class OKXClient:
     def __init__(self, api_key: str, secret_key: str, passphrase: str, sandbox: bool = False):
@@ -45,10 +89,14 @@ class OKXClient:
         # 设置默认超时
         self.timeout = 30
         
-        # 请求缓存
-        self._cache = {}
-        self._cache_lock = threading.Lock()
-        self._cache_ttl = 60  # 缓存60秒
+        # 请求缓存：GET响应缓存60秒，最多256条，相同请求并发时只发送一次
+        self._cache = CacheRegion("okx_client", ttl=60, max_size=256)
+        
+        # 运行统计，供客户端注册表汇总
+        self._stats_lock = threading.Lock()
+        self._request_count = 0
+        self._in_flight = 0
+        self.created_at = time.time()
     
     def _get_timestamp(self):
         """获取 ISO8601 毫秒格式的时间戳，符合OKX要求"""
@@ -71,37 +119,33 @@ class OKXClient:
             key_parts.append(str(sorted(params.items())))
         return "|".join(key_parts)
     
-    def _get_from_cache(self, cache_key: str) -> Optional[Dict[str, Any]]:
-        """从缓存获取数据"""
-        with self._cache_lock:
-            if cache_key in self._cache:
-                cached_data, timestamp = self._cache[cache_key]
-                if time.time() - timestamp < self._cache_ttl:
-                    return cached_data
-                else:
-                    # 缓存过期，删除
-                    del self._cache[cache_key]
-        return None
-    
-    def _set_cache(self, cache_key: str, data: Dict[str, Any]) -> None:
-        """设置缓存"""
-        with self._cache_lock:
-            self._cache[cache_key] = (data, time.time())
-    
     def _request(self, method: str, endpoint: str, params: Optional[Dict] = None, data: Optional[Dict] = None, use_cache: bool = True) -> Dict[str, Any]:
         """发送请求"""
         # 确保endpoint不以斜杠开头，避免URL中出现双斜杠
         if endpoint.startswith('/'):
             endpoint = endpoint[1:]
         
-        # 对于GET请求，尝试从缓存获取
-        cache_key = None
-        if method == 'GET' and use_cache:
+        # 对于GET请求，优先从缓存获取；只缓存成功的响应，账户和交易接口不缓存
+        if method == 'GET' and use_cache and not endpoint.startswith(UNCACHED_PREFIXES):
             cache_key = self._get_cache_key(method, endpoint, params)
-            cached_result = self._get_from_cache(cache_key)
-            if cached_result:
-                return cached_result
-            
+            return self._cache.get_or_compute(
+                cache_key, lambda: self._send(method, endpoint, params, data), should_cache=_is_success
+            )
+        return self._send(method, endpoint, params, data)
+    
+    def _send(self, method: str, endpoint: str, params: Optional[Dict] = None, data: Optional[Dict] = None) -> Dict[str, Any]:
+        """发送HTTP请求（不经过缓存）"""
+        with self._stats_lock:
+            self._request_count += 1
+            self._in_flight += 1
+        try:
+            return self._send_signed(method, endpoint, params, data)
+        finally:
+            with self._stats_lock:
+                self._in_flight -= 1
+    
+    def _send_signed(self, method: str, endpoint: str, params: Optional[Dict] = None, data: Optional[Dict] = None) -> Dict[str, Any]:
+        """签名并发送HTTP请求"""
         url = f"{self.base_url}/{endpoint}"
         # 获取请求路径，用于签名
         request_path = f"/api/v5/{endpoint}"
@@ -125,13 +169,7 @@ class OKXClient:
                 raise ValueError(f"Unsupported method: {method}")
 
             response.raise_for_status()
-            result = response.json()
-            
-            # 对于成功的GET请求，缓存结果
-            if method == 'GET' and use_cache and result.get('code') == '0':
-                self._set_cache(cache_key, result)
-            
-            return result
+            return response.json()
 
         except requests.exceptions.RequestException as e:
             return {
@@ -140,6 +178,49 @@ class OKXClient:
                 'data': []
             }
     
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """获取连接池和缓存统计信息"""
+        pools = session_pool_stats(self.session)
+        cache_stats = self._cache.get_stats()
+        with self._stats_lock:
+            return {
+                "requests": self._request_count,
+                "in_flight": self._in_flight,
+                "cache_hits": cache_stats["hits"],
+                "cache_misses": cache_stats["misses"],
+                "cache_coalesced": cache_stats["coalesced"],
+                "cache_size": cache_stats["size"],
+                "pools": pools,
+                "age_seconds": round(time.time() - self.created_at, 1)
+            }
+    
+    def close(self) -> None:
+        """关闭会话，释放连接池"""
+        self.session.close()
+        self._cache.clear()
+    
+    def batch_request(self, calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        并发执行多个请求，结果顺序与 calls 一致
+
+        Args:
+            calls: 子请求列表，每项包含 method, endpoint，可选 params, data
+
+        Returns:
+            每个子请求的响应；单个子请求失败时对应位置为错误响应，不影响其他子请求
+        """
+        def run(call):
+            try:
+                return self._request(call['method'], call['endpoint'], call.get('params') or None, call.get('data') or None)
+            except Exception as e:
+                return batch_error(f'Request failed: {str(e)}')
+
+        if len(calls) <= 1:
+            return [run(call) for call in calls]
+        # 连接池上限为20，并发数不超过子请求数上限
+        with ThreadPoolExecutor(max_workers=min(len(calls), MAX_BATCH_CALLS), thread_name_prefix="okx-batch") as executor:
+            return list(executor.map(run, calls))
+    
     def test_connection(self) -> Dict[str, Any]:
         """测试 API 连接"""
         return self._request('GET', 'account/balance')
@@ -161,6 +242,10 @@ class OKXClient:
         """获取所有币种行情数据"""
         return self._request('GET', 'market/tickers', params={'instType': inst_type})
     
+    def get_instruments(self, inst_type: str = 'SPOT') -> Dict[str, Any]:
+        """获取交易产品基础信息"""
+        return self._request('GET', 'public/instruments', params={'instType': inst_type})
+    
     def place_order(self, symbol: str, side: str, order_type: str, size: str, price: Optional[str] = None) -> Dict[str, Any]:
         """下单"""
         data = {
@@ -174,6 +259,33 @@ class OKXClient:
             data['px'] = price
         
         return self._request('POST', 'trade/order', data=data)
+
+    def place_orders_batch(self, orders: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        批量下单，单次最多20笔
+
+        Args:
+            orders: 订单列表，每项包含 symbol, side, order_type, size，可选 price, client_order_id
+
+        Returns:
+            交易所原始响应，data 中每笔订单的 sCode/sMsg 表示各自的结果
+        """
+        data = []
+        for order in orders:
+            item = {
+                'instId': order['symbol'],
+                'tdMode': 'cash',
+                'side': order['side'],
+                'ordType': order['order_type'],
+                'sz': order['size']
+            }
+            if order.get('price'):
+                item['px'] = order['price']
+            if order.get('client_order_id'):
+                item['clOrdId'] = order['client_order_id']
+            data.append(item)
+
+        return self._request('POST', 'trade/batch-orders', data=data)
     
     def get_order_history(self, symbol: Optional[str] = None, limit: int = 100) -> Dict[str, Any]:
         """获取订单历史"""
@@ -183,10 +295,19 @@ class OKXClient:
         
         return self._request('GET', 'trade/orders-history', params=params)
     
-    def get_order_detail(self, order_id: str) -> Dict[str, Any]:
-        """获取订单详情"""
+    def get_order_detail(self, order_id: str, symbol: Optional[str] = None) -> Dict[str, Any]:
+        """获取订单详情（订单状态会变化，不走缓存）"""
         params = {'ordId': order_id}
-        return self._request('GET', 'trade/order', params=params)
+        if symbol:
+            params['instId'] = symbol
+        return self._request('GET', 'trade/order', params=params, use_cache=False)
+
+    def get_fills(self, inst_type: str = 'SPOT', begin: Optional[str] = None, limit: int = 100) -> Dict[str, Any]:
+        """批量获取最近的成交明细（不走缓存，供成交对账轮询使用）"""
+        params = {'instType': inst_type, 'limit': limit}
+        if begin:
+            params['begin'] = begin
+        return self._request('GET', 'trade/fills', params=params, use_cache=False)
 
     def get_order_fills(self, order_id: str) -> Dict[str, Any]:
         """获取订单成交明细"""
@@ -209,65 +330,35 @@ class OKXClient:
         由于OKX API没有直接提供热门币种接口，我们获取交易量最大的USDT交易对
         """
         try:
-            # 获取所有USDT交易对的Ticker
-            params = {'instType': 'SPOT'}
-            result = self._request('GET', 'market/tickers', params=params)
-            
-            if result.get('code') != '0':
-                return []
-            
-            # 筛选USDT交易对
-            usdt_pairs = []
-            for item in result.get('data', []):
-                inst_id = item.get('instId', '')
-                if inst_id.endswith('-USDT'):
-                    # 计算24小时交易量（以USDT计）
-                    vol_24h = float(item.get('vol24h', 0)) * float(item.get('last', 0))
-                    usdt_pairs.append({
-                        'symbol': inst_id,
-                        'volume': vol_24h
-                    })
-            
-            # 按交易量排序
-            usdt_pairs.sort(key=lambda x: x['volume'], reverse=True)
-            
-            # 返回前limit个
-            return [pair['symbol'] for pair in usdt_pairs[:limit]]
+            # 使用共享的行情快照，排序结果在快照内复用
+            snapshot = shared_ticker_snapshots.get(
+                lambda: self._request('GET', 'market/tickers', params={'instType': 'SPOT'}, use_cache=False)
+            )
+            return snapshot.top_by_usdt_volume(limit)
         
+        except TickerSnapshotError:
+            return []
         except Exception as e:
             print(f"获取热门币种异常: {str(e)}")
             return []
     
 
 # 无需API密钥的公共方法
+def _fetch_public_tickers() -> Dict[str, Any]:
+    """获取全量现货行情（公共API，无需认证）"""
+    url = "https://www.okx.com/api/v5/market/tickers?instType=SPOT"
+    response = requests.get(url, timeout=30)
+    return response.json()
+
+
 def get_popular_coins_public(limit: int = 100) -> List[str]:
     """获取热门币种列表（公共API，无需认证）"""
     try:
-        url = "https://www.okx.com/api/v5/market/tickers?instType=SPOT"
-        response = requests.get(url)
-        result = response.json()
-        
-        if result.get('code') != '0':
-            return []
-        
-        # 筛选USDT交易对
-        usdt_pairs = []
-        for item in result.get('data', []):
-            inst_id = item.get('instId', '')
-            if inst_id.endswith('-USDT'):
-                # 计算24小时交易量（以USDT计）
-                vol_24h = float(item.get('vol24h', 0)) * float(item.get('last', 0))
-                usdt_pairs.append({
-                    'symbol': inst_id,
-                    'volume': vol_24h
-                })
-        
-        # 按交易量排序
-        usdt_pairs.sort(key=lambda x: x['volume'], reverse=True)
-        
-        # 返回前limit个
-        return [pair['symbol'] for pair in usdt_pairs[:limit]]
+        snapshot = shared_ticker_snapshots.get(_fetch_public_tickers)
+        return snapshot.top_by_usdt_volume(limit)
     
+    except TickerSnapshotError:
+        return []
     except Exception as e:
         print(f"获取热门币种异常: {str(e)}")
-        return []
\ No newline at end of file
+        return []
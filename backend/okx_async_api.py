@@ -0,0 +1,339 @@
+import asyncio
+import hmac
+import base64
+import json
+import logging
+import time
+from typing import Dict, Any, Optional, List
+from datetime import datetime, timezone
+
+import httpx
+
+from okx_api import UNCACHED_PREFIXES, batch_error
+from utils.ticker_snapshot import shared_ticker_snapshots, TickerSnapshotError
+from utils.cache import CacheRegion
+
+logger = logging.getLogger(__name__)
+
+
+def close_http_client(http_client: Optional[httpx.AsyncClient], loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """
+    关闭绑定到指定事件循环的连接池
+
+    连接只能在创建它的事件循环中关闭：该循环仍存活时在其中调度关闭；
+    已关闭时在当前事件循环中尽力关闭（套接字随循环一起失效，只需将客户端标记为已关闭）
+    """
+    if http_client is None or http_client.is_closed:
+        return
+    if loop is not None and not loop.is_closed():
+        asyncio.run_coroutine_threadsafe(http_client.aclose(), loop)
+        return
+    try:
+        asyncio.get_running_loop().create_task(_aclose_quietly(http_client))
+    except RuntimeError:
+        pass
+
+
+async def _aclose_quietly(http_client: httpx.AsyncClient) -> None:
+    try:
+        await http_client.aclose()
+    except Exception as e:
+        logger.debug(f"关闭旧事件循环的连接池失败: {str(e)}")
+
+
+class AsyncOKXClient:
+    """OKX直连客户端的asyncio版本，方法签名与OKXClient保持一致"""
+
+    # 与同步客户端 Retry(status_forcelist=...) 对齐的重试状态码；与 urllib3 默认行为一致，只重试GET，
+    # POST（下单）在交易所已受理后返回5xx时重试会重复下单
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, api_key: str, secret_key: str, passphrase: str, sandbox: bool = False):
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.passphrase = passphrase
+
+        # 选择环境
+        if sandbox:
+            self.base_url = "https://www.okx.com/api/v5/sandbox"
+        else:
+            self.base_url = "https://www.okx.com/api/v5"
+
+        # 设置默认超时和重试
+        self.timeout = 30
+        self.max_retries = 3
+        self.backoff_factor = 1
+
+        # 连接池：单个事件循环内可同时保持数百个在途请求
+        self.limits = httpx.Limits(max_connections=200, max_keepalive_connections=20)
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._http_loop = None
+
+        # 请求缓存：GET响应缓存60秒，最多256条，相同请求并发时只发送一次
+        self._cache = CacheRegion("okx_async_client", ttl=60, max_size=256)
+
+        # 运行统计，供客户端注册表汇总
+        self._request_count = 0
+        self._in_flight = 0
+        self.created_at = time.time()
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """获取绑定到当前事件循环的连接池"""
+        loop = asyncio.get_running_loop()
+        if self._http_client is None or self._http_loop is not loop or self._http_client.is_closed:
+            # 事件循环变化时关闭旧循环的连接池，避免连接泄漏到被回收为止
+            close_http_client(self._http_client, self._http_loop)
+            self._http_client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=self.limits,
+                transport=httpx.AsyncHTTPTransport(retries=self.max_retries, limits=self.limits)
+            )
+            self._http_loop = loop
+        return self._http_client
+
+    def _get_timestamp(self):
+        """获取 ISO8601 毫秒格式的时间戳，符合OKX要求"""
+        return datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+    def _sign(self, timestamp: str, method: str, request_path: str, body: str = ''):
+        """生成签名"""
+        message = timestamp + method + request_path + body
+        mac = hmac.new(
+            bytes(self.secret_key, encoding='utf8'),
+            bytes(message, encoding='utf-8'),
+            digestmod='sha256'
+        )
+        return base64.b64encode(mac.digest()).decode()
+
+    def _get_cache_key(self, method: str, endpoint: str, params: Optional[Dict] = None) -> str:
+        """生成缓存键"""
+        key_parts = [method, endpoint]
+        if params:
+            key_parts.append(str(sorted(params.items())))
+        return "|".join(key_parts)
+
+    async def _request(self, method: str, endpoint: str, params: Optional[Dict] = None, data: Optional[Dict] = None, use_cache: bool = True) -> Dict[str, Any]:
+        """发送请求"""
+        # 确保endpoint不以斜杠开头，避免URL中出现双斜杠
+        if endpoint.startswith('/'):
+            endpoint = endpoint[1:]
+
+        # 对于GET请求，优先从缓存获取；只缓存成功的响应，账户和交易接口不缓存
+        if method == 'GET' and use_cache and not endpoint.startswith(UNCACHED_PREFIXES):
+            cache_key = self._get_cache_key(method, endpoint, params)
+            return await self._cache.get_or_compute_async(
+                cache_key, lambda: self._send(method, endpoint, params, data),
+                should_cache=lambda result: result.get('code') == '0'
+            )
+        return await self._send(method, endpoint, params, data)
+
+    async def _send(self, method: str, endpoint: str, params: Optional[Dict] = None, data: Optional[Dict] = None) -> Dict[str, Any]:
+        """发送HTTP请求（不经过缓存）"""
+        if method not in ('GET', 'POST'):
+            raise ValueError(f"Unsupported method: {method}")
+
+        # GET请求的签名需要包含查询字符串，这里自行拼接以保证与实际发送的一致
+        query = f"?{httpx.QueryParams(params)}" if method == 'GET' and params else ''
+        url = f"{self.base_url}/{endpoint}{query}"
+        request_path = f"/api/v5/{endpoint}{query}"
+        body = json.dumps(data) if data else ''
+
+        self._request_count += 1
+        self._in_flight += 1
+        try:
+            client = self._get_http_client()
+            for attempt in range(self.max_retries + 1):
+                # 每次重试都重新签名，避免时间戳过期
+                timestamp = self._get_timestamp()
+                headers = {
+                    'OK-ACCESS-KEY': self.api_key,
+                    'OK-ACCESS-SIGN': self._sign(timestamp, method, request_path, body),
+                    'OK-ACCESS-TIMESTAMP': timestamp,
+                    'OK-ACCESS-PASSPHRASE': self.passphrase,
+                    'Content-Type': 'application/json'
+                }
+                if method == 'GET':
+                    response = await client.get(url, headers=headers)
+                else:
+                    response = await client.post(url, headers=headers, content=body)
+
+                if method == 'GET' and response.status_code in self.RETRY_STATUS and attempt < self.max_retries:
+                    await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+                    continue
+                break
+
+            response.raise_for_status()
+            return response.json()
+
+        except (httpx.HTTPError, ValueError) as e:
+            return {
+                'code': 'ERROR',
+                'msg': f'Request failed: {str(e)}',
+                'data': []
+            }
+        finally:
+            self._in_flight -= 1
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """获取连接池和缓存统计信息"""
+        cache_stats = self._cache.get_stats()
+        return {
+            "requests": self._request_count,
+            "in_flight": self._in_flight,
+            "cache_hits": cache_stats["hits"],
+            "cache_misses": cache_stats["misses"],
+            "cache_coalesced": cache_stats["coalesced"],
+            "cache_size": cache_stats["size"],
+            "max_connections": self.limits.max_connections,
+            "age_seconds": round(time.time() - self.created_at, 1)
+        }
+
+    async def aclose(self) -> None:
+        """关闭连接池"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+        self._cache.clear()
+
+    def close(self) -> None:
+        """从同步代码中关闭连接池（在事件循环内调度关闭）"""
+        http_client, loop = self._http_client, self._http_loop
+        self._http_client = None
+        self._cache.clear()
+        close_http_client(http_client, loop)
+
+    async def batch_request(self, calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        并发执行多个请求，结果顺序与 calls 一致
+
+        Args:
+            calls: 子请求列表，每项包含 method, endpoint，可选 params, data
+
+        Returns:
+            每个子请求的响应；单个子请求失败时对应位置为错误响应，不影响其他子请求
+        """
+        results = await asyncio.gather(
+            *(self._request(call['method'], call['endpoint'], call.get('params') or None, call.get('data') or None)
+              for call in calls),
+            return_exceptions=True
+        )
+        return [
+            batch_error(f'Request failed: {str(result)}') if isinstance(result, Exception) else result
+            for result in results
+        ]
+
+    async def test_connection(self) -> Dict[str, Any]:
+        """测试 API 连接"""
+        return await self._request('GET', 'account/balance')
+
+    async def get_account_balance(self) -> Dict[str, Any]:
+        """获取账户余额"""
+        return await self._request('GET', 'account/balance')
+
+    async def get_trading_balance(self) -> Dict[str, Any]:
+        """获取交易账户余额"""
+        return await self._request('GET', 'account/balance')
+
+    async def get_ticker(self, symbol: str) -> Dict[str, Any]:
+        """获取币种价格"""
+        return await self._request('GET', 'market/ticker', params={'instId': symbol})
+
+    async def get_tickers(self, inst_type: str = 'SPOT') -> Dict[str, Any]:
+        """获取所有币种行情数据"""
+        return await self._request('GET', 'market/tickers', params={'instType': inst_type})
+
+    async def get_instruments(self, inst_type: str = 'SPOT') -> Dict[str, Any]:
+        """获取交易产品基础信息"""
+        return await self._request('GET', 'public/instruments', params={'instType': inst_type})
+
+    async def place_order(self, symbol: str, side: str, order_type: str, size: str, price: Optional[str] = None) -> Dict[str, Any]:
+        """下单"""
+        data = {
+            'instId': symbol,
+            'tdMode': 'cash',
+            'side': side,
+            'ordType': order_type,
+            'sz': size
+        }
+        if price:
+            data['px'] = price
+
+        return await self._request('POST', 'trade/order', data=data)
+
+    async def place_orders_batch(self, orders: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        批量下单，单次最多20笔
+
+        Args:
+            orders: 订单列表，每项包含 symbol, side, order_type, size，可选 price, client_order_id
+
+        Returns:
+            交易所原始响应，data 中每笔订单的 sCode/sMsg 表示各自的结果
+        """
+        data = []
+        for order in orders:
+            item = {
+                'instId': order['symbol'],
+                'tdMode': 'cash',
+                'side': order['side'],
+                'ordType': order['order_type'],
+                'sz': order['size']
+            }
+            if order.get('price'):
+                item['px'] = order['price']
+            if order.get('client_order_id'):
+                item['clOrdId'] = order['client_order_id']
+            data.append(item)
+
+        return await self._request('POST', 'trade/batch-orders', data=data)
+
+    async def get_order_history(self, symbol: Optional[str] = None, limit: int = 100) -> Dict[str, Any]:
+        """获取订单历史"""
+        params = {'limit': limit}
+        if symbol:
+            params['instId'] = symbol
+
+        return await self._request('GET', 'trade/orders-history', params=params)
+
+    async def get_order_detail(self, order_id: str, symbol: Optional[str] = None) -> Dict[str, Any]:
+        """获取订单详情（订单状态会变化，不走缓存）"""
+        params = {'ordId': order_id}
+        if symbol:
+            params['instId'] = symbol
+        return await self._request('GET', 'trade/order', params=params, use_cache=False)
+
+    async def get_fills(self, inst_type: str = 'SPOT', begin: Optional[str] = None, limit: int = 100) -> Dict[str, Any]:
+        """批量获取最近的成交明细（不走缓存，供成交对账轮询使用）"""
+        params = {'instType': inst_type, 'limit': limit}
+        if begin:
+            params['begin'] = begin
+        return await self._request('GET', 'trade/fills', params=params, use_cache=False)
+
+    async def get_order_fills(self, order_id: str) -> Dict[str, Any]:
+        """获取订单成交明细"""
+        params = {'ordId': order_id}
+        return await self._request('GET', 'trade/fills', params=params)
+
+    async def get_bills_details(self, inst_type: str = 'SPOT', begin_time: Optional[str] = None, end_time: Optional[str] = None) -> Dict[str, Any]:
+        """获取账单流水详情（最近7天）"""
+        params = {'instType': inst_type}
+        if begin_time:
+            params['begin'] = begin_time
+        if end_time:
+            params['end'] = end_time
+
+        return await self._request('GET', 'account/bills', params=params)
+
+    async def get_popular_coins(self, limit: int = 100) -> List[str]:
+        """获取热门币种列表（按24小时USDT成交额排序）"""
+        try:
+            snapshot = await shared_ticker_snapshots.get_async(
+                lambda: self._request('GET', 'market/tickers', params={'instType': 'SPOT'}, use_cache=False)
+            )
+            return snapshot.top_by_usdt_volume(limit)
+
+        except TickerSnapshotError:
+            return []
+        except Exception as e:
+            logger.error(f"获取热门币种异常: {str(e)}")
+            return []
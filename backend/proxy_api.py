@@ -1,14 +1,63 @@
+import asyncio
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import httpx
 import json
 import logging
-from typing import Dict, Any, Optional
+import threading
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime, timezone
 import hmac
 import hashlib
 import base64
+import time
+
+from okx_api import MAX_BATCH_CALLS, batch_error, session_pool_stats
+from okx_async_api import close_http_client
+from services.proxy_relay import SESSION_EXPIRED
+
+# 会话令牌在到期前提前续期的时间（秒）
+SESSION_RENEW_MARGIN = 60
 
 logger = logging.getLogger("dca-service")
 
+
+def _proxy_error(e: Exception) -> Dict[str, Any]:
+    logger.error(f"代理请求失败: {str(e)}")
+    return {
+        'code': 'ERROR',
+        'msg': f'Proxy request failed: {str(e)}',
+        'data': []
+    }
+
+
+def _chunks(calls: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """按单次批量请求的上限拆分子请求"""
+    return [calls[i:i + MAX_BATCH_CALLS] for i in range(0, len(calls), MAX_BATCH_CALLS)]
+
+
+def _is_session_expired(payload: Any) -> bool:
+    return isinstance(payload, dict) and payload.get('code') == SESSION_EXPIRED
+
+
+def _session_expires_at(payload: Any) -> Optional[Tuple[str, float]]:
+    """解析会话接口的响应，返回 (令牌, 续期时间)"""
+    if not isinstance(payload, dict) or payload.get('code') != '0':
+        return None
+    data = payload.get('data') or {}
+    if not data.get('token'):
+        return None
+    return data['token'], time.time() + max(float(data.get('expires_in', 0)) - SESSION_RENEW_MARGIN, 0)
+
+
+def _batch_results(payload: Dict[str, Any], count: int) -> List[Dict[str, Any]]:
+    """解析代理服务器的批量响应，数量不符时整批视为失败"""
+    results = payload.get('data')
+    if payload.get('code') != '0' or not isinstance(results, list) or len(results) != count:
+        return [batch_error(f"Proxy batch failed: {payload.get('msg', 'invalid response')}")] * count
+    return results
+
 class OKXProxyClient:
     """OKX代理客户端，通过AWS服务器转发请求"""
     
@@ -24,6 +73,31 @@ class OKXProxyClient:
         
         self.proxy_base_url = proxy_base_url.rstrip('/')
         self.timeout = 30
+        
+        # 复用到代理服务器的长连接；只重试连接失败（请求未发出），
+        # 读取超时或5xx不重试，避免下单请求被代理服务器重复执行
+        self.session = requests.Session()
+        retry_strategy = Retry(total=3, connect=3, read=0, status=0, other=0, backoff_factor=0.5)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=20, max_retries=retry_strategy)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        
+        # 代理服务器不支持批量接口（旧版本）时改为逐个转发
+        self._batch_supported = True
+        
+        # 会话令牌：换取后请求只携带令牌；代理服务器不支持（旧版本）时每次发送密钥
+        self._session_lock = threading.Lock()
+        self._session_supported = True
+        self._session_token: Optional[str] = None
+        self._session_renew_at = 0.0
+        
+        # 运行统计，供客户端注册表汇总
+        self._stats_lock = threading.Lock()
+        self._request_count = 0
+        self._batch_count = 0
+        self._session_count = 0
+        self._in_flight = 0
+        self.created_at = time.time()
     
     def _get_timestamp(self):
         """获取 ISO8601 毫秒格式的时间戳，符合OKX要求"""
@@ -39,35 +113,135 @@ class OKXProxyClient:
         )
         return base64.b64encode(mac.digest()).decode()
     
+    def _credentials(self) -> Dict[str, str]:
+        return {'api_key': self.api_key, 'secret_key': self.secret_key, 'passphrase': self.passphrase}
+    
+    def _open_session(self) -> None:
+        """用凭证换取会话令牌（调用方持有 _session_lock）；失败时本次请求改为发送密钥"""
+        self._session_token = None
+        try:
+            response = self.session.post(
+                f"{self.proxy_base_url}/api/proxy/okx/session", json=self._credentials(), timeout=self.timeout
+            )
+            if response.status_code in (404, 405):
+                logger.warning("代理服务器不支持会话令牌，每次请求发送密钥")
+                self._session_supported = False
+                return
+            response.raise_for_status()
+            session = _session_expires_at(response.json())
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.warning(f"换取代理会话令牌失败: {str(e)}")
+            return
+        with self._stats_lock:
+            self._session_count += 1
+        if session is not None:
+            self._session_token, self._session_renew_at = session
+    
+    def _auth(self, rejected: Optional[str] = None) -> Dict[str, str]:
+        """
+        代理请求携带的凭证：优先使用会话令牌
+
+        Args:
+            rejected: 被代理服务器拒绝的令牌；仍是当前令牌时重新换取（其他线程已换取时直接使用新令牌）
+        """
+        if self._session_supported:
+            with self._session_lock:
+                if (self._session_token is None or self._session_token == rejected
+                        or time.time() >= self._session_renew_at):
+                    self._open_session()
+                if self._session_token is not None:
+                    return {'token': self._session_token}
+        return self._credentials()
+    
+    def _post_relay(self, path: str, body: Dict[str, Any]) -> Any:
+        """
+        发送到代理服务器并返回解析后的响应；令牌被拒绝（过期或服务器密钥变更）时重新换取并重试一次
+
+        Raises:
+            requests.exceptions.RequestException: 网络错误或非2xx响应
+            ValueError: 响应不是JSON
+        """
+        url = f"{self.proxy_base_url}{path}"
+        with self._stats_lock:
+            self._in_flight += 1
+        try:
+            auth = self._auth()
+            response = self.session.post(url, json={**body, **auth}, timeout=self.timeout)
+            response.raise_for_status()
+            payload = response.json()
+            if 'token' in auth and _is_session_expired(payload):
+                response = self.session.post(url, json={**body, **self._auth(rejected=auth['token'])}, timeout=self.timeout)
+                response.raise_for_status()
+                payload = response.json()
+            return payload
+        finally:
+            with self._stats_lock:
+                self._in_flight -= 1
+    
     def _proxy_request(self, method: str, endpoint: str, params: Optional[Dict] = None, data: Optional[Dict] = None) -> Dict[str, Any]:
         """通过代理服务器发送请求"""
+        with self._stats_lock:
+            self._request_count += 1
         try:
             # 构建代理请求的数据
             proxy_data = {
                 'method': method,
                 'endpoint': endpoint,
                 'params': params or {},
-                'data': data or {},
-                'api_key': self.api_key,
-                'secret_key': self.secret_key,
-                'passphrase': self.passphrase
+                'data': data or {}
             }
             
             # 发送到代理服务器
-            proxy_url = f"{self.proxy_base_url}/api/proxy/okx"
-            response = requests.post(proxy_url, json=proxy_data, timeout=self.timeout)
-            response.raise_for_status()
+            return self._post_relay("/api/proxy/okx", proxy_data)
             
-            return response.json()
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"代理请求失败: {str(e)}")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            return _proxy_error(e)
+    
+    def batch_request(self, calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        通过代理服务器的批量接口一次转发多个请求，由代理服务器并发执行，结果顺序与 calls 一致
+
+        Args:
+            calls: 子请求列表，每项包含 method, endpoint，可选 params, data
+        """
+        if not self._batch_supported:
+            return [self._request(call['method'], call['endpoint'], call.get('params'), call.get('data')) for call in calls]
+        
+        results = []
+        for chunk in _chunks(calls):
+            with self._stats_lock:
+                self._batch_count += 1
+                self._request_count += len(chunk)
+            try:
+                results.extend(_batch_results(self._post_relay("/api/proxy/okx/batch", {'requests': chunk}), len(chunk)))
+            except requests.exceptions.HTTPError as e:
+                if e.response is not None and e.response.status_code in (404, 405):
+                    logger.warning("代理服务器不支持批量接口，改为逐个转发")
+                    self._batch_supported = False
+                    return results + self.batch_request(calls[len(results):])
+                results.extend([_proxy_error(e)] * len(chunk))
+            except (requests.exceptions.RequestException, ValueError) as e:
+                results.extend([_proxy_error(e)] * len(chunk))
+        return results
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """获取客户端统计信息"""
+        with self._stats_lock:
             return {
-                'code': 'ERROR',
-                'msg': f'Proxy request failed: {str(e)}',
-                'data': []
+                "requests": self._request_count,
+                "batches": self._batch_count,
+                "in_flight": self._in_flight,
+                "sessions": self._session_count,
+                "session_token": self._session_token is not None,
+                "pools": session_pool_stats(self.session),
+                "proxy_base_url": self.proxy_base_url,
+                "age_seconds": round(time.time() - self.created_at, 1)
             }
     
+    def close(self) -> None:
+        """关闭会话，释放到代理服务器的连接"""
+        self.session.close()
+    
     def test_connection(self) -> Dict[str, Any]:
         """测试 API 连接"""
         return self._proxy_request('GET', 'account/balance')
@@ -88,6 +262,10 @@ class OKXProxyClient:
         """获取所有币种行情数据"""
         return self._proxy_request('GET', 'market/tickers', params={'instType': inst_type})
     
+    def get_instruments(self, inst_type: str = 'SPOT') -> Dict[str, Any]:
+        """获取交易产品基础信息"""
+        return self._proxy_request('GET', 'public/instruments', params={'instType': inst_type})
+    
     def place_order(self, symbol: str, side: str, order_type: str, size: str, price: Optional[str] = None) -> Dict[str, Any]:
         """下单"""
         data = {
@@ -101,6 +279,33 @@ class OKXProxyClient:
             data['px'] = price
         
         return self._proxy_request('POST', 'trade/order', data=data)
+
+    def place_orders_batch(self, orders: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        批量下单，单次最多20笔
+
+        Args:
+            orders: 订单列表，每项包含 symbol, side, order_type, size，可选 price, client_order_id
+
+        Returns:
+            交易所原始响应，data 中每笔订单的 sCode/sMsg 表示各自的结果
+        """
+        data = []
+        for order in orders:
+            item = {
+                'instId': order['symbol'],
+                'tdMode': 'cash',
+                'side': order['side'],
+                'ordType': order['order_type'],
+                'sz': order['size']
+            }
+            if order.get('price'):
+                item['px'] = order['price']
+            if order.get('client_order_id'):
+                item['clOrdId'] = order['client_order_id']
+            data.append(item)
+
+        return self._proxy_request('POST', 'trade/batch-orders', data=data)
     
     def get_order_history(self, symbol: Optional[str] = None, limit: int = 100) -> Dict[str, Any]:
         """获取订单历史"""
@@ -110,11 +315,20 @@ class OKXProxyClient:
         
         return self._proxy_request('GET', 'trade/orders-history', params=params)
     
-    def get_order_detail(self, order_id: str) -> Dict[str, Any]:
+    def get_order_detail(self, order_id: str, symbol: Optional[str] = None) -> Dict[str, Any]:
         """获取订单详情"""
         params = {'ordId': order_id}
+        if symbol:
+            params['instId'] = symbol
         return self._proxy_request('GET', 'trade/order', params=params)
 
+    def get_fills(self, inst_type: str = 'SPOT', begin: Optional[str] = None, limit: int = 100) -> Dict[str, Any]:
+        """批量获取最近的成交明细"""
+        params = {'instType': inst_type, 'limit': limit}
+        if begin:
+            params['begin'] = begin
+        return self._proxy_request('GET', 'trade/fills', params=params)
+
     def get_order_fills(self, order_id: str) -> Dict[str, Any]:
         """获取订单成交明细"""
         params = {'ordId': order_id}
@@ -132,4 +346,298 @@ class OKXProxyClient:
     
     def _request(self, method: str, endpoint: str, params: Optional[Dict] = None, data: Optional[Dict] = None, use_cache: bool = True) -> Dict[str, Any]:
         """兼容原有接口的请求方法"""
-        return self._proxy_request(method, endpoint, params, data)
\ No newline at end of file
+        return self._proxy_request(method, endpoint, params, data)
+
+class AsyncOKXProxyClient:
+    """OKX代理客户端的asyncio版本，方法签名与OKXProxyClient保持一致"""
+    
+    def __init__(self, api_key: str, secret_key: str, passphrase: str, proxy_base_url: str = None):
+        import os
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.passphrase = passphrase
+        
+        # 从环境变量获取代理地址，如果没有则使用默认值
+        if proxy_base_url is None:
+            proxy_base_url = os.getenv('PROXY_BASE_URL', 'http://13.158.74.102:8000')
+        
+        self.proxy_base_url = proxy_base_url.rstrip('/')
+        self.timeout = 30
+        self.limits = httpx.Limits(max_connections=200, max_keepalive_connections=20)
+        self._http_client = None
+        self._http_loop = None
+        
+        # 代理服务器不支持批量接口（旧版本）时改为逐个转发
+        self._batch_supported = True
+        
+        # 会话令牌：换取后请求只携带令牌；代理服务器不支持（旧版本）时每次发送密钥
+        self._session_supported = True
+        self._session_token: Optional[str] = None
+        self._session_renew_at = 0.0
+        self._session_task: Optional[asyncio.Task] = None
+        
+        # 运行统计，供客户端注册表汇总
+        self._request_count = 0
+        self._batch_count = 0
+        self._session_count = 0
+        self._in_flight = 0
+        self.created_at = time.time()
+    
+    def _get_http_client(self) -> "httpx.AsyncClient":
+        """获取绑定到当前事件循环的连接池"""
+        loop = asyncio.get_running_loop()
+        if self._http_client is None or self._http_loop is not loop or self._http_client.is_closed:
+            # 事件循环变化时关闭旧循环的连接池，避免连接泄漏到被回收为止
+            close_http_client(self._http_client, self._http_loop)
+            self._http_client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=self.limits,
+                transport=httpx.AsyncHTTPTransport(retries=3, limits=self.limits)
+            )
+            self._http_loop = loop
+        return self._http_client
+    
+    def _credentials(self) -> Dict[str, str]:
+        return {'api_key': self.api_key, 'secret_key': self.secret_key, 'passphrase': self.passphrase}
+    
+    async def _open_session(self) -> None:
+        """用凭证换取会话令牌；失败时本次请求改为发送密钥"""
+        try:
+            response = await self._get_http_client().post(
+                f"{self.proxy_base_url}/api/proxy/okx/session", json=self._credentials()
+            )
+            if response.status_code in (404, 405):
+                logger.warning("代理服务器不支持会话令牌，每次请求发送密钥")
+                self._session_supported = False
+                return
+            response.raise_for_status()
+            session = _session_expires_at(response.json())
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning(f"换取代理会话令牌失败: {str(e)}")
+            self._session_token = None
+            return
+        self._session_count += 1
+        self._session_token, self._session_renew_at = session if session is not None else (None, 0.0)
+    
+    async def _auth(self, rejected: Optional[str] = None) -> Dict[str, str]:
+        """
+        代理请求携带的凭证：优先使用会话令牌
+
+        Args:
+            rejected: 被代理服务器拒绝的令牌；仍是当前令牌时重新换取
+        """
+        if self._session_supported:
+            if (self._session_token is None or self._session_token == rejected
+                    or time.time() >= self._session_renew_at):
+                # 并发请求共用同一次换取
+                loop = asyncio.get_running_loop()
+                task = self._session_task
+                if task is None or task.done() or task.get_loop() is not loop:
+                    task = self._session_task = loop.create_task(self._open_session())
+                await asyncio.shield(task)
+            if self._session_token is not None:
+                return {'token': self._session_token}
+        return self._credentials()
+    
+    async def _post_relay(self, path: str, body: Dict[str, Any]) -> Any:
+        """
+        发送到代理服务器并返回解析后的响应；令牌被拒绝（过期或服务器密钥变更）时重新换取并重试一次
+
+        Raises:
+            httpx.HTTPError: 网络错误或非2xx响应
+            ValueError: 响应不是JSON
+        """
+        url = f"{self.proxy_base_url}{path}"
+        auth = await self._auth()
+        response = await self._get_http_client().post(url, json={**body, **auth})
+        response.raise_for_status()
+        payload = response.json()
+        if 'token' in auth and _is_session_expired(payload):
+            response = await self._get_http_client().post(url, json={**body, **(await self._auth(rejected=auth['token']))})
+            response.raise_for_status()
+            payload = response.json()
+        return payload
+    
+    async def _proxy_request(self, method: str, endpoint: str, params: Optional[Dict] = None, data: Optional[Dict] = None) -> Dict[str, Any]:
+        """通过代理服务器发送请求"""
+        self._request_count += 1
+        self._in_flight += 1
+        try:
+            proxy_data = {
+                'method': method,
+                'endpoint': endpoint,
+                'params': params or {},
+                'data': data or {}
+            }
+            
+            return await self._post_relay("/api/proxy/okx", proxy_data)
+            
+        except (httpx.HTTPError, ValueError) as e:
+            return _proxy_error(e)
+        finally:
+            self._in_flight -= 1
+    
+    async def batch_request(self, calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        通过代理服务器的批量接口一次转发多个请求，由代理服务器并发执行，结果顺序与 calls 一致
+
+        Args:
+            calls: 子请求列表，每项包含 method, endpoint，可选 params, data
+        """
+        if not self._batch_supported:
+            return list(await asyncio.gather(*(
+                self._request(call['method'], call['endpoint'], call.get('params'), call.get('data')) for call in calls
+            )))
+        
+        async def send_chunk(chunk):
+            self._batch_count += 1
+            self._request_count += len(chunk)
+            self._in_flight += 1
+            try:
+                return _batch_results(await self._post_relay("/api/proxy/okx/batch", {'requests': chunk}), len(chunk))
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code in (404, 405):
+                    return None
+                return [_proxy_error(e)] * len(chunk)
+            except (httpx.HTTPError, ValueError) as e:
+                return [_proxy_error(e)] * len(chunk)
+            finally:
+                self._in_flight -= 1
+        
+        chunks = _chunks(calls)
+        chunk_results = await asyncio.gather(*(send_chunk(chunk) for chunk in chunks))
+        if any(result is None for result in chunk_results):
+            logger.warning("代理服务器不支持批量接口，改为逐个转发")
+            self._batch_supported = False
+            return await self.batch_request(calls)
+        return [result for results in chunk_results for result in results]
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """获取客户端统计信息"""
+        return {
+            "requests": self._request_count,
+            "batches": self._batch_count,
+            "sessions": self._session_count,
+            "session_token": self._session_token is not None,
+            "in_flight": self._in_flight,
+            "proxy_base_url": self.proxy_base_url,
+            "age_seconds": round(time.time() - self.created_at, 1)
+        }
+    
+    async def aclose(self) -> None:
+        """关闭连接池"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+    
+    def close(self) -> None:
+        """从同步代码中关闭连接池（在事件循环内调度关闭）"""
+        http_client, loop = self._http_client, self._http_loop
+        self._http_client = None
+        close_http_client(http_client, loop)
+    
+    async def test_connection(self) -> Dict[str, Any]:
+        """测试 API 连接"""
+        return await self._proxy_request('GET', 'account/balance')
+    
+    async def get_account_balance(self) -> Dict[str, Any]:
+        """获取账户余额"""
+        return await self._proxy_request('GET', 'account/balance')
+    
+    async def get_trading_balance(self) -> Dict[str, Any]:
+        """获取交易账户余额"""
+        return await self._proxy_request('GET', 'account/balance')
+    
+    async def get_ticker(self, symbol: str) -> Dict[str, Any]:
+        """获取币种价格"""
+        return await self._proxy_request('GET', 'market/ticker', params={'instId': symbol})
+    
+    async def get_tickers(self, inst_type: str = 'SPOT') -> Dict[str, Any]:
+        """获取所有币种行情数据"""
+        return await self._proxy_request('GET', 'market/tickers', params={'instType': inst_type})
+    
+    async def get_instruments(self, inst_type: str = 'SPOT') -> Dict[str, Any]:
+        """获取交易产品基础信息"""
+        return await self._proxy_request('GET', 'public/instruments', params={'instType': inst_type})
+    
+    async def place_order(self, symbol: str, side: str, order_type: str, size: str, price: Optional[str] = None) -> Dict[str, Any]:
+        """下单"""
+        data = {
+            'instId': symbol,
+            'tdMode': 'cash',
+            'side': side,
+            'ordType': order_type,
+            'sz': size
+        }
+        if price:
+            data['px'] = price
+        
+        return await self._proxy_request('POST', 'trade/order', data=data)
+
+    async def place_orders_batch(self, orders: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        批量下单，单次最多20笔
+
+        Args:
+            orders: 订单列表，每项包含 symbol, side, order_type, size，可选 price, client_order_id
+
+        Returns:
+            交易所原始响应，data 中每笔订单的 sCode/sMsg 表示各自的结果
+        """
+        data = []
+        for order in orders:
+            item = {
+                'instId': order['symbol'],
+                'tdMode': 'cash',
+                'side': order['side'],
+                'ordType': order['order_type'],
+                'sz': order['size']
+            }
+            if order.get('price'):
+                item['px'] = order['price']
+            if order.get('client_order_id'):
+                item['clOrdId'] = order['client_order_id']
+            data.append(item)
+
+        return await self._proxy_request('POST', 'trade/batch-orders', data=data)
+    
+    async def get_order_history(self, symbol: Optional[str] = None, limit: int = 100) -> Dict[str, Any]:
+        """获取订单历史"""
+        params = {'limit': limit}
+        if symbol:
+            params['instId'] = symbol
+        
+        return await self._proxy_request('GET', 'trade/orders-history', params=params)
+    
+    async def get_order_detail(self, order_id: str, symbol: Optional[str] = None) -> Dict[str, Any]:
+        """获取订单详情"""
+        params = {'ordId': order_id}
+        if symbol:
+            params['instId'] = symbol
+        return await self._proxy_request('GET', 'trade/order', params=params)
+
+    async def get_fills(self, inst_type: str = 'SPOT', begin: Optional[str] = None, limit: int = 100) -> Dict[str, Any]:
+        """批量获取最近的成交明细"""
+        params = {'instType': inst_type, 'limit': limit}
+        if begin:
+            params['begin'] = begin
+        return await self._proxy_request('GET', 'trade/fills', params=params)
+
+    async def get_order_fills(self, order_id: str) -> Dict[str, Any]:
+        """获取订单成交明细"""
+        params = {'ordId': order_id}
+        return await self._proxy_request('GET', 'trade/fills', params=params)
+        
+    async def get_bills_details(self, inst_type: str = 'SPOT', begin_time: Optional[str] = None, end_time: Optional[str] = None) -> Dict[str, Any]:
+        """获取账单流水详情（最近7天）"""
+        params = {'instType': inst_type}
+        if begin_time:
+            params['begin'] = begin_time
+        if end_time:
+            params['end'] = end_time
+        
+        return await self._proxy_request('GET', 'account/bills', params=params)
+    
+    async def _request(self, method: str, endpoint: str, params: Optional[Dict] = None, data: Optional[Dict] = None, use_cache: bool = True) -> Dict[str, Any]:
+        """兼容原有接口的请求方法"""
+        return await self._proxy_request(method, endpoint, params, data)
@@ -0,0 +1,270 @@
+"""
+资产时间序列服务
+定时采样定投策略的总资产、总投入和总收益，写入原始采样的同时增量汇总到小时和天两个精度，
+各精度按保留时长清理；查询时按时间窗口选择合适的精度，返回点数有上限的序列
+"""
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import AssetHistory, AssetSample
+
+logger = logging.getLogger(__name__)
+
+# 采样间隔（秒）
+SAMPLE_INTERVAL = int(os.getenv("ASSET_SAMPLE_INTERVAL", "300"))
+
+# 精度定义，从细到粗：(名称, 区间长度秒数, 保留时长秒数)；保留时长为 None 表示永久保留
+RESOLUTIONS = (
+    ("raw", SAMPLE_INTERVAL, 7 * 86400),
+    ("1h", 3600, 180 * 86400),
+    ("1d", 86400, None),
+)
+
+_INTERVALS = {name: seconds for name, seconds, _ in RESOLUTIONS}
+
+# 清理过期数据的最小间隔（秒）
+PRUNE_INTERVAL = 3600
+
+
+def _to_utc_datetime(timestamp: float) -> datetime:
+    """时间戳转换为不带时区的UTC时间"""
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+def _to_timestamp(value: datetime) -> float:
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+class AssetSeriesStore:
+    """资产时间序列服务类"""
+
+    def __init__(self, session_local, tz):
+        """
+        初始化资产时间序列服务
+
+        Args:
+            session_local: SQLAlchemy会话工厂
+            tz: 按天汇总使用的时区（天的边界为该时区的零点）
+        """
+        self.SessionLocal = session_local
+        self.tz = tz
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self._stats = {"samples": 0, "pruned": 0, "last_sample_at": None}
+
+    def bucket_start(self, resolution: str, timestamp: float) -> float:
+        """计算时间戳所在汇总区间的起点"""
+        if resolution == "raw":
+            return timestamp
+        if resolution == "1d":
+            return self._local_midnight(datetime.fromtimestamp(timestamp, self.tz))
+        interval = _INTERVALS[resolution]
+        return math.floor(timestamp / interval) * interval
+
+    def _local_midnight(self, value: datetime) -> float:
+        """value 所在本地日期零点的时间戳（pytz 时区需要 localize 才能得到正确的偏移）"""
+        midnight = datetime(value.year, value.month, value.day)
+        if hasattr(self.tz, "localize"):
+            return self.tz.localize(midnight).timestamp()
+        return midnight.replace(tzinfo=self.tz).timestamp()
+
+    def record(self, total_assets: float, total_investment: float, total_profit: float,
+               timestamp: Optional[float] = None) -> None:
+        """
+        写入一次采样，并在同一事务中更新所在的小时和天汇总
+
+        汇总区间保存区间内最后一次采样的值、总资产最小/最大值和采样次数
+        """
+        timestamp = timestamp if timestamp is not None else time.time()
+        db = self.SessionLocal()
+        try:
+            for resolution, _, _ in RESOLUTIONS:
+                values = {
+                    "resolution": resolution,
+                    "bucket_at": _to_utc_datetime(self.bucket_start(resolution, timestamp)),
+                    "total_assets": total_assets,
+                    "total_investment": total_investment,
+                    "total_profit": total_profit,
+                    "assets_min": total_assets,
+                    "assets_max": total_assets,
+                    "sample_count": 1,
+                    "updated_at": datetime.utcnow()
+                }
+                statement = sqlite_insert(AssetSample).values(**values)
+                excluded = statement.excluded
+                statement = statement.on_conflict_do_update(
+                    index_elements=[AssetSample.resolution, AssetSample.bucket_at],
+                    set_={
+                        "total_assets": excluded.total_assets,
+                        "total_investment": excluded.total_investment,
+                        "total_profit": excluded.total_profit,
+                        "assets_min": func.min(AssetSample.assets_min, excluded.assets_min),
+                        "assets_max": func.max(AssetSample.assets_max, excluded.assets_max),
+                        "sample_count": AssetSample.sample_count + 1,
+                        "updated_at": excluded.updated_at
+                    }
+                )
+                db.execute(statement)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        with self._lock:
+            self._stats["samples"] += 1
+            self._stats["last_sample_at"] = _to_utc_datetime(timestamp).isoformat()
+            should_prune = timestamp - self._last_prune >= PRUNE_INTERVAL
+            if should_prune:
+                self._last_prune = timestamp
+        if should_prune:
+            self.prune(timestamp)
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """删除超过保留时长的数据，返回删除的行数"""
+        now = now if now is not None else time.time()
+        deleted = 0
+        db = self.SessionLocal()
+        try:
+            for resolution, _, retention in RESOLUTIONS:
+                if retention is None:
+                    continue
+                deleted += db.query(AssetSample).filter(
+                    AssetSample.resolution == resolution,
+                    AssetSample.bucket_at < _to_utc_datetime(now - retention)
+                ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        if deleted:
+            logger.info(f"清理过期资产采样: {deleted} 条")
+        with self._lock:
+            self._stats["pruned"] += deleted
+        return deleted
+
+    def import_daily_history(self) -> int:
+        """
+        天精度数据为空时，从每日资产历史记录导入
+
+        asset_history 的 recorded_at 保存的是本地时区的时间，按本地日期归入对应的天区间
+        """
+        db = self.SessionLocal()
+        try:
+            if db.query(AssetSample.id).filter(AssetSample.resolution == "1d").first():
+                return 0
+            rows = db.query(
+                AssetHistory.recorded_at, AssetHistory.total_assets,
+                AssetHistory.total_investment, AssetHistory.total_profit
+            ).order_by(AssetHistory.recorded_at).all()
+            if not rows:
+                return 0
+            buckets: Dict[datetime, Dict] = {}
+            for row in rows:
+                bucket_at = _to_utc_datetime(self._local_midnight(row.recorded_at))
+                buckets[bucket_at] = {
+                    "resolution": "1d",
+                    "bucket_at": bucket_at,
+                    "total_assets": row.total_assets,
+                    "total_investment": row.total_investment,
+                    "total_profit": row.total_profit,
+                    "assets_min": row.total_assets,
+                    "assets_max": row.total_assets,
+                    "sample_count": 1
+                }
+            db.execute(sqlite_insert(AssetSample).on_conflict_do_nothing(), list(buckets.values()))
+            db.commit()
+            logger.info(f"从资产历史记录导入天精度数据: {len(buckets)} 条")
+            return len(buckets)
+        finally:
+            db.close()
+
+    def choose_resolution(self, start_ts: float, end_ts: float, max_points: int,
+                          now: Optional[float] = None) -> str:
+        """选择保留时长覆盖查询窗口、且点数不超过上限的最细精度；都不满足时使用最粗精度"""
+        now = now if now is not None else time.time()
+        span = max(end_ts - start_ts, 0)
+        for resolution, interval, retention in RESOLUTIONS:
+            covered = retention is None or start_ts >= now - retention
+            if covered and span / interval <= max_points:
+                return resolution
+        return RESOLUTIONS[-1][0]
+
+    def query(self, start_ts: Optional[float], end_ts: Optional[float] = None,
+              max_points: int = 300) -> Dict:
+        """
+        查询时间窗口内的资产序列
+
+        Args:
+            start_ts: 窗口起点时间戳，为空时从最早的天精度数据开始
+            end_ts: 窗口终点时间戳，默认为当前时间
+            max_points: 返回点数上限，精度选定后仍超出时等间隔抽取（保留最后一个点）
+
+        Returns:
+            {"resolution": 精度, "start": 起点, "end": 终点, "data": [{date, totalAssets, ...}]}
+        """
+        now = time.time()
+        end_ts = end_ts if end_ts is not None else now
+        db = self.SessionLocal()
+        try:
+            if start_ts is None:
+                earliest = db.query(func.min(AssetSample.bucket_at)).filter(AssetSample.resolution == "1d").scalar()
+                start_ts = _to_timestamp(earliest) if earliest else end_ts
+            resolution = self.choose_resolution(start_ts, end_ts, max_points, now)
+            rows = db.query(
+                AssetSample.bucket_at, AssetSample.total_assets, AssetSample.total_investment,
+                AssetSample.total_profit, AssetSample.assets_min, AssetSample.assets_max
+            ).filter(
+                AssetSample.resolution == resolution,
+                AssetSample.bucket_at >= _to_utc_datetime(self.bucket_start(resolution, start_ts)),
+                AssetSample.bucket_at <= _to_utc_datetime(end_ts)
+            ).order_by(AssetSample.bucket_at.asc()).all()
+        finally:
+            db.close()
+
+        if len(rows) > max_points:
+            step = math.ceil(len(rows) / max_points)
+            sampled = rows[::step]
+            if sampled[-1] is not rows[-1]:
+                sampled[-1] = rows[-1]
+            rows = sampled
+
+        data = [
+            {
+                "date": datetime.fromtimestamp(_to_timestamp(row.bucket_at), self.tz).isoformat(),
+                "totalAssets": row.total_assets,
+                "totalInvestment": row.total_investment,
+                "totalProfit": row.total_profit,
+                "assetsMin": row.assets_min,
+                "assetsMax": row.assets_max
+            }
+            for row in rows
+        ]
+        return {
+            "resolution": resolution,
+            "start": datetime.fromtimestamp(start_ts, self.tz).isoformat(),
+            "end": datetime.fromtimestamp(end_ts, self.tz).isoformat(),
+            "data": data
+        }
+
+    def get_stats(self) -> Dict:
+        """获取采样统计和各精度的数据量"""
+        db = self.SessionLocal()
+        try:
+            counts = dict(
+                db.query(AssetSample.resolution, func.count(AssetSample.id))
+                .group_by(AssetSample.resolution).all()
+            )
+        finally:
+            db.close()
+        with self._lock:
+            stats = dict(self._stats)
+        return {"sample_interval": SAMPLE_INTERVAL, "rows": counts, **stats}
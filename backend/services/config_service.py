@@ -1,27 +1,117 @@
 """
 配置管理服务
 负责处理API配置、币种配置等相关业务逻辑
+
+配置在内存中保存一份已解密的快照，读取时不访问数据库也不做解密；
+保存配置时递增版本号使快照失效，下次读取时重新加载
 """
 import json
 import logging
-from typing import Dict, List, Optional
+import threading
+from typing import Callable, Dict, List, Optional
 from sqlalchemy.orm import Session
 from models import UserConfig, encrypt_text, decrypt_text
 from okx_api import get_popular_coins_public
+from utils.client_factory import invalidate_okx_clients
 
 logger = logging.getLogger(__name__)
 
 class ConfigService:
     """配置管理服务类"""
     
-    def __init__(self, session_local):
+    def __init__(self, session_local, on_change: Optional[Callable[[], None]] = None):
         """
         初始化配置服务
         
         Args:
             session_local: SQLAlchemy会话工厂
+            on_change: 配置保存后的回调，用于通知其他工作进程刷新快照
         """
         self.SessionLocal = session_local
+        self.on_change = on_change
+        self._version = 0
+        self._snapshot: Optional[Dict] = None
+        self._lock = threading.Lock()
+        self._stats = {"loads": 0, "hits": 0}
+    
+    @property
+    def version(self) -> int:
+        """配置版本号，每次保存配置后递增"""
+        return self._version
+    
+    def invalidate(self) -> int:
+        """使配置快照失效（配置被其他途径修改时也可调用）"""
+        with self._lock:
+            self._version += 1
+            self._snapshot = None
+            return self._version
+    
+    def _notify_change(self) -> None:
+        """使本进程快照失效并通知其他工作进程"""
+        self.invalidate()
+        if self.on_change is not None:
+            try:
+                self.on_change()
+            except Exception as e:
+                logger.error(f"通知配置变更失败: {str(e)}")
+    
+    def _load_snapshot(self, version: int) -> Dict:
+        """从数据库读取配置并解密，生成指定版本的快照"""
+        snapshot = {
+            "version": version,
+            "api_config": None,
+            "selected_coins": []
+        }
+        db = self.SessionLocal()
+        try:
+            config = db.query(UserConfig).first()
+        finally:
+            db.close()
+        
+        if not config:
+            return snapshot
+        
+        if config.selected_coins:
+            try:
+                snapshot["selected_coins"] = json.loads(config.selected_coins)
+            except (ValueError, TypeError) as e:
+                logger.error(f"解析币种配置失败: {str(e)}")
+        
+        try:
+            snapshot["api_config"] = {
+                "api_key": decrypt_text(config.api_key) if config.api_key else "",
+                "secret_key": decrypt_text(config.secret_key) if config.secret_key else "",
+                "passphrase": decrypt_text(config.passphrase) if config.passphrase else ""
+            }
+        except Exception as e:
+            logger.error(f"解密API配置失败: {str(e)}")
+        return snapshot
+    
+    def _get_snapshot(self) -> Dict:
+        """获取当前版本的配置快照，失效时重新加载"""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot["version"] == self._version:
+            self._stats["hits"] += 1
+            return snapshot
+        
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot["version"] == self._version:
+                self._stats["hits"] += 1
+                return snapshot
+            snapshot = self._load_snapshot(self._version)
+            self._snapshot = snapshot
+            self._stats["loads"] += 1
+            return snapshot
+    
+    def get_snapshot_stats(self) -> Dict:
+        """获取配置快照统计"""
+        snapshot = self._snapshot
+        return {
+            "version": self._version,
+            "cached": snapshot is not None and snapshot["version"] == self._version,
+            **self._stats
+        }
     
     def save_api_config(self, api_key: str, secret_key: str, passphrase: str) -> Dict:
         """
@@ -45,7 +135,18 @@ class ConfigService:
                 
                 # 查找现有配置
                 user_config = db.query(UserConfig).first()
+                old_credentials = None
                 if user_config:
+                    try:
+                        old_credentials = (
+                            decrypt_text(user_config.api_key) if user_config.api_key else "",
+                            decrypt_text(user_config.secret_key) if user_config.secret_key else "",
+                            decrypt_text(user_config.passphrase) if user_config.passphrase else ""
+                        )
+                    except Exception as e:
+                        # 旧配置无法解密时无法定位对应客户端，直接清空注册表
+                        logger.warning(f"解密旧API配置失败，清空客户端注册表: {str(e)}")
+                        invalidate_okx_clients()
                     user_config.api_key = encrypted_api_key
                     user_config.secret_key = encrypted_secret_key
                     user_config.passphrase = encrypted_passphrase
@@ -58,6 +159,12 @@ class ConfigService:
                     db.add(user_config)
                 
                 db.commit()
+                self._notify_change()
+                
+                # 密钥变更后，旧凭证对应的共享客户端不再可用
+                if old_credentials and old_credentials != (api_key, secret_key, passphrase):
+                    invalidate_okx_clients(*old_credentials)
+                
                 logger.info("API配置保存成功")
                 return {"message": "API配置保存成功", "success": True}
                 
@@ -76,25 +183,12 @@ class ConfigService:
             API配置信息
         """
         try:
-            db = self.SessionLocal()
-            try:
-                config = db.query(UserConfig).first()
-                if config:
-                    return {
-                        "api_key": decrypt_text(config.api_key) if config.api_key else "",
-                        "secret_key": decrypt_text(config.secret_key) if config.secret_key else "",
-                        "passphrase": decrypt_text(config.passphrase) if config.passphrase else "",
-                        "selected_coins": json.loads(config.selected_coins) if config.selected_coins else []
-                    }
-                else:
-                    return {
-                        "api_key": "",
-                        "secret_key": "",
-                        "passphrase": "",
-                        "selected_coins": []
-                    }
-            finally:
-                db.close()
+            snapshot = self._get_snapshot()
+            api_config = snapshot["api_config"] or {"api_key": "", "secret_key": "", "passphrase": ""}
+            return {
+                **api_config,
+                "selected_coins": list(snapshot["selected_coins"])
+            }
                 
         except Exception as e:
             logger.error(f"获取API配置失败: {str(e)}")
@@ -127,6 +221,7 @@ class ConfigService:
                     db.add(user_config)
                 
                 db.commit()
+                self._notify_change()
                 logger.info(f"币种配置保存成功: {len(selected_coins)}个币种")
                 return {"message": "币种配置保存成功", "success": True}
                 
@@ -145,15 +240,7 @@ class ConfigService:
             选中的币种列表
         """
         try:
-            db = self.SessionLocal()
-            try:
-                config = db.query(UserConfig).first()
-                if config and config.selected_coins:
-                    return json.loads(config.selected_coins)
-                else:
-                    return []
-            finally:
-                db.close()
+            return list(self._get_snapshot()["selected_coins"])
                 
         except Exception as e:
             logger.error(f"获取币种配置失败: {str(e)}")
@@ -220,26 +307,10 @@ class ConfigService:
             解密后的API配置，如果配置不存在或不完整则返回None
         """
         try:
-            db = self.SessionLocal()
-            try:
-                config = db.query(UserConfig).first()
-                if not config:
-                    return None
-                
-                api_key = decrypt_text(config.api_key) if config.api_key else ""
-                secret_key = decrypt_text(config.secret_key) if config.secret_key else ""
-                passphrase = decrypt_text(config.passphrase) if config.passphrase else ""
-                
-                if not all([api_key, secret_key, passphrase]):
-                    return None
-                
-                return {
-                    "api_key": api_key,
-                    "secret_key": secret_key,
-                    "passphrase": passphrase
-                }
-            finally:
-                db.close()
+            api_config = self._get_snapshot()["api_config"]
+            if not api_config or not all(api_config.values()):
+                return None
+            return dict(api_config)
                 
         except Exception as e:
             logger.error(f"获取解密API配置失败: {str(e)}")
@@ -0,0 +1,365 @@
+"""
+定投任务调度器
+用一个按下次触发时间排序的最小堆替代“每个任务每个日期一个 APScheduler 任务”：
+每个任务只在堆中保留一个节点，重新调度和移除都是 O(log n)（移除采用惰性删除）；
+同一时刻到期的任务合并为一次分发，交给执行引擎并发执行；
+配置了状态存储时，调度参数和触发时间会持久化，重启后直接恢复
+"""
+import calendar
+import heapq
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from services.scheduler_store import spec_hash
+
+logger = logging.getLogger(__name__)
+
+# 调度参数：(频率, 时, 分, 星期几, 每月日期)
+ScheduleSpec = Tuple[str, int, int, Optional[int], Tuple[int, ...]]
+
+
+def build_schedule_spec(plan) -> Optional[ScheduleSpec]:
+    """
+    从定投计划解析调度参数，配置无效时返回None
+
+    每月任务未指定日期或日期解析失败时回退为每月1日
+    """
+    try:
+        hour, minute = map(int, plan.time.split(":"))
+    except (ValueError, TypeError, AttributeError):
+        logger.error(f"任务 {plan.id} 时间格式错误: {plan.time}")
+        return None
+
+    if plan.frequency == "daily":
+        return ("daily", hour, minute, None, ())
+    if plan.frequency == "weekly" and plan.day_of_week is not None:
+        return ("weekly", hour, minute, int(plan.day_of_week), ())
+    if plan.frequency == "monthly":
+        month_days: Tuple[int, ...] = ()
+        if plan.month_days:
+            try:
+                month_days = tuple(sorted({int(day) for day in json.loads(plan.month_days)}))
+            except (json.JSONDecodeError, ValueError, TypeError) as e:
+                logger.error(f"解析月份日期失败: {str(e)}, 原始数据: {plan.month_days}")
+        return ("monthly", hour, minute, None, month_days or (1,))
+
+    logger.error(f"任务 {plan.id} 频率配置错误: {plan.frequency}")
+    return None
+
+
+def next_fire_time(spec: ScheduleSpec, after: datetime, tz) -> Optional[datetime]:
+    """
+    计算严格晚于 after 的下一次触发时间
+
+    Args:
+        spec: build_schedule_spec 的结果
+        after: 带时区的时间
+        tz: 计划时间所在时区（pytz）
+    """
+    frequency, hour, minute, day_of_week, month_days = spec
+    local = after.astimezone(tz)
+
+    def at(day) -> datetime:
+        return tz.localize(datetime(day.year, day.month, day.day, hour, minute))
+
+    if frequency == "daily":
+        candidate = at(local.date())
+        return candidate if candidate > after else at(local.date() + timedelta(days=1))
+
+    if frequency == "weekly":
+        days_ahead = (day_of_week - local.weekday()) % 7
+        candidate = at(local.date() + timedelta(days=days_ahead))
+        return candidate if candidate > after else at(local.date() + timedelta(days=days_ahead + 7))
+
+    # 每月：当月没有的日期（如31日）跳过，与 CronTrigger(day=...) 行为一致
+    year, month = local.year, local.month
+    for _ in range(13):
+        last_day = calendar.monthrange(year, month)[1]
+        for day in month_days:
+            if day > last_day:
+                break
+            candidate = tz.localize(datetime(year, month, day, hour, minute))
+            if candidate > after:
+                return candidate
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return None
+
+
+class PlanDispatcher:
+    """定投任务调度器类"""
+
+    def __init__(self, callback: Callable[[List[int], datetime], None], tz,
+                 misfire_grace_time: float = 86400, state_store=None):
+        """
+        初始化调度器
+
+        Args:
+            callback: 分发函数，参数为同一时刻到期的任务ID列表和计划触发时间
+            tz: 计划时间所在时区
+            misfire_grace_time: 允许的最大延迟（秒），超过后跳过本次触发
+            state_store: 调度状态存储（SchedulerStateStore），为空时不持久化
+        """
+        self.callback = callback
+        self.tz = tz
+        self.misfire_grace_time = misfire_grace_time
+        self.state_store = state_store
+
+        self._heap: List[Tuple[float, int, int]] = []  # [(触发时间戳, 任务ID, 版本)]
+        self._plans: Dict[int, Tuple[ScheduleSpec, int]] = {}  # {任务ID: (调度参数, 版本)}
+        self._generation = 0
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._stats = {"dispatches": 0, "plans_dispatched": 0, "max_group_size": 0, "misfires": 0}
+
+    # ------------------------------------------------------------------
+    # 公共接口
+    # ------------------------------------------------------------------
+    def schedule(self, plan) -> Optional[datetime]:
+        """
+        添加或更新任务调度，已禁用或配置无效的任务会被移除
+
+        Returns:
+            下次触发时间；未调度时返回None
+        """
+        if plan.status != "enabled":
+            self.remove(plan.id)
+            return None
+        spec = build_schedule_spec(plan)
+        if spec is None:
+            self.remove(plan.id)
+            return None
+
+        fire_at = next_fire_time(spec, datetime.now(self.tz), self.tz)
+        with self._cond:
+            self._push(plan.id, spec, fire_at)
+            self._cond.notify()
+        self._save_state([{
+            "plan_id": plan.id,
+            "spec": spec,
+            "next_fire_ts": fire_at.timestamp() if fire_at else None
+        }])
+        return fire_at
+
+    def remove(self, plan_id: int) -> bool:
+        """移除任务调度，堆中的旧节点在出堆时丢弃"""
+        with self._cond:
+            removed = self._plans.pop(plan_id, None) is not None
+            self._maybe_compact()
+        if self.state_store is not None:
+            try:
+                self.state_store.delete([plan_id])
+            except Exception as e:
+                logger.error(f"删除任务 {plan_id} 调度状态失败: {str(e)}")
+        return removed
+
+    def restore(self) -> Dict:
+        """
+        从状态存储恢复调度（启动时调用）
+
+        未修改的任务直接使用保存的下次触发时间；只有新增或在状态保存后被修改过的任务重新计算，
+        其中调度参数摘要未变的（如只修改了金额）仍沿用保存的触发时间。
+        停机期间错过的触发在宽限时间内会在启动后补执行一次
+
+        Returns:
+            恢复统计 {restored, rescheduled, removed, elapsed}
+        """
+        started = time.time()
+        if self.state_store is None:
+            return {"restored": 0, "rescheduled": 0, "removed": 0, "elapsed": 0}
+
+        with self._cond:
+            # 重新成为主进程时会再次恢复，先清空内存中的调度
+            self._heap = []
+            self._plans = {}
+
+        saved = {record["plan_id"]: record for record in self.state_store.load_all()}
+        changed, stale = self.state_store.find_changes()
+        for plan_id in stale:
+            saved.pop(plan_id, None)
+        self.state_store.delete(stale)
+
+        now = datetime.now(self.tz)
+        updates = []
+        for plan in changed:
+            spec = build_schedule_spec(plan)
+            record = saved.pop(plan.id, None)
+            if spec is None:
+                continue
+            if record is not None and record["plan_hash"] == spec_hash(spec):
+                next_fire_ts = record["next_fire_ts"]
+            else:
+                fire_at = next_fire_time(spec, now, self.tz)
+                next_fire_ts = fire_at.timestamp() if fire_at else None
+            updates.append({"plan_id": plan.id, "spec": spec, "next_fire_ts": next_fire_ts})
+
+        with self._cond:
+            for record in list(saved.values()) + updates:
+                self._generation += 1
+                self._plans[record["plan_id"]] = (record["spec"], self._generation)
+                if record["next_fire_ts"] is not None:
+                    self._heap.append((record["next_fire_ts"], record["plan_id"], self._generation))
+            heapq.heapify(self._heap)
+            self._cond.notify()
+        self.state_store.save(updates)
+
+        return {
+            "restored": len(saved),
+            "rescheduled": len(updates),
+            "removed": len(stale),
+            "elapsed": round(time.time() - started, 3)
+        }
+
+    def sync(self) -> Dict:
+        """
+        读取其他工作进程修改过的任务并更新调度
+
+        非主进程修改任务时只写数据库，任务的 updated_at 晚于调度状态，据此找出需要更新的任务
+
+        Returns:
+            {rescheduled, removed}
+        """
+        if self.state_store is None:
+            return {"rescheduled": 0, "removed": 0}
+        changed, stale = self.state_store.find_changes()
+        for plan_id in stale:
+            self.remove(plan_id)
+        for plan in changed:
+            self.schedule(plan)
+        return {"rescheduled": len(changed), "removed": len(stale)}
+
+    def next_run_time(self, plan_id: int) -> Optional[datetime]:
+        """获取任务的下次触发时间"""
+        with self._cond:
+            entry = self._plans.get(plan_id)
+            if entry is None:
+                return None
+            return next_fire_time(entry[0], datetime.now(self.tz), self.tz)
+
+    def start(self) -> None:
+        """启动调度线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._thread_main, name="plan-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        """停止调度线程"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def get_stats(self) -> Dict:
+        """获取调度统计"""
+        with self._cond:
+            # 丢弃堆顶的失效节点，保证下次触发时间准确
+            while self._heap and not self._is_current(self._heap[0]):
+                heapq.heappop(self._heap)
+            next_fire = self._heap[0][0] if self._heap else None
+            return {
+                "running": self.running,
+                "plans": len(self._plans),
+                "heap_size": len(self._heap),
+                "next_fire_time": datetime.fromtimestamp(next_fire, self.tz).isoformat() if next_fire else None,
+                **self._stats
+            }
+
+    # ------------------------------------------------------------------
+    # 内部实现
+    # ------------------------------------------------------------------
+    def _push(self, plan_id: int, spec: ScheduleSpec, fire_at: Optional[datetime]) -> None:
+        """调用方需持有锁"""
+        self._generation += 1
+        self._plans[plan_id] = (spec, self._generation)
+        if fire_at is not None:
+            heapq.heappush(self._heap, (fire_at.timestamp(), plan_id, self._generation))
+        self._maybe_compact()
+
+    def _is_current(self, item: Tuple[float, int, int]) -> bool:
+        entry = self._plans.get(item[1])
+        return entry is not None and entry[1] == item[2]
+
+    def _save_state(self, records: List[Dict]) -> None:
+        if self.state_store is None or not records:
+            return
+        try:
+            self.state_store.save(records)
+        except Exception as e:
+            logger.error(f"保存调度状态失败: {str(e)}")
+
+    def _maybe_compact(self) -> None:
+        """失效节点过多时重建堆，避免频繁修改任务后堆无限增长"""
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._plans):
+            self._heap = [item for item in self._heap if self._is_current(item)]
+            heapq.heapify(self._heap)
+
+    def _take_due(self) -> Optional[Tuple[Dict[float, List[int]], List[Dict]]]:
+        """
+        等待并取出所有到期的任务
+
+        Returns:
+            (按触发时间分组的任务ID, 需要保存的调度状态)；停止时返回None
+        """
+        with self._cond:
+            while not self._stopping:
+                now = time.time()
+                due: Dict[float, List[int]] = {}
+                updates: List[Dict] = []
+                while self._heap and self._heap[0][0] <= now:
+                    fire_ts, plan_id, generation = heapq.heappop(self._heap)
+                    entry = self._plans.get(plan_id)
+                    if entry is None or entry[1] != generation:
+                        continue
+                    # 按触发时间与当前时间中较晚者计算下一次，长时间停顿后错过的多次触发只补一次
+                    after = datetime.fromtimestamp(max(fire_ts, now), self.tz)
+                    fire_at = next_fire_time(entry[0], after, self.tz)
+                    self._push(plan_id, entry[0], fire_at)
+                    updates.append({
+                        "plan_id": plan_id,
+                        "spec": entry[0],
+                        "next_fire_ts": fire_at.timestamp() if fire_at else None,
+                        "last_fire_ts": fire_ts
+                    })
+                    if now - fire_ts > self.misfire_grace_time:
+                        self._stats["misfires"] += 1
+                        logger.warning(f"任务 {plan_id} 错过执行时间超过 {self.misfire_grace_time} 秒，跳过本次执行")
+                        continue
+                    due.setdefault(fire_ts, []).append(plan_id)
+                if updates:
+                    return due, updates
+                # 最多等待60秒，系统时间跳变后也能及时重新检查
+                timeout = min(self._heap[0][0] - now, 60) if self._heap else 60
+                self._cond.wait(timeout)
+            return None
+
+    def _thread_main(self) -> None:
+        while True:
+            taken = self._take_due()
+            if taken is None:
+                return
+            due, updates = taken
+            for fire_ts in sorted(due):
+                plan_ids = due[fire_ts]
+                with self._cond:
+                    self._stats["dispatches"] += 1
+                    self._stats["plans_dispatched"] += len(plan_ids)
+                    self._stats["max_group_size"] = max(self._stats["max_group_size"], len(plan_ids))
+                logger.info(f"分发定投任务 {len(plan_ids)} 个: {plan_ids}")
+                try:
+                    self.callback(plan_ids, datetime.fromtimestamp(fire_ts, self.tz))
+                except Exception as e:
+                    logger.exception(f"分发定投任务异常: {str(e)}")
+            # 分发后再保存，保存前进程退出时重启会重新分发（执行前有当日执行记录检查）
+            self._save_state(updates)
@@ -0,0 +1,285 @@
+"""
+实时事件推送服务（Server-Sent Events）
+进程内只有一个生产者线程读取行情、资产和交易状态，只把变化的部分作为事件发布；
+事件序列化一次后分发给所有连接的客户端，客户端数量不影响交易所请求次数和计算量。
+最近的事件保存在环形缓冲区中，客户端断线重连时按 Last-Event-ID 补发
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.etag import BOOT_ID
+
+logger = logging.getLogger(__name__)
+
+
+def format_sse(event_type: str, data: Any, event_id: Optional[str] = None) -> str:
+    """格式化一条 SSE 消息"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class _Subscriber:
+    """一个SSE连接：消息在生产者线程中入队，由连接所在的事件循环取出"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_pending: int):
+        self.loop = loop
+        self.max_pending = max_pending
+        self.messages: deque = deque()
+        self.lock = threading.Lock()
+        self.ready = asyncio.Event()
+        self.overflowed = False
+
+    def deliver(self, message: str) -> bool:
+        """入队一条消息，事件循环已关闭时返回 False"""
+        with self.lock:
+            if len(self.messages) >= self.max_pending:
+                # 客户端消费太慢：断开连接，由客户端带 Last-Event-ID 重连补发
+                self.overflowed = True
+            else:
+                self.messages.append(message)
+        try:
+            self.loop.call_soon_threadsafe(self.ready.set)
+        except RuntimeError:
+            return False
+        return True
+
+    async def wait(self, timeout: float) -> List[str]:
+        """等待新消息，超时返回空列表"""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self.ready.clear()
+        with self.lock:
+            messages = list(self.messages)
+            self.messages.clear()
+        return messages
+
+
+class EventBroadcaster:
+    """进程内事件广播"""
+
+    def __init__(self, buffer_size: int = 1000, max_pending: int = 500, heartbeat: float = 15,
+                 snapshot_provider: Optional[Callable[[], Dict]] = None):
+        """
+        初始化事件广播
+
+        Args:
+            buffer_size: 保留用于断线补发的最近事件数
+            max_pending: 单个连接最多积压的消息数，超出时断开该连接
+            heartbeat: 没有事件时发送心跳注释的间隔（秒）
+            snapshot_provider: 新连接（或无法补发的重连）时返回当前完整状态的函数
+        """
+        self.heartbeat = heartbeat
+        self.max_pending = max_pending
+        self.snapshot_provider = snapshot_provider
+        self._lock = threading.Lock()
+        self._buffer: deque = deque(maxlen=buffer_size)  # [(序号, 消息)]
+        self._seq = 0
+        self._subscribers: List[_Subscriber] = []
+        self._stats = {"published": 0, "connections": 0, "resumed": 0, "resets": 0, "overflows": 0}
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event_type: str, data: Any) -> str:
+        """
+        发布事件（可在任意线程调用）
+
+        事件ID为 进程标识-序号：重连到其他工作进程或服务重启后，旧ID无法补发，客户端会收到完整状态
+        """
+        with self._lock:
+            self._seq += 1
+            event_id = f"{BOOT_ID}-{self._seq}"
+            message = format_sse(event_type, data, event_id)
+            self._buffer.append((self._seq, message))
+            subscribers = list(self._subscribers)
+            self._stats["published"] += 1
+        for subscriber in subscribers:
+            if not subscriber.deliver(message):
+                self._remove(subscriber)
+        return event_id
+
+    def _subscribe(self, loop, last_event_id: Optional[str]) -> Tuple[_Subscriber, List[str], bool]:
+        """
+        注册连接并取出需要补发的事件（在同一把锁内完成，补发和新事件之间不会遗漏）
+
+        Returns:
+            (连接, 补发的消息, 是否需要发送完整状态)
+        """
+        subscriber = _Subscriber(loop, self.max_pending)
+        backlog: List[str] = []
+        needs_snapshot = True
+        with self._lock:
+            if last_event_id:
+                prefix, _, seq = last_event_id.rpartition("-")
+                oldest = self._buffer[0][0] if self._buffer else self._seq + 1
+                if prefix == BOOT_ID and seq.isdigit() and int(seq) + 1 >= oldest:
+                    backlog = [message for event_seq, message in self._buffer if event_seq > int(seq)]
+                    needs_snapshot = False
+                    self._stats["resumed"] += 1
+                else:
+                    self._stats["resets"] += 1
+            self._subscribers.append(subscriber)
+            self._stats["connections"] += 1
+        return subscriber, backlog, needs_snapshot
+
+    def _remove(self, subscriber: _Subscriber) -> None:
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    async def stream(self, request, last_event_id: Optional[str] = None):
+        """
+        SSE 响应体生成器
+
+        Args:
+            request: 当前请求，用于检测客户端断开
+            last_event_id: 客户端重连时携带的 Last-Event-ID
+        """
+        subscriber, backlog, needs_snapshot = self._subscribe(asyncio.get_running_loop(), last_event_id)
+        try:
+            yield "retry: 3000\n\n"
+            if needs_snapshot and self.snapshot_provider is not None:
+                yield format_sse("snapshot", self.snapshot_provider())
+            if backlog:
+                yield "".join(backlog)
+            while True:
+                messages = await subscriber.wait(self.heartbeat)
+                if subscriber.overflowed:
+                    with self._lock:
+                        self._stats["overflows"] += 1
+                    break
+                if await request.is_disconnected():
+                    break
+                yield "".join(messages) if messages else ": ping\n\n"
+        finally:
+            self._remove(subscriber)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "buffered": len(self._buffer),
+                "last_event_id": f"{BOOT_ID}-{self._seq}" if self._seq else None,
+                **self._stats
+            }
+
+
+class LiveStatePublisher:
+    """
+    实时状态生产者：单个后台线程定期读取状态，与上次发布的状态比较，只发布变化的部分
+
+    读取函数由调用方提供，均只读取内存或数据库，不请求交易所：
+    - ticker_reader() -> 配置币种行情列表（按 symbol 区分），没有可用行情时返回 None
+    - assets_reader() -> 资产汇总，没有时返回 None
+    - transaction_reader(after_id) -> (after_id 之后新写入的交易列表, 最大交易ID, 交易版本号)；
+      after_id 为 None 时只返回当前最大ID和版本号
+    """
+
+    def __init__(self, broadcaster: EventBroadcaster,
+                 ticker_reader: Callable[[], Optional[List[Dict]]],
+                 assets_reader: Callable[[], Optional[Dict]],
+                 transaction_reader: Callable[[Optional[int]], Tuple[List[Dict], Optional[int], Any]],
+                 interval: Optional[float] = None):
+        """
+        Args:
+            interval: 读取间隔（秒），默认读取 STREAM_INTERVAL 环境变量，未设置时为1
+        """
+        self.broadcaster = broadcaster
+        self.ticker_reader = ticker_reader
+        self.assets_reader = assets_reader
+        self.transaction_reader = transaction_reader
+        self.interval = interval if interval is not None else float(os.getenv("STREAM_INTERVAL", "1"))
+
+        self._lock = threading.Lock()
+        self._tickers: Dict[str, Dict] = {}
+        self._assets: Optional[Dict] = None
+        self._last_tx_id: Optional[int] = None
+        self._tx_version: Any = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"ticks": 0, "errors": 0}
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="live-state-publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def snapshot(self) -> Dict:
+        """当前完整状态，发送给新连接"""
+        with self._lock:
+            return {"tickers": list(self._tickers.values()), "assets": self._assets}
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.tick()
+            except Exception as e:
+                self._stats["errors"] += 1
+                logger.exception(f"实时状态读取异常: {str(e)}")
+
+    def tick(self) -> None:
+        """读取一次状态并发布变化"""
+        self._stats["ticks"] += 1
+
+        tickers = self.ticker_reader()
+        if tickers is not None:
+            current = {item["symbol"]: item for item in tickers}
+            with self._lock:
+                changed = [item for symbol, item in current.items() if self._tickers.get(symbol) != item]
+                removed = [symbol for symbol in self._tickers if symbol not in current]
+                self._tickers = current
+            if changed or removed:
+                self.broadcaster.publish("tickers", {"updated": changed, "removed": removed})
+
+        assets = self.assets_reader()
+        if assets is not None:
+            with self._lock:
+                changed = assets != self._assets
+                self._assets = assets
+            if changed:
+                self.broadcaster.publish("assets", assets)
+
+        # 没有连接时不查询交易记录，有连接后从当时的最大ID开始推送
+        if self.broadcaster.subscriber_count == 0:
+            self._last_tx_id = None
+            return
+        rows, max_id, version = self.transaction_reader(self._last_tx_id)
+        first_read = self._last_tx_id is None
+        for row in rows:
+            self.broadcaster.publish("execution", row)
+        if not first_read and version != self._tx_version and not rows:
+            # 已有交易被修改（如成交对账完成），通知客户端刷新交易列表
+            self.broadcaster.publish("transactions_changed", {"version": version})
+        self._last_tx_id = max_id if max_id is not None else 0
+        self._tx_version = version
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            tracked = len(self._tickers)
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "interval": self.interval,
+            "tickers": tracked,
+            **self._stats
+        }
@@ -0,0 +1,152 @@
+"""
+定投执行引擎
+使用有上限的线程池并发执行定投任务，用细粒度锁替代全局锁：
+同一任务串行执行保证幂等，卖出时同一币种串行以免并发读取同一份余额，
+其余任务的下单互不阻塞；同时统计计划执行时间与实际开始时间的延迟
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutionEngine:
+    """定投执行引擎类"""
+
+    def __init__(self, task_func: Callable[[int], None], max_workers: Optional[int] = None,
+                 latency_window: int = 500):
+        """
+        初始化执行引擎
+
+        Args:
+            task_func: 执行单个定投任务的函数，参数为任务ID
+            max_workers: 最大并发数，默认读取 DCA_EXECUTION_WORKERS 环境变量，未设置时为8
+            latency_window: 延迟统计保留的最近执行次数
+        """
+        if max_workers is None:
+            max_workers = int(os.getenv('DCA_EXECUTION_WORKERS', '8'))
+        self.task_func = task_func
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dca-exec")
+
+        self._locks_lock = threading.Lock()
+        self._plan_locks: Dict[int, threading.Lock] = {}
+        self._currency_locks: Dict[str, threading.Lock] = {}
+
+        # 已提交但尚未结束的任务，同一任务不会重复排队
+        self._pending = set()
+        self._running = 0
+
+        self._latencies = deque(maxlen=latency_window)
+        self._durations = deque(maxlen=latency_window)
+        self._stats = {"submitted": 0, "skipped": 0, "rejected": 0, "completed": 0, "failed": 0}
+
+    def plan_lock(self, plan_id: int) -> threading.Lock:
+        """获取任务级锁"""
+        with self._locks_lock:
+            lock = self._plan_locks.get(plan_id)
+            if lock is None:
+                lock = self._plan_locks[plan_id] = threading.Lock()
+            return lock
+
+    def currency_lock(self, currency: str) -> threading.Lock:
+        """获取币种级锁（卖出同一币种时使用）"""
+        with self._locks_lock:
+            lock = self._currency_locks.get(currency)
+            if lock is None:
+                lock = self._currency_locks[currency] = threading.Lock()
+            return lock
+
+    def submit(self, plan_id: int, scheduled_at: Optional[float] = None,
+               guard: Optional[Callable[[], bool]] = None) -> Optional[Future]:
+        """
+        提交任务到线程池
+
+        Args:
+            plan_id: 任务ID
+            scheduled_at: 计划执行时间（时间戳），默认取提交时间
+            guard: 开始执行前的检查（如确认仍持有主进程租约），返回False时放弃本次执行
+
+        Returns:
+            Future；同一任务已在排队或执行中时返回None
+        """
+        with self._locks_lock:
+            if plan_id in self._pending:
+                self._stats["skipped"] += 1
+                logger.info(f"任务 {plan_id} 已在执行队列中，跳过本次提交")
+                return None
+            self._pending.add(plan_id)
+            self._stats["submitted"] += 1
+
+        if scheduled_at is None:
+            scheduled_at = time.time()
+        return self._executor.submit(self._run, plan_id, scheduled_at, guard)
+
+    def _run(self, plan_id: int, scheduled_at: float, guard: Optional[Callable[[], bool]] = None) -> None:
+        # 排队期间可能已失去执行资格，在下单前再检查一次
+        if guard is not None and not guard():
+            with self._locks_lock:
+                self._pending.discard(plan_id)
+                self._stats["rejected"] += 1
+            logger.warning(f"任务 {plan_id} 执行前检查未通过，放弃本次执行")
+            return
+
+        started = time.time()
+        latency = started - scheduled_at
+        with self._locks_lock:
+            self._running += 1
+            self._latencies.append(latency)
+        if latency > 60:
+            logger.warning(f"任务 {plan_id} 实际开始时间晚于计划 {latency:.1f} 秒")
+
+        failed = False
+        try:
+            self.task_func(plan_id)
+        except Exception as e:
+            failed = True
+            logger.exception(f"任务 {plan_id} 执行异常: {str(e)}")
+        finally:
+            with self._locks_lock:
+                self._running -= 1
+                self._pending.discard(plan_id)
+                self._durations.append(time.time() - started)
+                self._stats["failed" if failed else "completed"] += 1
+
+    @staticmethod
+    def _summarize(values) -> Dict:
+        if not values:
+            return {"count": 0, "avg": None, "p50": None, "p95": None, "max": None}
+        ordered = sorted(values)
+        return {
+            "count": len(ordered),
+            "avg": round(sum(ordered) / len(ordered), 3),
+            "p50": round(ordered[len(ordered) // 2], 3),
+            "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+            "max": round(ordered[-1], 3)
+        }
+
+    def get_stats(self) -> Dict:
+        """获取执行统计，延迟和耗时单位为秒"""
+        with self._locks_lock:
+            latencies = list(self._latencies)
+            durations = list(self._durations)
+            stats = dict(self._stats)
+            running = self._running
+            queued = len(self._pending) - running
+        return {
+            "max_workers": self.max_workers,
+            "running": running,
+            "queued": queued,
+            **stats,
+            "schedule_latency": self._summarize(latencies),
+            "duration": self._summarize(durations)
+        }
+
+    def shutdown(self, wait: bool = False) -> None:
+        """关闭线程池"""
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,354 @@
+"""
+成交对账服务
+下单成功后交易记录立即以 pending_fill 状态写入，由后台线程批量轮询未完成的订单并补全成交列：
+每轮只请求一次最近成交明细，查不到的订单再单独查询订单状态；
+轮询间隔从短到长逐步退避，订单成交后立即出队，超时仍未成交时按行情估算
+"""
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from models import Transaction
+from services.position_service import transaction_position_delta
+from services.transaction_service import FILL_PENDING, _to_float, apply_fill_columns, load_response
+
+logger = logging.getLogger(__name__)
+
+# 订单详情中表示订单已结束的状态
+_CANCELED_STATES = ("canceled", "mmp_canceled")
+
+
+class FillReconciler:
+    """成交对账服务类"""
+
+    def __init__(self, session_local, client_getter: Callable[[], Optional[object]], position_service,
+                 initial_interval: float = 1, max_interval: float = 30, max_wait: float = 300,
+                 batch_size: int = 50, on_applied: Optional[Callable[[], None]] = None):
+        """
+        初始化成交对账服务
+
+        Args:
+            session_local: SQLAlchemy会话工厂
+            client_getter: 返回OKX客户端的函数，API未配置时返回None
+            position_service: 持仓台账服务，成交信息变化时修正台账
+            initial_interval: 首次轮询间隔（秒），之后每次翻倍
+            max_interval: 轮询间隔上限（秒）
+            max_wait: 订单等待成交的最长时间（秒），超时后按行情估算
+            batch_size: 每轮最多处理的订单数
+            on_applied: 成交信息写入后的回调（如使资产缓存失效）
+        """
+        self.SessionLocal = session_local
+        self.client_getter = client_getter
+        self.position_service = position_service
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.max_wait = max_wait
+        self.batch_size = batch_size
+        self.on_applied = on_applied
+
+        self._heap: List = []  # [(到期时间, 序号, 交易ID)]
+        self._entries: Dict[int, Dict] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+        self._fill_latencies: List[float] = []
+        self._stats = {"enqueued": 0, "filled": 0, "estimated": 0, "canceled": 0,
+                       "fills_requests": 0, "order_requests": 0, "errors": 0}
+
+    # ------------------------------------------------------------------
+    # 公共接口
+    # ------------------------------------------------------------------
+    def enqueue(self, tx_id: int, ord_id: str, symbol: str, direction: str, amount: float,
+                order_size: Optional[str] = None) -> None:
+        """
+        将待对账的交易加入队列
+
+        Args:
+            tx_id: 交易记录ID
+            ord_id: 订单ID
+            symbol: 交易对，如 BTC-USDT
+            direction: buy/sell
+            amount: 定投金额（USDT）
+            order_size: 下单数量，市价卖单超时估算时使用
+        """
+        now = time.time()
+        entry = {
+            "tx_id": tx_id,
+            "ord_id": ord_id,
+            "symbol": symbol,
+            "direction": direction,
+            "amount": amount,
+            "order_size": order_size,
+            "created_at": now,
+            "interval": self.initial_interval,
+            "seq": next(self._seq)
+        }
+        with self._cond:
+            if tx_id in self._entries:
+                return
+            self._entries[tx_id] = entry
+            heapq.heappush(self._heap, (now + entry["interval"], entry["seq"], tx_id))
+            self._stats["enqueued"] += 1
+            self._cond.notify()
+
+    def start(self) -> None:
+        """启动后台对账线程，并将数据库中尚未对账的交易重新入队"""
+        if self._thread and self._thread.is_alive():
+            return
+        self.load_pending()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._thread_main, name="fill-reconciler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        """停止后台对账线程，未完成的订单保留 pending_fill 状态，下次启动时继续对账"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def get_stats(self) -> Dict:
+        """获取对账统计，成交等待时间单位为秒"""
+        with self._cond:
+            latencies = sorted(self._fill_latencies)
+            stats = dict(self._stats)
+            pending = len(self._entries)
+        return {
+            "running": self.running,
+            "pending": pending,
+            **stats,
+            "fill_wait_p50": round(latencies[len(latencies) // 2], 3) if latencies else None,
+            "fill_wait_max": round(latencies[-1], 3) if latencies else None
+        }
+
+    def load_pending(self) -> None:
+        """从数据库加载待对账的交易（启动时或其他工作进程写入后调用），已在队列中的会跳过，等待时间重新计时"""
+        db = self.SessionLocal()
+        try:
+            rows = db.query(Transaction).filter(Transaction.fill_status == FILL_PENDING).all()
+            for tx in rows:
+                response_data = load_response(tx.response) or {}
+                if not tx.ord_id:
+                    continue
+                self.enqueue(tx.id, tx.ord_id, tx.symbol, tx.direction or "buy", tx.amount,
+                             response_data.get("order_size"))
+            if rows:
+                logger.info(f"加载待对账交易 {len(rows)} 条")
+        except Exception as e:
+            logger.error(f"加载待对账交易失败: {str(e)}")
+        finally:
+            db.close()
+
+    # ------------------------------------------------------------------
+    # 后台线程
+    # ------------------------------------------------------------------
+    def _take_due(self) -> Optional[List[Dict]]:
+        """等待并取出到期的订单；停止时返回None"""
+        with self._cond:
+            while not self._stopping:
+                now = time.time()
+                if self._heap and self._heap[0][0] <= now:
+                    batch = []
+                    while self._heap and self._heap[0][0] <= now and len(batch) < self.batch_size:
+                        _, seq, tx_id = heapq.heappop(self._heap)
+                        entry = self._entries.get(tx_id)
+                        # 重新入队后旧的堆节点作废
+                        if entry is not None and entry["seq"] == seq:
+                            batch.append(entry)
+                    if batch:
+                        return batch
+                    continue
+                timeout = self._heap[0][0] - now if self._heap else None
+                self._cond.wait(timeout)
+            return None
+
+    def _thread_main(self) -> None:
+        while True:
+            batch = self._take_due()
+            if batch is None:
+                return
+            try:
+                self._reconcile(batch)
+            except Exception as e:
+                logger.exception(f"成交对账异常: {str(e)}")
+                with self._cond:
+                    self._stats["errors"] += 1
+                for entry in batch:
+                    if entry["tx_id"] in self._entries:
+                        self._reschedule(entry)
+
+    def _reschedule(self, entry: Dict) -> None:
+        """按退避后的间隔重新入队"""
+        entry["interval"] = min(entry["interval"] * 2, self.max_interval)
+        with self._cond:
+            entry["seq"] = next(self._seq)
+            heapq.heappush(self._heap, (time.time() + entry["interval"], entry["seq"], entry["tx_id"]))
+
+    def _finish(self, entry: Dict, outcome: str) -> None:
+        with self._cond:
+            self._entries.pop(entry["tx_id"], None)
+            self._stats[outcome] += 1
+            if outcome == "filled":
+                self._fill_latencies.append(time.time() - entry["created_at"])
+                if len(self._fill_latencies) > 500:
+                    del self._fill_latencies[:-500]
+
+    def _reconcile(self, batch: List[Dict]) -> None:
+        """处理一批到期的订单"""
+        client = self.client_getter()
+        if client is None:
+            for entry in batch:
+                self._reschedule(entry)
+            return
+
+        fills = self._fetch_fills(client)
+        for entry in batch:
+            fill_details = fills.get(entry["ord_id"])
+            outcome = "filled"
+            if fill_details is None:
+                fill_details, outcome = self._query_order(client, entry)
+            if fill_details is None and time.time() - entry["created_at"] >= self.max_wait:
+                fill_details, outcome = self._estimate(client, entry), "estimated"
+
+            if fill_details is None:
+                self._reschedule(entry)
+                continue
+            self._apply(entry, fill_details)
+            self._finish(entry, outcome)
+
+    def _fetch_fills(self, client) -> Dict[str, Dict]:
+        """请求一次最近成交明细，按订单ID汇总成交均价、数量和金额"""
+        with self._cond:
+            self._stats["fills_requests"] += 1
+        result = client.get_fills('SPOT')
+        if result.get('code') != '0':
+            logger.warning(f"获取成交明细失败: {result.get('msg', '未知错误')}")
+            return {}
+
+        totals: Dict[str, List[float]] = {}
+        for fill_info in result.get('data') or []:
+            fill_px = _to_float(fill_info.get('fillPx'))
+            fill_sz = _to_float(fill_info.get('fillSz'))
+            if not fill_px or not fill_sz or fill_px <= 0 or fill_sz <= 0:
+                continue
+            total = totals.setdefault(fill_info.get('ordId'), [0.0, 0.0])
+            total[0] += fill_sz
+            total[1] += fill_px * fill_sz
+
+        return {
+            ord_id: {
+                'fillPx': str(fill_amt / fill_sz),  # 成交均价
+                'fillSz': str(fill_sz),  # 累计成交数量
+                'fillAmt': str(fill_amt),  # 成交金额
+                'ordId': ord_id
+            }
+            for ord_id, (fill_sz, fill_amt) in totals.items()
+        }
+
+    def _query_order(self, client, entry: Dict):
+        """
+        成交明细中查不到的订单单独查询订单状态
+
+        Returns:
+            (成交详情, 结果)；订单仍在进行中时成交详情为None
+        """
+        with self._cond:
+            self._stats["order_requests"] += 1
+        try:
+            result = client.get_order_detail(entry["ord_id"], symbol=entry["symbol"])
+        except Exception as e:
+            logger.warning(f"查询订单 {entry['ord_id']} 状态异常: {str(e)}")
+            return None, "filled"
+        if result.get('code') != '0' or not result.get('data'):
+            return None, "filled"
+
+        order_info = result['data'][0]
+        state = order_info.get('state')
+        avg_px = _to_float(order_info.get('avgPx'))
+        acc_fill_sz = _to_float(order_info.get('accFillSz')) or 0
+        if state == 'filled' or (state in _CANCELED_STATES and acc_fill_sz > 0):
+            if avg_px and acc_fill_sz > 0:
+                return {
+                    'fillPx': str(avg_px),
+                    'fillSz': str(acc_fill_sz),
+                    'fillAmt': str(avg_px * acc_fill_sz),
+                    'ordId': entry["ord_id"]
+                }, "filled"
+        elif state in _CANCELED_STATES:
+            return {
+                'fillPx': None,
+                'fillSz': '0',
+                'fillAmt': '0',
+                'ordId': entry["ord_id"],
+                'canceled': True
+            }, "canceled"
+        return None, "filled"
+
+    def _estimate(self, client, entry: Dict) -> Optional[Dict]:
+        """超时仍未查到成交时，使用当前行情估算成交信息"""
+        logger.warning(f"订单 {entry['ord_id']} 等待成交超时，使用估算值")
+        try:
+            ticker_result = client.get_ticker(entry["symbol"])
+            if ticker_result.get('code') != '0' or not ticker_result.get('data'):
+                return None
+            current_price = float(ticker_result['data'][0].get('last', 0))
+        except Exception as e:
+            logger.warning(f"订单 {entry['ord_id']} 估算成交信息异常: {str(e)}")
+            return None
+        if current_price <= 0:
+            return None
+
+        if entry["direction"] == "sell":
+            # 市价卖单的下单数量即卖出数量
+            est_size = _to_float(entry["order_size"])
+            if est_size is None:
+                est_size = float(entry["amount"]) / current_price
+            est_amount = est_size * current_price
+        else:
+            # 市价买单的下单数量即买入金额
+            est_amount = float(entry["amount"])
+            est_size = est_amount / current_price
+        return {
+            'fillPx': str(current_price),
+            'fillSz': str(est_size),
+            'fillAmt': str(est_amount),
+            'ordId': entry["ord_id"],
+            'estimated': True  # 标记为估算值
+        }
+
+    def _apply(self, entry: Dict, fill_details: Dict) -> None:
+        """写入成交详情和成交列，并在同一事务中修正持仓台账"""
+        db = self.SessionLocal()
+        try:
+            tx = db.get(Transaction, entry["tx_id"])
+            if tx is None or tx.fill_status != FILL_PENDING:
+                return
+            previous_delta = transaction_position_delta(tx)
+
+            response_data = load_response(tx.response) or {}
+            response_data["fill_details"] = fill_details
+            tx.response = json.dumps(response_data)
+            apply_fill_columns(tx, response_data)
+
+            self.position_service.adjust_transaction(db, tx, previous_delta)
+            db.commit()
+            logger.info(f"交易 {tx.id} 成交对账完成({tx.fill_status}): {fill_details}")
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        if self.on_applied is not None:
+            self.on_applied()
@@ -0,0 +1,206 @@
+"""
+主进程选举服务
+多个 uvicorn 工作进程共用同一个 SQLite 数据库，通过 leader_lease 表中的一行租约选出唯一的主进程：
+持有租约的进程定期续约，负责调度定投任务和成交对账；其他进程只处理HTTP请求。
+主进程退出或超过租约时长未续约时，其他进程在下一次心跳时接管
+
+切换回调（恢复/停止调度等）和心跳回调在单独的线程中按顺序执行，耗时的回调不会拖慢续约；
+下单前应调用 holds_lease() 从数据库确认租约仍由本进程持有
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderElection:
+    """主进程选举服务类"""
+
+    def __init__(self, engine, name: str = "scheduler", ttl: Optional[float] = None,
+                 heartbeat: Optional[float] = None,
+                 on_elected: Optional[Callable[[], None]] = None,
+                 on_demoted: Optional[Callable[[], None]] = None,
+                 on_tick: Optional[Callable[[bool], None]] = None):
+        """
+        初始化主进程选举服务
+
+        Args:
+            engine: SQLAlchemy引擎
+            name: 租约名称
+            ttl: 租约时长（秒），默认读取 LEADER_LEASE_TTL 环境变量，未设置时为15
+            heartbeat: 续约/竞争间隔（秒），默认为租约时长的三分之一
+            on_elected: 成为主进程时的回调
+            on_demoted: 失去主进程身份时的回调
+            on_tick: 每次心跳后的回调，参数为当前是否为主进程
+        """
+        self.engine = engine
+        self.name = name
+        self.ttl = ttl if ttl is not None else float(os.getenv('LEADER_LEASE_TTL', '15'))
+        self.heartbeat = heartbeat if heartbeat is not None else self.ttl / 3
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.on_tick = on_tick
+        self.holder_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._is_leader = False
+        self._lease_expires = 0.0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._callbacks: Optional[ThreadPoolExecutor] = None
+        self._tick_future: Optional[Future] = None
+        self._stats = {"elections": 0, "demotions": 0, "renew_failures": 0, "lease_check_failures": 0}
+
+    @property
+    def is_leader(self) -> bool:
+        """本地判断是否为主进程：已当选且最近一次续约的租约未过期"""
+        return self._is_leader and time.time() < self._lease_expires
+
+    def holds_lease(self) -> bool:
+        """从数据库确认租约仍由本进程持有且未过期（下单前调用，不依赖心跳线程是否及时续约）"""
+        if not self.is_leader:
+            return False
+        try:
+            with self.engine.connect() as connection:
+                row = connection.execute(
+                    text("SELECT holder, expires_at FROM leader_lease WHERE name = :name"), {"name": self.name}
+                ).first()
+        except Exception as e:
+            self._stats["lease_check_failures"] += 1
+            logger.warning(f"读取主进程租约失败: {str(e)}")
+            return False
+        return row is not None and row.holder == self.holder_id and (row.expires_at or 0) > time.time()
+
+    def start(self) -> None:
+        """立即竞争一次租约，然后启动心跳线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        if self._callbacks is None:
+            self._callbacks = ThreadPoolExecutor(max_workers=1, thread_name_prefix="leader-callback")
+        self._tick()
+        self._thread = threading.Thread(target=self._thread_main, name="leader-election", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        """
+        停止心跳线程；当前为主进程时等待失去主进程的回调执行完毕后释放租约，
+        其他进程无需等待租约过期即可接管
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+        self._thread = None
+        was_leader = self._is_leader
+        self._set_leader(False)
+        if self._callbacks is not None:
+            self._callbacks.shutdown(wait=True)
+            self._callbacks = None
+        if was_leader:
+            try:
+                with self.engine.begin() as connection:
+                    connection.execute(
+                        text("UPDATE leader_lease SET expires_at = 0 WHERE name = :name AND holder = :holder"),
+                        {"name": self.name, "holder": self.holder_id}
+                    )
+            except Exception as e:
+                logger.error(f"释放主进程租约失败: {str(e)}")
+
+    def try_acquire(self) -> bool:
+        """
+        竞争或续约租约
+
+        租约行不存在时先插入；只有租约已过期或本进程是当前持有者时更新才会命中，
+        SQLite 的写锁保证同一时刻只有一个进程更新成功
+        """
+        now = time.time()
+        with self.engine.begin() as connection:
+            connection.execute(
+                text("INSERT OR IGNORE INTO leader_lease (name, holder, expires_at) VALUES (:name, NULL, 0)"),
+                {"name": self.name}
+            )
+            result = connection.execute(
+                text(
+                    "UPDATE leader_lease SET holder = :holder, expires_at = :expires_at, renewed_at = :now "
+                    "WHERE name = :name AND (holder = :holder OR expires_at < :now)"
+                ),
+                {"name": self.name, "holder": self.holder_id, "expires_at": now + self.ttl, "now": now}
+            )
+        if result.rowcount == 1:
+            self._lease_expires = now + self.ttl
+            return True
+        return False
+
+    def get_stats(self) -> Dict:
+        """获取选举状态"""
+        holder = None
+        try:
+            with self.engine.connect() as connection:
+                row = connection.execute(
+                    text("SELECT holder, expires_at FROM leader_lease WHERE name = :name"), {"name": self.name}
+                ).first()
+            if row and row.expires_at and row.expires_at > time.time():
+                holder = row.holder
+        except Exception as e:
+            logger.warning(f"读取主进程租约失败: {str(e)}")
+        return {
+            "holder_id": self.holder_id,
+            "is_leader": self.is_leader,
+            "current_leader": holder,
+            "ttl": self.ttl,
+            **self._stats
+        }
+
+    def _set_leader(self, is_leader: bool) -> None:
+        if is_leader == self._is_leader:
+            return
+        self._is_leader = is_leader
+        if is_leader:
+            self._stats["elections"] += 1
+            logger.info(f"当前进程成为主进程: {self.holder_id}")
+            callback = self.on_elected
+        else:
+            self._stats["demotions"] += 1
+            logger.warning(f"当前进程不再是主进程: {self.holder_id}")
+            callback = self.on_demoted
+        if callback is not None:
+            self._submit(self._invoke, callback, "主进程切换回调异常")
+
+    def _submit(self, func, *args) -> Optional[Future]:
+        """在回调线程中执行；未启动（如直接调用 stop）时在当前线程执行"""
+        if self._callbacks is None:
+            func(*args)
+            return None
+        return self._callbacks.submit(func, *args)
+
+    @staticmethod
+    def _invoke(callback: Callable, message: str, *args) -> None:
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.exception(f"{message}: {str(e)}")
+
+    def _tick(self) -> None:
+        try:
+            acquired = self.try_acquire()
+        except Exception as e:
+            # 数据库暂时不可用时，在已持有的租约到期前保持主进程身份
+            self._stats["renew_failures"] += 1
+            logger.warning(f"竞争主进程租约失败: {str(e)}")
+            acquired = self._is_leader and time.time() < self._lease_expires - self.heartbeat
+        self._set_leader(acquired)
+
+        # 上一次心跳回调还没执行完时跳过，回调积压不会影响续约
+        if self.on_tick is not None and (self._tick_future is None or self._tick_future.done()):
+            self._tick_future = self._submit(self._invoke, self.on_tick, "主进程心跳回调异常", self._is_leader)
+
+    def _thread_main(self) -> None:
+        while not self._stop_event.wait(self.heartbeat):
+            self._tick()
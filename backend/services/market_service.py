@@ -8,13 +8,14 @@ from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
 from models import UserConfig
 from services.config_service import ConfigService
+from utils.ticker_snapshot import TickerSnapshot, TickerSnapshotError, parse_ticker, shared_ticker_snapshots
 
 logger = logging.getLogger(__name__)
 
 class MarketService:
     """行情服务类"""
     
-    def __init__(self, session_local, config_service: ConfigService, create_okx_client_func):
+    def __init__(self, session_local, config_service: ConfigService, create_okx_client_func, create_async_okx_client_func=None, ticker_feed=None, ticker_snapshots=None):
         """
         初始化行情服务
         
@@ -22,10 +23,220 @@ class MarketService:
             session_local: SQLAlchemy会话工厂
             config_service: 配置服务实例
             create_okx_client_func: OKX客户端创建函数
+            create_async_okx_client_func: asyncio版OKX客户端创建函数（供异步接口使用）
+            ticker_feed: 行情推送服务，命中时直接读取内存价格表
+            ticker_snapshots: 共享的全量行情快照，默认使用进程级实例
         """
         self.SessionLocal = session_local
         self.config_service = config_service
         self.create_okx_client = create_okx_client_func
+        self.create_async_okx_client = create_async_okx_client_func
+        self.ticker_feed = ticker_feed
+        self.ticker_snapshots = ticker_snapshots or shared_ticker_snapshots
+    
+    def _get_feed_snapshot(self, selected_coins: List[str]) -> Optional[TickerSnapshot]:
+        """从行情推送的内存价格表读取配置币种，任一币种缺失或过期时返回None"""
+        if not self.ticker_feed:
+            return None
+        found, missing = self.ticker_feed.get_tickers(f"{coin}-USDT" for coin in selected_coins)
+        if missing:
+            return None
+        return TickerSnapshot(found.values())
+    
+    @staticmethod
+    def _normalize_coins(selected_coins: List[str]) -> List[str]:
+        """处理币种格式：如果是 BTC-USDT 格式，转换为 BTC 格式"""
+        processed_coins = []
+        for coin in selected_coins:
+            if '-USDT' in coin:
+                coin = coin.replace('-USDT', '')
+            if coin not in processed_coins:
+                processed_coins.append(coin)
+        return processed_coins
+    
+    @staticmethod
+    def _build_ticker_data(ticker: Dict, symbol: str) -> Dict:
+        """根据已解析的行情（见 parse_ticker）计算各项涨跌幅"""
+        last_price = ticker['last']
+        open_24h = ticker['sodUtc0']  # 24小时前开盘价
+        volume_24h = ticker['volCcy24h']
+        high_24h = ticker['high24h']
+        low_24h = ticker['low24h']
+        
+        # 计算24h涨跌幅
+        change_24h_percent = 0
+        if open_24h > 0:
+            change_24h_percent = ((last_price - open_24h) / open_24h) * 100
+        
+        # 计算当日涨跌幅 (使用sodUtc8，北京时间8点开盘价)
+        open_today = ticker['sodUtc8'] if ticker['sodUtc8'] is not None else open_24h
+        change_today_percent = 0
+        if open_today > 0:
+            change_today_percent = ((last_price - open_today) / open_today) * 100
+        
+        # 计算距24h最高的距离
+        distance_from_high = 0
+        if high_24h > 0:
+            distance_from_high = ((last_price - high_24h) / high_24h) * 100
+        
+        # 计算距24h最低的距离
+        distance_from_low = 0
+        if low_24h > 0:
+            distance_from_low = ((last_price - low_24h) / low_24h) * 100
+        
+        return {
+            "symbol": ticker['instId'] or symbol,
+            "price": last_price,
+            "change24h": round(change_24h_percent, 2),
+            "changePercent24h": f"{change_24h_percent:+.2f}%",
+            "changeDaily": round(change_today_percent, 2),
+            "changePercentDaily": f"{change_today_percent:+.2f}%",
+            "changeFromHigh": round(distance_from_high, 2),
+            "changeFromHighPercent": f"{distance_from_high:+.2f}%",
+            "changeFromLow": round(distance_from_low, 2),
+            "changeFromLowPercent": f"{distance_from_low:+.2f}%",
+            "volume24h": volume_24h,
+            "high24h": high_24h,
+            "low24h": low_24h,
+            "timestamp": ticker['ts']
+        }
+    
+    def _build_configured_items(self, snapshot: TickerSnapshot, selected_coins: List[str]) -> List[Dict]:
+        """从行情快照中按索引取出配置的币种并计算涨跌幅"""
+        market_data = []
+        for coin in selected_coins:
+            inst_id = f"{coin}-USDT"
+            ticker = snapshot.get(inst_id)
+            if ticker is None:
+                continue
+            item = self._build_ticker_data(ticker, inst_id)
+            market_data.append({"symbol": item.pop("symbol"), "currency": coin, **item})
+        return market_data
+    
+    def _filter_configured_tickers(self, snapshot: TickerSnapshot, selected_coins: List[str]) -> Dict:
+        """从行情快照中按索引取出配置的币种"""
+        market_data = self._build_configured_items(snapshot, selected_coins)
+        logger.info(f"获取配置币种行情数据成功: {len(market_data)}个币种")
+        return {"code": "0", "msg": "success", "data": market_data}
+    
+    @staticmethod
+    def _snapshot_error(error: TickerSnapshotError) -> Dict:
+        """行情快照获取失败时的统一返回"""
+        logger.error(f"获取行情数据失败: {error}")
+        return {"code": "ERROR", "msg": f"获取行情数据失败: {error}", "data": []}
+    
+    def _parse_ticker_result(self, ticker_result: Dict, symbol: str) -> Dict:
+        """解析单个币种的行情接口响应"""
+        if ticker_result.get('code') != '0':
+            logger.error(f"获取 {symbol} 行情失败: {ticker_result.get('msg', '未知错误')}")
+            return {"code": "ERROR", "msg": f"获取行情失败: {ticker_result.get('msg', '未知错误')}", "data": None}
+        
+        ticker_data = ticker_result.get('data', [])
+        if not ticker_data:
+            return {"code": "ERROR", "msg": "未找到行情数据", "data": None}
+        
+        try:
+            result = self._build_ticker_data(parse_ticker(ticker_data[0]), symbol)
+            logger.info(f"获取 {symbol} 行情成功")
+            return {"code": "0", "msg": "success", "data": result}
+        except (ValueError, TypeError) as e:
+            logger.error(f"解析 {symbol} 行情数据失败: {e}")
+            return {"code": "ERROR", "msg": f"数据解析失败: {str(e)}", "data": None}
+    
+    @staticmethod
+    def _summarize_market_data(market_data_result: Dict) -> Dict:
+        """根据配置币种行情统计市场概览"""
+        if market_data_result.get('code') != '0':
+            return {
+                "totalCoins": 0,
+                "gainers": 0,
+                "losers": 0,
+                "avgChange": 0,
+                "totalVolume": 0,
+                "error": market_data_result.get('msg', '获取数据失败')
+            }
+        
+        market_data = market_data_result.get('data', [])
+        
+        if not market_data:
+            return {
+                "totalCoins": 0,
+                "gainers": 0,
+                "losers": 0,
+                "avgChange": 0,
+                "totalVolume": 0,
+                "error": "无行情数据"
+            }
+        
+        # 统计市场数据
+        total_coins = len(market_data)
+        gainers = sum(1 for coin in market_data if coin.get('change24h', 0) > 0)
+        losers = sum(1 for coin in market_data if coin.get('change24h', 0) < 0)
+        
+        # 计算平均涨跌幅
+        total_change = sum(coin.get('change24h', 0) for coin in market_data)
+        avg_change = total_change / total_coins if total_coins > 0 else 0
+        
+        # 计算总交易量
+        total_volume = sum(coin.get('volume24h', 0) for coin in market_data)
+        
+        result = {
+            "totalCoins": total_coins,
+            "gainers": gainers,
+            "losers": losers,
+            "avgChange": round(avg_change, 2),
+            "totalVolume": round(total_volume, 2)
+        }
+        
+        logger.info(f"获取市场概览成功: {result}")
+        return result
+    
+    @staticmethod
+    def _match_instruments(instruments_result: Dict, keyword: str, limit: int) -> List[Dict]:
+        """按关键词筛选USDT交易对"""
+        if instruments_result.get('code') != '0':
+            logger.error(f"获取交易对列表失败: {instruments_result.get('msg', '未知错误')}")
+            return []
+        
+        instruments = instruments_result.get('data', [])
+        
+        # 搜索匹配的币种
+        keyword_upper = keyword.upper()
+        matched_coins = []
+        
+        for instrument in instruments:
+            inst_id = instrument.get('instId', '')
+            base_ccy = instrument.get('baseCcy', '')
+            quote_ccy = instrument.get('quoteCcy', '')
+            
+            # 只搜索USDT交易对
+            if quote_ccy == 'USDT' and (
+                keyword_upper in base_ccy or 
+                keyword_upper in inst_id
+            ):
+                matched_coins.append({
+                    "symbol": inst_id,
+                    "baseCurrency": base_ccy,
+                    "quoteCurrency": quote_ccy,
+                    "status": instrument.get('state', 'unknown')
+                })
+                
+                if len(matched_coins) >= limit:
+                    break
+        
+        logger.info(f"搜索币种 '{keyword}' 找到 {len(matched_coins)} 个结果")
+        return matched_coins
+    
+    async def _get_async_client(self):
+        """根据当前API配置获取asyncio客户端，未配置时返回None"""
+        api_config = self.config_service.get_decrypted_api_config()
+        if not api_config:
+            return None
+        return self.create_async_okx_client(
+            api_config['api_key'],
+            api_config['secret_key'],
+            api_config['passphrase']
+        )
     
     def get_configured_coins_market_data(self) -> Dict:
         """
@@ -39,15 +250,12 @@ class MarketService:
             selected_coins = self.config_service.get_coin_config()
             if not selected_coins:
                 return {"code": "ERROR", "msg": "未配置交易币种", "data": []}
+            selected_coins = self._normalize_coins(selected_coins)
             
-            # 处理币种格式：如果是 BTC-USDT 格式，转换为 BTC 格式
-            processed_coins = []
-            for coin in selected_coins:
-                if '-USDT' in coin:
-                    processed_coins.append(coin.replace('-USDT', ''))
-                else:
-                    processed_coins.append(coin)
-            selected_coins = processed_coins
+            # 优先使用内存中的实时行情
+            feed_snapshot = self._get_feed_snapshot(selected_coins)
+            if feed_snapshot is not None:
+                return self._filter_configured_tickers(feed_snapshot, selected_coins)
             
             # 获取API配置
             api_config = self.config_service.get_decrypted_api_config()
@@ -61,75 +269,84 @@ class MarketService:
                 api_config['passphrase']
             )
             
-            # 获取所有行情数据
-            tickers_result = client.get_tickers('SPOT')
+            # 获取共享的全量行情快照并筛选配置的币种
+            try:
+                snapshot = self.ticker_snapshots.get(
+                    lambda: client._request('GET', 'market/tickers', params={'instType': 'SPOT'}, use_cache=False)
+                )
+            except TickerSnapshotError as e:
+                return self._snapshot_error(e)
+            return self._filter_configured_tickers(snapshot, selected_coins)
             
-            if tickers_result.get('code') != '0':
-                logger.error(f"获取行情数据失败: {tickers_result.get('msg', '未知错误')}")
-                return {"code": "ERROR", "msg": f"获取行情数据失败: {tickers_result.get('msg', '未知错误')}", "data": []}
+        except Exception as e:
+            logger.error(f"获取配置币种行情数据异常: {str(e)}")
+            return {"code": "ERROR", "msg": f"获取行情数据异常: {str(e)}", "data": []}
+    
+    def get_cached_configured_tickers(self) -> Optional[List[Dict]]:
+        """
+        只从内存（行情推送或共享快照）读取配置币种的行情，不请求交易所
+
+        Returns:
+            与 get_configured_coins_market_data 的 data 相同格式的列表；没有可用的内存行情时返回None
+        """
+        selected_coins = self.config_service.get_coin_config()
+        if not selected_coins:
+            return None
+        selected_coins = self._normalize_coins(selected_coins)
+        snapshot = self._get_feed_snapshot(selected_coins) or self.ticker_snapshots.peek()
+        if snapshot is None:
+            return None
+        return self._build_configured_items(snapshot, selected_coins)
+    
+    def get_configured_tickers_version(self) -> Optional[tuple]:
+        """
+        配置币种行情数据的版本（用于条件请求），无需请求交易所
+
+        Returns:
+            (币种, 行情推送时间戳或快照时间)；当前没有可用的内存行情时返回None
+        """
+        selected_coins = self.config_service.get_coin_config()
+        if not selected_coins:
+            return None
+        selected_coins = self._normalize_coins(selected_coins)
+        if self.ticker_feed:
+            found, missing = self.ticker_feed.get_tickers(f"{coin}-USDT" for coin in selected_coins)
+            if not missing:
+                return ("feed", tuple((inst_id, ticker.get('ts')) for inst_id, ticker in found.items()))
+        snapshot = self.ticker_snapshots.peek()
+        if snapshot is not None:
+            return ("snapshot", tuple(selected_coins), snapshot.fetched_at)
+        return None
+    
+    async def get_configured_coins_market_data_async(self) -> Dict:
+        """
+        获取配置币种的行情数据（asyncio版本）
+        
+        Returns:
+            包含行情数据的字典
+        """
+        try:
+            selected_coins = self.config_service.get_coin_config()
+            if not selected_coins:
+                return {"code": "ERROR", "msg": "未配置交易币种", "data": []}
+            selected_coins = self._normalize_coins(selected_coins)
             
-            # 筛选配置的币种
-            market_data = []
-            for ticker in tickers_result.get('data', []):
-                inst_id = ticker.get('instId', '')
-                
-                # 检查是否为配置的币种
-                for coin in selected_coins:
-                    if inst_id == f"{coin}-USDT":
-                        try:
-                            # 解析价格数据
-                            last_price = float(ticker.get('last', 0))
-                            open_24h = float(ticker.get('sodUtc0', 0))  # 24小时前开盘价
-                            volume_24h = float(ticker.get('volCcy24h', 0))
-                            high_24h = float(ticker.get('high24h', 0))
-                            low_24h = float(ticker.get('low24h', 0))
-                            
-                            # 计算24h涨跌幅
-                            change_24h_percent = 0
-                            if open_24h > 0:
-                                change_24h_percent = ((last_price - open_24h) / open_24h) * 100
-                            
-                            # 计算当日涨跌幅 (使用sodUtc8，北京时间8点开盘价)
-                            open_today = float(ticker.get('sodUtc8', open_24h))
-                            change_today_percent = 0
-                            if open_today > 0:
-                                change_today_percent = ((last_price - open_today) / open_today) * 100
-                            
-                            # 计算距24h最高的距离
-                            distance_from_high = 0
-                            if high_24h > 0:
-                                distance_from_high = ((last_price - high_24h) / high_24h) * 100
-                            
-                            # 计算距24h最低的距离
-                            distance_from_low = 0
-                            if low_24h > 0:
-                                distance_from_low = ((last_price - low_24h) / low_24h) * 100
-                            
-                            market_data.append({
-                                "symbol": inst_id,
-                                "currency": coin,
-                                "price": last_price,
-                                "change24h": round(change_24h_percent, 2),
-                                "changePercent24h": f"{change_24h_percent:+.2f}%",
-                                "changeDaily": round(change_today_percent, 2),
-                                "changePercentDaily": f"{change_today_percent:+.2f}%",
-                                "changeFromHigh": round(distance_from_high, 2),
-                                "changeFromHighPercent": f"{distance_from_high:+.2f}%",
-                                "changeFromLow": round(distance_from_low, 2),
-                                "changeFromLowPercent": f"{distance_from_low:+.2f}%",
-                                "volume24h": volume_24h,
-                                "high24h": high_24h,
-                                "low24h": low_24h,
-                                "timestamp": ticker.get('ts', '')
-                            })
-                            
-                        except (ValueError, TypeError) as e:
-                            logger.warning(f"解析 {inst_id} 行情数据失败: {e}")
-                            continue
-                        break
+            # 优先使用内存中的实时行情
+            feed_snapshot = self._get_feed_snapshot(selected_coins)
+            if feed_snapshot is not None:
+                return self._filter_configured_tickers(feed_snapshot, selected_coins)
             
-            logger.info(f"获取配置币种行情数据成功: {len(market_data)}个币种")
-            return {"code": "0", "msg": "success", "data": market_data}
+            client = await self._get_async_client()
+            if not client:
+                return {"code": "ERROR", "msg": "未配置API密钥", "data": []}
+            
+            try:
+                snapshot = await self.ticker_snapshots.get_async(
+                    lambda: client._request('GET', 'market/tickers', params={'instType': 'SPOT'}, use_cache=False)
+                )
+            except TickerSnapshotError as e:
+                return self._snapshot_error(e)
+            return self._filter_configured_tickers(snapshot, selected_coins)
             
         except Exception as e:
             logger.error(f"获取配置币种行情数据异常: {str(e)}")
@@ -160,69 +377,29 @@ class MarketService:
             
             # 获取单个币种行情
             ticker_result = client.get_ticker(symbol)
+            return self._parse_ticker_result(ticker_result, symbol)
             
-            if ticker_result.get('code') != '0':
-                logger.error(f"获取 {symbol} 行情失败: {ticker_result.get('msg', '未知错误')}")
-                return {"code": "ERROR", "msg": f"获取行情失败: {ticker_result.get('msg', '未知错误')}", "data": None}
-            
-            ticker_data = ticker_result.get('data', [])
-            if not ticker_data:
-                return {"code": "ERROR", "msg": "未找到行情数据", "data": None}
+        except Exception as e:
+            logger.error(f"获取 {symbol} 行情异常: {str(e)}")
+            return {"code": "ERROR", "msg": f"获取行情异常: {str(e)}", "data": None}
+    
+    async def get_ticker_info_async(self, symbol: str) -> Dict:
+        """
+        获取单个币种的行情信息（asyncio版本）
+        
+        Args:
+            symbol: 交易对符号，如 BTC-USDT
             
-            ticker = ticker_data[0]
+        Returns:
+            行情信息字典
+        """
+        try:
+            client = await self._get_async_client()
+            if not client:
+                return {"code": "ERROR", "msg": "未配置API密钥", "data": None}
             
-            # 解析行情数据
-            try:
-                last_price = float(ticker.get('last', 0))
-                open_24h = float(ticker.get('sodUtc0', 0))  # 24小时前开盘价
-                volume_24h = float(ticker.get('volCcy24h', 0))
-                high_24h = float(ticker.get('high24h', 0))
-                low_24h = float(ticker.get('low24h', 0))
-                
-                # 计算24h涨跌幅
-                change_24h_percent = 0
-                if open_24h > 0:
-                    change_24h_percent = ((last_price - open_24h) / open_24h) * 100
-                
-                # 计算当日涨跌幅 (使用sodUtc8，北京时间8点开盘价)
-                open_today = float(ticker.get('sodUtc8', open_24h))
-                change_today_percent = 0
-                if open_today > 0:
-                    change_today_percent = ((last_price - open_today) / open_today) * 100
-                
-                # 计算距24h最高的距离
-                distance_from_high = 0
-                if high_24h > 0:
-                    distance_from_high = ((last_price - high_24h) / high_24h) * 100
-                
-                # 计算距24h最低的距离
-                distance_from_low = 0
-                if low_24h > 0:
-                    distance_from_low = ((last_price - low_24h) / low_24h) * 100
-                
-                result = {
-                    "symbol": ticker.get('instId', symbol),
-                    "price": last_price,
-                    "change24h": round(change_24h_percent, 2),
-                    "changePercent24h": f"{change_24h_percent:+.2f}%",
-                    "changeDaily": round(change_today_percent, 2),
-                    "changePercentDaily": f"{change_today_percent:+.2f}%",
-                    "changeFromHigh": round(distance_from_high, 2),
-                    "changeFromHighPercent": f"{distance_from_high:+.2f}%",
-                    "changeFromLow": round(distance_from_low, 2),
-                    "changeFromLowPercent": f"{distance_from_low:+.2f}%",
-                    "volume24h": volume_24h,
-                    "high24h": high_24h,
-                    "low24h": low_24h,
-                    "timestamp": ticker.get('ts', '')
-                }
-                
-                logger.info(f"获取 {symbol} 行情成功")
-                return {"code": "0", "msg": "success", "data": result}
-                
-            except (ValueError, TypeError) as e:
-                logger.error(f"解析 {symbol} 行情数据失败: {e}")
-                return {"code": "ERROR", "msg": f"数据解析失败: {str(e)}", "data": None}
+            ticker_result = await client.get_ticker(symbol)
+            return self._parse_ticker_result(ticker_result, symbol)
             
         except Exception as e:
             logger.error(f"获取 {symbol} 行情异常: {str(e)}")
@@ -238,51 +415,29 @@ class MarketService:
         try:
             # 获取配置币种的行情数据
             market_data_result = self.get_configured_coins_market_data()
+            return self._summarize_market_data(market_data_result)
             
-            if market_data_result.get('code') != '0':
-                return {
-                    "totalCoins": 0,
-                    "gainers": 0,
-                    "losers": 0,
-                    "avgChange": 0,
-                    "totalVolume": 0,
-                    "error": market_data_result.get('msg', '获取数据失败')
-                }
-            
-            market_data = market_data_result.get('data', [])
-            
-            if not market_data:
-                return {
-                    "totalCoins": 0,
-                    "gainers": 0,
-                    "losers": 0,
-                    "avgChange": 0,
-                    "totalVolume": 0,
-                    "error": "无行情数据"
-                }
-            
-            # 统计市场数据
-            total_coins = len(market_data)
-            gainers = sum(1 for coin in market_data if coin.get('change24h', 0) > 0)
-            losers = sum(1 for coin in market_data if coin.get('change24h', 0) < 0)
-            
-            # 计算平均涨跌幅
-            total_change = sum(coin.get('change24h', 0) for coin in market_data)
-            avg_change = total_change / total_coins if total_coins > 0 else 0
-            
-            # 计算总交易量
-            total_volume = sum(coin.get('volume24h', 0) for coin in market_data)
-            
-            result = {
-                "totalCoins": total_coins,
-                "gainers": gainers,
-                "losers": losers,
-                "avgChange": round(avg_change, 2),
-                "totalVolume": round(total_volume, 2)
+        except Exception as e:
+            logger.error(f"获取市场概览异常: {str(e)}")
+            return {
+                "totalCoins": 0,
+                "gainers": 0,
+                "losers": 0,
+                "avgChange": 0,
+                "totalVolume": 0,
+                "error": f"获取市场概览异常: {str(e)}"
             }
-            
-            logger.info(f"获取市场概览成功: {result}")
-            return result
+    
+    async def get_market_summary_async(self) -> Dict:
+        """
+        获取市场概览数据（asyncio版本）
+        
+        Returns:
+            市场概览信息
+        """
+        try:
+            market_data_result = await self.get_configured_coins_market_data_async()
+            return self._summarize_market_data(market_data_result)
             
         except Exception as e:
             logger.error(f"获取市场概览异常: {str(e)}")
@@ -322,40 +477,32 @@ class MarketService:
             
             # 获取所有现货交易对
             instruments_result = client.get_instruments('SPOT')
+            return self._match_instruments(instruments_result, keyword, limit)
             
-            if instruments_result.get('code') != '0':
-                logger.error(f"获取交易对列表失败: {instruments_result.get('msg', '未知错误')}")
-                return []
-            
-            instruments = instruments_result.get('data', [])
-            
-            # 搜索匹配的币种
-            keyword_upper = keyword.upper()
-            matched_coins = []
+        except Exception as e:
+            logger.error(f"搜索币种异常: {str(e)}")
+            return []
+    
+    async def search_coins_async(self, keyword: str, limit: int = 20) -> List[Dict]:
+        """
+        搜索币种（asyncio版本）
+        
+        Args:
+            keyword: 搜索关键词
+            limit: 返回数量限制
             
-            for instrument in instruments:
-                inst_id = instrument.get('instId', '')
-                base_ccy = instrument.get('baseCcy', '')
-                quote_ccy = instrument.get('quoteCcy', '')
-                
-                # 只搜索USDT交易对
-                if quote_ccy == 'USDT' and (
-                    keyword_upper in base_ccy or 
-                    keyword_upper in inst_id
-                ):
-                    matched_coins.append({
-                        "symbol": inst_id,
-                        "baseCurrency": base_ccy,
-                        "quoteCurrency": quote_ccy,
-                        "status": instrument.get('state', 'unknown')
-                    })
-                    
-                    if len(matched_coins) >= limit:
-                        break
+        Returns:
+            匹配的币种列表
+        """
+        try:
+            client = await self._get_async_client()
+            if not client:
+                logger.warning("未配置API密钥，无法搜索币种")
+                return []
             
-            logger.info(f"搜索币种 '{keyword}' 找到 {len(matched_coins)} 个结果")
-            return matched_coins
+            instruments_result = await client.get_instruments('SPOT')
+            return self._match_instruments(instruments_result, keyword, limit)
             
         except Exception as e:
             logger.error(f"搜索币种异常: {str(e)}")
-            return []
\ No newline at end of file
+            return []
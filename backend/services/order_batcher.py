@@ -0,0 +1,139 @@
+"""
+批量下单服务
+同一时刻触发的定投任务在执行引擎中并发运行，各自调用 place_order 时先进入一个很短的收集窗口，
+窗口结束后按客户端分组、每20笔合并为一次 trade/batch-orders 请求，
+再把每笔订单的结果拆回与单笔下单相同的响应结构交还给各自的任务写入交易记录
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# OKX 批量下单接口单次最多20笔
+MAX_BATCH_ORDERS = 20
+
+
+class OrderBatcher:
+    """批量下单服务类"""
+
+    def __init__(self, window: Optional[float] = None):
+        """
+        初始化批量下单服务
+
+        Args:
+            window: 收集窗口（秒），默认读取 DCA_ORDER_BATCH_WINDOW 环境变量，未设置时为0.2；
+                    设为0时每笔订单直接单独下单
+        """
+        if window is None:
+            window = float(os.getenv('DCA_ORDER_BATCH_WINDOW', '0.2'))
+        self.window = window
+        self._lock = threading.Lock()
+        self._pending: List = []  # [(客户端, 订单, Future)]
+        self._stats = {"orders": 0, "single_requests": 0, "batch_requests": 0, "batch_failures": 0}
+
+    def place_order(self, client, symbol: str, side: str, order_type: str, size: str,
+                    price: Optional[str] = None) -> Dict:
+        """
+        下单，阻塞直到本笔订单所在的批次返回
+
+        Returns:
+            与 client.place_order 相同结构的响应
+        """
+        order = {
+            "symbol": symbol,
+            "side": side,
+            "order_type": order_type,
+            "size": size,
+            "price": price,
+            "client_order_id": f"dca{uuid.uuid4().hex[:24]}"
+        }
+        if self.window <= 0:
+            return self._place_single(client, order)
+
+        future: Future = Future()
+        with self._lock:
+            self._pending.append((client, order, future))
+            self._stats["orders"] += 1
+            # 窗口内的第一笔订单负责在窗口结束后提交整批
+            is_leader = len(self._pending) == 1
+
+        if is_leader:
+            time.sleep(self.window)
+            with self._lock:
+                pending, self._pending = self._pending, []
+            self._flush(pending)
+        return future.result()
+
+    def _place_single(self, client, order: Dict) -> Dict:
+        with self._lock:
+            self._stats["single_requests"] += 1
+        return client.place_order(
+            symbol=order["symbol"],
+            side=order["side"],
+            order_type=order["order_type"],
+            size=order["size"],
+            price=order["price"]
+        )
+
+    def _flush(self, pending: List) -> None:
+        """按客户端分组提交，并把结果分发给各笔订单"""
+        groups: Dict[int, List] = {}
+        for item in pending:
+            groups.setdefault(id(item[0]), []).append(item)
+
+        for items in groups.values():
+            for start in range(0, len(items), MAX_BATCH_ORDERS):
+                chunk = items[start:start + MAX_BATCH_ORDERS]
+                try:
+                    if len(chunk) == 1:
+                        client, order, future = chunk[0]
+                        future.set_result(self._place_single(client, order))
+                    else:
+                        self._submit_batch(chunk)
+                except Exception as e:
+                    logger.exception(f"批量下单异常: {str(e)}")
+                    for _, _, future in chunk:
+                        if not future.done():
+                            future.set_result({"code": "ERROR", "msg": f"批量下单异常: {str(e)}", "data": []})
+
+    def _submit_batch(self, chunk: List) -> None:
+        client = chunk[0][0]
+        with self._lock:
+            self._stats["batch_requests"] += 1
+        result = client.place_orders_batch([order for _, order, _ in chunk])
+        logger.info(f"批量下单 {len(chunk)} 笔: code={result.get('code')}")
+
+        # 按 clOrdId 匹配每笔订单的结果，缺失时按请求顺序对应
+        data = result.get('data') or []
+        by_client_id = {item.get('clOrdId'): item for item in data if isinstance(item, dict) and item.get('clOrdId')}
+        if not data:
+            with self._lock:
+                self._stats["batch_failures"] += 1
+
+        for index, (_, order, future) in enumerate(chunk):
+            item = by_client_id.get(order["client_order_id"])
+            if item is None and index < len(data) and isinstance(data[index], dict):
+                item = data[index]
+            if item is None:
+                # 整批请求失败（签名错误、网络异常等），每笔订单返回外层错误
+                future.set_result({"code": result.get('code') or "ERROR", "msg": result.get('msg', ''), "data": []})
+                continue
+            success = item.get('sCode') == '0'
+            future.set_result({
+                "code": "0" if success else "1",
+                "msg": "" if success else item.get('sMsg', ''),
+                "data": [item]
+            })
+
+    def get_stats(self) -> Dict:
+        """获取批量下单统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending)
+        stats["window"] = self.window
+        return stats
@@ -0,0 +1,170 @@
+"""
+持仓台账服务
+在写入成功交易的同一个数据库事务中增量更新按币种汇总的持仓，
+资产概览只需读取台账，成本取决于持仓币种数量而不是历史交易条数
+"""
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models import PositionLedger, Transaction
+
+logger = logging.getLogger(__name__)
+
+
+def transaction_position_delta(tx: Transaction) -> Tuple[float, float, float]:
+    """
+    计算单条成功交易对持仓的影响
+
+    优先使用成交列 fill_sz/fill_amt；成交数量缺失时只计入投入金额，
+    成交金额缺失时使用订单金额
+
+    Returns:
+        (买入数量, 卖出数量, 投入金额变化)
+    """
+    if tx.direction not in ("buy", "sell"):
+        return 0.0, 0.0, 0.0
+    sign = 1 if tx.direction == "buy" else -1
+    amount = tx.amount or 0
+
+    if tx.fill_sz is None:
+        return 0.0, 0.0, sign * amount
+
+    fill_amount = tx.fill_amt if tx.fill_amt is not None else amount
+    if sign > 0:
+        return tx.fill_sz, 0.0, fill_amount
+    return 0.0, tx.fill_sz, -fill_amount
+
+
+class PositionService:
+    """持仓台账服务类"""
+
+    def __init__(self, session_local):
+        """
+        初始化持仓台账服务
+
+        Args:
+            session_local: SQLAlchemy会话工厂
+        """
+        self.SessionLocal = session_local
+        # 补录未入账交易时串行化，避免并发读取重复入账
+        self._catch_up_lock = threading.Lock()
+
+    @staticmethod
+    def apply_transaction(db: Session, tx: Transaction) -> None:
+        """
+        将一条交易计入台账（不提交，由调用方与交易记录在同一事务中提交）
+
+        调用前需要 flush 以获得交易ID；ID不大于台账水位的交易会被忽略，保证幂等
+        """
+        if tx.status != "success" or not tx.symbol:
+            return
+
+        symbol = tx.symbol.split('-')[0]
+        row = db.get(PositionLedger, symbol)
+        if row is None:
+            row = PositionLedger(symbol=symbol, bought_qty=0, sold_qty=0, net_investment=0, last_tx_id=0)
+            db.add(row)
+            db.flush()  # 会话未开启autoflush，写入后同一事务内的后续查找才能命中
+        elif tx.id <= (row.last_tx_id or 0):
+            return
+
+        bought, sold, investment = transaction_position_delta(tx)
+        row.bought_qty = (row.bought_qty or 0) + bought
+        row.sold_qty = (row.sold_qty or 0) + sold
+        row.net_investment = (row.net_investment or 0) + investment
+        row.last_tx_id = tx.id
+
+    @staticmethod
+    def adjust_transaction(db: Session, tx: Transaction, previous_delta: Tuple[float, float, float]) -> None:
+        """
+        交易成交信息更新后修正台账（不提交）
+
+        Args:
+            previous_delta: 更新前 transaction_position_delta(tx) 的结果
+
+        交易尚未计入台账时不做处理，补录时会按最新的成交信息计入
+        """
+        if tx.status != "success" or not tx.symbol:
+            return
+        row = db.get(PositionLedger, tx.symbol.split('-')[0])
+        if row is None or tx.id > (row.last_tx_id or 0):
+            return
+
+        bought, sold, investment = transaction_position_delta(tx)
+        row.bought_qty = (row.bought_qty or 0) + bought - previous_delta[0]
+        row.sold_qty = (row.sold_qty or 0) + sold - previous_delta[1]
+        row.net_investment = (row.net_investment or 0) + investment - previous_delta[2]
+
+    def _catch_up(self, db: Session) -> int:
+        """补录水位之后尚未入账的成功交易（如旧版本写入或首次启用台账时）"""
+        with self._catch_up_lock:
+            watermark = db.query(func.max(PositionLedger.last_tx_id)).scalar() or 0
+            pending = (
+                db.query(Transaction)
+                .filter(Transaction.id > watermark, Transaction.status == "success")
+                .order_by(Transaction.id)
+                .all()
+            )
+            if not pending:
+                return 0
+            for tx in pending:
+                self.apply_transaction(db, tx)
+            db.commit()
+            logger.info(f"持仓台账补录 {len(pending)} 条交易")
+            return len(pending)
+
+    def get_positions(self, db: Session) -> Optional[Tuple[Dict[str, float], float]]:
+        """
+        读取持仓台账
+
+        Returns:
+            (净持仓映射 {币种: 数量}, 总投入)；没有成功交易时返回 None
+        """
+        self._catch_up(db)
+        rows = db.query(PositionLedger).all()
+        if not rows:
+            return None
+
+        net_balances = {}
+        total_investment = 0
+        for row in rows:
+            total_investment += row.net_investment or 0
+            net_balance = (row.bought_qty or 0) - (row.sold_qty or 0)
+            if net_balance > 0:
+                net_balances[row.symbol] = net_balance
+        return net_balances, total_investment
+
+    def rebuild(self) -> Dict:
+        """
+        清空台账并根据全部成功交易重新计算
+
+        Returns:
+            重建结果统计
+        """
+        db = self.SessionLocal()
+        try:
+            with self._catch_up_lock:
+                db.query(PositionLedger).delete()
+                count = 0
+                query = (
+                    db.query(Transaction)
+                    .filter(Transaction.status == "success")
+                    .order_by(Transaction.id)
+                    .yield_per(1000)
+                )
+                for tx in query:
+                    self.apply_transaction(db, tx)
+                    count += 1
+                    if count % 1000 == 0:
+                        db.flush()
+                db.commit()
+                symbols = db.query(PositionLedger).count()
+            logger.info(f"持仓台账重建完成: {count} 条交易, {symbols} 个币种")
+            return {"transactions": count, "symbols": symbols}
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
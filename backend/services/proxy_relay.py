@@ -0,0 +1,175 @@
+"""
+代理转发服务（运行在服务器上，为本地环境的代理客户端转发OKX请求）
+- 按凭证指纹复用已预热的直连客户端（连接池），不再每次转发都新建客户端
+- 不需要鉴权的行情/公共数据在所有调用方之间共享短时缓存
+- 会话令牌：调用方先用凭证换取令牌，之后只携带令牌。令牌是用会话专用密钥（与数据库凭证的密钥分开）
+  加密的凭证和签发时间，不在服务器上保存状态，多个工作进程和重启后都能解析
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from okx_api import MAX_BATCH_CALLS, batch_error
+from utils.cache import shared_caches
+
+logger = logging.getLogger(__name__)
+
+# 会话令牌有效期（秒），默认读取 RELAY_SESSION_TTL 环境变量
+SESSION_TTL = int(os.getenv("RELAY_SESSION_TTL", "3600"))
+
+# 令牌无效或过期时返回的错误码，代理客户端收到后重新换取令牌
+SESSION_EXPIRED = "SESSION_EXPIRED"
+
+# 会话令牌载荷的类型标记，解析时校验，其他用途加密的数据不会被当作会话令牌接受
+SESSION_TOKEN_TYPE = "relay_session"
+
+# 可在调用方之间共享的公共接口（只有GET）及缓存时长（秒）
+PUBLIC_ENDPOINT_TTLS = {
+    "market/ticker": 2,
+    "market/tickers": 2,
+    "market/index-tickers": 2,
+    "market/books": 1,
+    "market/candles": 10,
+    "market/history-candles": 60,
+    "public/instruments": 300,
+    "public/time": 1,
+}
+
+Credentials = Tuple[str, str, str]
+
+
+def _is_success(result: Dict[str, Any]) -> bool:
+    return isinstance(result, dict) and result.get("code") == "0"
+
+
+class SessionError(Exception):
+    """会话令牌无效或已过期"""
+
+
+class ProxyRelay:
+    """代理转发服务类"""
+
+    def __init__(self, client_provider: Callable[[str, str, str], Any],
+                 async_client_provider: Callable[[str, str, str], Any],
+                 fernet_provider: Callable[[], Fernet], session_ttl: int = SESSION_TTL):
+        """
+        初始化代理转发服务
+
+        Args:
+            client_provider: 按凭证返回（复用的）直连客户端
+            async_client_provider: 按凭证返回（复用的）asyncio版直连客户端
+            fernet_provider: 返回加密令牌使用的 Fernet 实例（会话专用密钥）
+            session_ttl: 会话令牌有效期（秒）
+        """
+        self.client_provider = client_provider
+        self.async_client_provider = async_client_provider
+        self.fernet_provider = fernet_provider
+        self.session_ttl = session_ttl
+        self.public_cache = shared_caches.region("relay_public", ttl=2, max_size=512)
+        self._lock = threading.Lock()
+        self._stats = {"forwarded": 0, "public_forwarded": 0, "batches": 0, "sessions_opened": 0,
+                       "session_rejected": 0}
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+
+    def open_session(self, api_key: str, secret_key: str, passphrase: str) -> Dict[str, Any]:
+        """用凭证换取会话令牌"""
+        if not all([api_key, secret_key, passphrase]):
+            return {"code": "ERROR", "msg": "缺少必要参数"}
+        payload = json.dumps({"typ": SESSION_TOKEN_TYPE, "cred": [api_key, secret_key, passphrase]}).encode("utf-8")
+        token = self.fernet_provider().encrypt(payload).decode("ascii")
+        self._count("sessions_opened")
+        return {"code": "0", "msg": "", "data": {"token": token, "expires_in": self.session_ttl}}
+
+    def resolve_credentials(self, request_data: Dict[str, Any]) -> Optional[Credentials]:
+        """
+        从请求中取出凭证：携带 token 时解析令牌，否则读取明文凭证（兼容旧客户端）
+
+        Raises:
+            SessionError: 令牌无效或已过期
+        """
+        token = request_data.get("token")
+        if token:
+            try:
+                payload = json.loads(self.fernet_provider().decrypt(token.encode("ascii"), ttl=self.session_ttl))
+                if payload.get("typ") != SESSION_TOKEN_TYPE:
+                    raise ValueError("令牌类型不匹配")
+                api_key, secret_key, passphrase = payload["cred"]
+            except (InvalidToken, ValueError, TypeError, KeyError, AttributeError, UnicodeEncodeError):
+                self._count("session_rejected")
+                raise SessionError("会话令牌无效或已过期")
+            return api_key, secret_key, passphrase
+        credentials = (request_data.get("api_key"), request_data.get("secret_key"), request_data.get("passphrase"))
+        return credentials if all(credentials) else None
+
+    def _public_ttl(self, method: str, endpoint: str) -> Optional[float]:
+        return PUBLIC_ENDPOINT_TTLS.get(endpoint.lstrip("/")) if method == "GET" else None
+
+    @staticmethod
+    def _public_key(endpoint: str, params: Optional[Dict]) -> Tuple:
+        return endpoint.lstrip("/"), tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+
+    def forward(self, credentials: Credentials, method: str, endpoint: str,
+                params: Optional[Dict] = None, data: Optional[Dict] = None) -> Dict[str, Any]:
+        """
+        转发单个请求
+
+        私有接口不使用客户端自带的响应缓存（下单后查询订单、余额需要实时结果），
+        公共接口使用跨调用方共享的短时缓存
+        """
+        self._count("forwarded")
+        client = self.client_provider(*credentials)
+        ttl = self._public_ttl(method, endpoint)
+        if ttl is None:
+            return client._request(method, endpoint, params, data, use_cache=False)
+        self._count("public_forwarded")
+        return self.public_cache.get_or_compute(
+            self._public_key(endpoint, params),
+            lambda: client._request(method, endpoint, params, data, use_cache=False),
+            ttl=ttl, should_cache=_is_success
+        )
+
+    async def forward_async(self, credentials: Credentials, method: str, endpoint: str,
+                            params: Optional[Dict] = None, data: Optional[Dict] = None) -> Dict[str, Any]:
+        """forward 的 asyncio 版本"""
+        self._count("forwarded")
+        client = self.async_client_provider(*credentials)
+        ttl = self._public_ttl(method, endpoint)
+        if ttl is None:
+            return await client._request(method, endpoint, params, data, use_cache=False)
+        self._count("public_forwarded")
+        return await self.public_cache.get_or_compute_async(
+            self._public_key(endpoint, params),
+            lambda: client._request(method, endpoint, params, data, use_cache=False),
+            ttl=ttl, should_cache=_is_success
+        )
+
+    async def forward_batch(self, credentials: Credentials, calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """并发转发多个请求，结果顺序与 calls 一致，单个子请求失败不影响其他子请求"""
+        if len(calls) > MAX_BATCH_CALLS:
+            return {"code": "ERROR", "msg": f"单次最多 {MAX_BATCH_CALLS} 个子请求"}
+        if not all(isinstance(call, dict) and call.get("method") and call.get("endpoint") for call in calls):
+            return {"code": "ERROR", "msg": "子请求缺少 method 或 endpoint"}
+        self._count("batches")
+        results = await asyncio.gather(
+            *(self.forward_async(credentials, call["method"], call["endpoint"],
+                                 call.get("params") or None, call.get("data") or None)
+              for call in calls),
+            return_exceptions=True
+        )
+        return {"code": "0", "msg": "", "data": [
+            batch_error(f"Request failed: {str(result)}") if isinstance(result, Exception) else result
+            for result in results
+        ]}
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        return {"session_ttl": self.session_ttl, "public_cache": self.public_cache.get_stats(), **stats}
@@ -0,0 +1,164 @@
+"""
+调度状态存储服务
+将调度器中每个任务的调度参数、参数摘要、下次/上次触发时间保存在 scheduler_state 表中；
+启动时直接用这些记录重建调度堆，只有定义在上次保存之后被修改过的任务才需要重新计算
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import DCAPlan, SchedulerState
+
+logger = logging.getLogger(__name__)
+
+
+def spec_hash(spec) -> str:
+    """计算调度参数摘要"""
+    raw = json.dumps(list(spec), separators=(',', ':'))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def _to_utc_datetime(timestamp: Optional[float]) -> Optional[datetime]:
+    """时间戳转换为不带时区的UTC时间（与其他表的 utcnow 一致）"""
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+def _to_timestamp(value: Optional[datetime]) -> Optional[float]:
+    if value is None:
+        return None
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+class SchedulerStateStore:
+    """调度状态存储服务类"""
+
+    def __init__(self, session_local):
+        """
+        初始化调度状态存储服务
+
+        Args:
+            session_local: SQLAlchemy会话工厂
+        """
+        self.SessionLocal = session_local
+
+    def load_all(self) -> List[Dict]:
+        """
+        读取全部调度状态
+
+        Returns:
+            [{plan_id, spec, plan_hash, next_fire_ts, last_fire_ts}]，调度参数无法解析的记录会被跳过
+        """
+        db = self.SessionLocal()
+        try:
+            rows = db.query(
+                SchedulerState.plan_id, SchedulerState.spec, SchedulerState.plan_hash,
+                SchedulerState.next_fire_at, SchedulerState.last_fire_at
+            ).all()
+        finally:
+            db.close()
+
+        records = []
+        for row in rows:
+            try:
+                spec = tuple(tuple(item) if isinstance(item, list) else item for item in json.loads(row.spec))
+            except (json.JSONDecodeError, TypeError):
+                logger.warning(f"任务 {row.plan_id} 调度状态无法解析，将重新计算")
+                continue
+            records.append({
+                "plan_id": row.plan_id,
+                "spec": spec,
+                "plan_hash": row.plan_hash,
+                "next_fire_ts": _to_timestamp(row.next_fire_at),
+                "last_fire_ts": _to_timestamp(row.last_fire_at)
+            })
+        return records
+
+    def find_changes(self) -> Tuple[List[DCAPlan], List[int]]:
+        """
+        查找需要重新计算的任务
+
+        Returns:
+            (启用中且没有调度状态或在状态保存后被修改过的任务, 已删除或已禁用任务的ID列表)
+        """
+        db = self.SessionLocal()
+        try:
+            changed = (
+                db.query(DCAPlan)
+                .outerjoin(SchedulerState, SchedulerState.plan_id == DCAPlan.id)
+                .filter(
+                    DCAPlan.status == "enabled",
+                    or_(SchedulerState.plan_id.is_(None), DCAPlan.updated_at > SchedulerState.updated_at)
+                )
+                .all()
+            )
+            stale = [
+                row.plan_id for row in
+                db.query(SchedulerState.plan_id)
+                .outerjoin(DCAPlan, DCAPlan.id == SchedulerState.plan_id)
+                .filter(or_(DCAPlan.id.is_(None), DCAPlan.status != "enabled"))
+                .all()
+            ]
+            db.expunge_all()
+            return changed, stale
+        finally:
+            db.close()
+
+    def save(self, records: Iterable[Dict]) -> None:
+        """
+        批量写入调度状态
+
+        Args:
+            records: [{plan_id, spec, next_fire_ts, last_fire_ts(可选)}]，未提供 last_fire_ts 时保留原值
+        """
+        records = list(records)
+        if not records:
+            return
+        now = datetime.utcnow()
+        # 按是否包含 last_fire_at 分组，每组一次 executemany
+        groups: Dict[bool, List[Dict]] = {}
+        for record in records:
+            values = {
+                "plan_id": record["plan_id"],
+                "plan_hash": spec_hash(record["spec"]),
+                "spec": json.dumps(list(record["spec"])),
+                "next_fire_at": _to_utc_datetime(record["next_fire_ts"]),
+                "updated_at": now
+            }
+            if "last_fire_ts" in record:
+                values["last_fire_at"] = _to_utc_datetime(record["last_fire_ts"])
+            groups.setdefault("last_fire_at" in values, []).append(values)
+
+        db = self.SessionLocal()
+        try:
+            for rows in groups.values():
+                statement = sqlite_insert(SchedulerState)
+                statement = statement.on_conflict_do_update(
+                    index_elements=[SchedulerState.plan_id],
+                    set_={key: statement.excluded[key] for key in rows[0] if key != "plan_id"}
+                )
+                db.execute(statement, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def delete(self, plan_ids: Iterable[int]) -> None:
+        """删除调度状态"""
+        plan_ids = list(plan_ids)
+        if not plan_ids:
+            return
+        db = self.SessionLocal()
+        try:
+            db.query(SchedulerState).filter(SchedulerState.plan_id.in_(plan_ids)).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
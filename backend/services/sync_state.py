@@ -0,0 +1,71 @@
+"""
+同步版本服务
+多工作进程部署时，各进程的内存状态（调度堆、配置快照、对账队列）需要感知其他进程写入的修改：
+写入方递增 sync_state 表中对应的版本号，各进程在主进程选举心跳中比较版本号，变化时刷新本地状态
+"""
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+PLAN_VERSION = "plan_version"  # 定投任务被非主进程修改
+CONFIG_VERSION = "config_version"  # API/币种配置被修改
+FILL_VERSION = "fill_version"  # 非主进程写入了待对账的交易
+TRANSACTION_VERSION = "transaction_version"  # 交易记录或成交信息被写入，各进程的资产缓存需要失效
+
+
+class SyncStateService:
+    """同步版本服务类"""
+
+    def __init__(self, engine):
+        """
+        初始化同步版本服务
+
+        Args:
+            engine: SQLAlchemy引擎
+        """
+        self.engine = engine
+        self._lock = threading.Lock()
+        self._seen: Dict[str, int] = {}
+        self._initialized = False
+
+    def bump(self, name: str) -> int:
+        """递增版本号，返回新版本"""
+        with self.engine.begin() as connection:
+            connection.execute(
+                text(
+                    "INSERT INTO sync_state (name, version, updated_at) VALUES (:name, 1, :now) "
+                    "ON CONFLICT(name) DO UPDATE SET version = version + 1, updated_at = :now"
+                ),
+                {"name": name, "now": datetime.utcnow()}
+            )
+            return connection.execute(
+                text("SELECT version FROM sync_state WHERE name = :name"), {"name": name}
+            ).scalar()
+
+    def get_versions(self) -> Dict[str, int]:
+        """读取全部版本号"""
+        with self.engine.connect() as connection:
+            rows = connection.execute(text("SELECT name, version FROM sync_state")).all()
+        return {row.name: row.version for row in rows}
+
+    def poll_changes(self) -> List[str]:
+        """
+        返回自上次调用以来有变化的版本名称（包括本进程自己的修改，重复刷新没有副作用）
+
+        首次调用只记录当前版本，不报告变化（启动时本地状态本来就是最新的）
+        """
+        versions = self.get_versions()
+        with self._lock:
+            changed = []
+            if self._initialized:
+                for name, version in versions.items():
+                    if version != self._seen.get(name):
+                        changed.append(name)
+            self._seen = versions
+            self._initialized = True
+        return changed
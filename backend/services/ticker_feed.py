@@ -0,0 +1,297 @@
+"""
+行情推送服务
+通过OKX公共WebSocket频道订阅关注币种的实时行情，在内存中维护最新价格表；
+WebSocket不可用时回退为REST轮询，读取方无需发起任何网络请求
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WS_URL = "wss://ws.okx.com:8443/ws/v5/public"
+
+
+class TickerFeed:
+    """行情推送服务类"""
+
+    def __init__(self, rest_fetcher: Optional[Callable[[], Dict]] = None, ws_url: Optional[str] = None,
+                 poll_interval: float = 10, stale_after: float = 60, ping_interval: float = 20):
+        """
+        初始化行情推送服务
+
+        Args:
+            rest_fetcher: REST回退函数，返回与 get_tickers 相同结构的响应
+            ws_url: 公共频道地址，默认读取 OKX_WS_PUBLIC_URL 环境变量（便于指向本地测试服务）
+            poll_interval: REST轮询间隔（秒）
+            stale_after: 行情超过该时长未更新即视为过期（秒）
+            ping_interval: WebSocket心跳间隔（秒），OKX在30秒无消息后会断开连接
+        """
+        self.rest_fetcher = rest_fetcher
+        self.ws_url = ws_url or os.getenv('OKX_WS_PUBLIC_URL', DEFAULT_WS_URL)
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.ping_interval = ping_interval
+
+        self._prices: Dict[str, Tuple[Dict, float]] = {}  # {instId: (ticker, 接收时间)}
+        self._lock = threading.Lock()
+        self._symbols: frozenset = frozenset()
+        self._rejected: frozenset = frozenset()  # 本次连接中被OKX拒绝订阅的交易对
+
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self._symbols_changed: Optional[asyncio.Event] = None
+        self._started = threading.Event()
+
+        self.mode = "stopped"  # stopped, websocket, rest
+        self._stats = {"ws_messages": 0, "ws_connects": 0, "ws_failures": 0, "ws_subscribe_errors": 0,
+                       "rest_polls": 0, "rest_failures": 0}
+
+    # ------------------------------------------------------------------
+    # 读取接口（任意线程调用，不产生网络请求）
+    # ------------------------------------------------------------------
+    def get_ticker(self, inst_id: str) -> Optional[Dict]:
+        """获取单个交易对的最新行情，过期或不存在时返回None"""
+        with self._lock:
+            entry = self._prices.get(inst_id)
+        if entry and time.time() - entry[1] < self.stale_after:
+            return entry[0]
+        return None
+
+    def get_tickers(self, inst_ids: Iterable[str]) -> Tuple[Dict[str, Dict], List[str]]:
+        """
+        批量获取最新行情
+
+        Returns:
+            (命中的行情 {instId: ticker}, 缺失或过期的instId列表)
+        """
+        now = time.time()
+        found, missing = {}, []
+        with self._lock:
+            for inst_id in inst_ids:
+                entry = self._prices.get(inst_id)
+                if entry and now - entry[1] < self.stale_after:
+                    found[inst_id] = entry[0]
+                else:
+                    missing.append(inst_id)
+        return found, missing
+
+    def get_stats(self) -> Dict:
+        """获取运行状态"""
+        now = time.time()
+        with self._lock:
+            fresh = sum(1 for _, received in self._prices.values() if now - received < self.stale_after)
+            total = len(self._prices)
+        return {
+            "mode": self.mode,
+            "ws_url": self.ws_url,
+            "symbols": sorted(self._symbols),
+            "rejected": sorted(self._rejected),
+            "cached": total,
+            "fresh": fresh,
+            **self._stats
+        }
+
+    # ------------------------------------------------------------------
+    # 控制接口
+    # ------------------------------------------------------------------
+    def set_symbols(self, symbols: Iterable[str]) -> None:
+        """设置需要订阅的交易对（如 BTC-USDT），变化时自动重新订阅"""
+        symbols = frozenset(s for s in symbols if s)
+        if symbols == self._symbols:
+            return
+        self._symbols = symbols
+
+        # 清理不再关注的交易对
+        with self._lock:
+            for inst_id in list(self._prices.keys()):
+                if inst_id not in symbols:
+                    del self._prices[inst_id]
+
+        logger.info(f"行情订阅列表更新: {len(symbols)}个交易对")
+        if self._loop is not None and self._symbols_changed is not None:
+            self._loop.call_soon_threadsafe(self._symbols_changed.set)
+
+    def start(self) -> None:
+        """在后台线程中启动行情推送"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._started.clear()
+        self._thread = threading.Thread(target=self._thread_main, name="ticker-feed", daemon=True)
+        self._thread.start()
+        self._started.wait(timeout=5)
+
+    def stop(self, timeout: float = 5) -> None:
+        """停止行情推送"""
+        if self._loop is not None and self._stop_event is not None:
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+        if self._thread:
+            self._thread.join(timeout=timeout)
+        self._thread = None
+        self.mode = "stopped"
+
+    # ------------------------------------------------------------------
+    # 内部实现
+    # ------------------------------------------------------------------
+    def _update(self, tickers: Iterable[Dict]) -> int:
+        """写入行情表，只保留关注的交易对"""
+        now = time.time()
+        symbols = self._symbols
+        count = 0
+        with self._lock:
+            for ticker in tickers:
+                inst_id = ticker.get('instId')
+                if inst_id in symbols:
+                    self._prices[inst_id] = (ticker, now)
+                    count += 1
+        return count
+
+    def _thread_main(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._stop_event = asyncio.Event()
+        self._symbols_changed = asyncio.Event()
+        self._started.set()
+        try:
+            self._loop.run_until_complete(self._run())
+        except Exception as e:
+            logger.exception(f"行情推送线程异常退出: {str(e)}")
+        finally:
+            self._loop.close()
+            self._loop = None
+
+    async def _run(self) -> None:
+        """主循环：优先使用WebSocket，失败时REST轮询并定期重连"""
+        backoff = 1
+        while not self._stop_event.is_set():
+            if not self._symbols:
+                self.mode = "idle"
+                await self._wait(self.poll_interval, self._symbols_changed)
+                continue
+
+            try:
+                await self._run_websocket()
+                backoff = 1
+            except Exception as e:
+                self._stats["ws_failures"] += 1
+                logger.warning(f"行情WebSocket不可用，回退REST轮询: {str(e)}")
+
+            if self._stop_event.is_set():
+                break
+
+            # WebSocket断开期间使用REST轮询，直到重连时间到达
+            self.mode = "rest"
+            deadline = time.monotonic() + backoff
+            while not self._stop_event.is_set():
+                await self._poll_rest()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                await self._wait(min(self.poll_interval, remaining))
+            backoff = min(backoff * 2, 60)
+
+    async def _wait(self, seconds: float, extra_event: Optional[asyncio.Event] = None) -> None:
+        """等待指定时长，停止或额外事件触发时提前返回"""
+        waiters = [asyncio.ensure_future(self._stop_event.wait())]
+        if extra_event is not None:
+            waiters.append(asyncio.ensure_future(extra_event.wait()))
+        try:
+            await asyncio.wait(waiters, timeout=seconds, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+        if extra_event is not None:
+            extra_event.clear()
+
+    async def _poll_rest(self) -> None:
+        """通过REST接口拉取一次行情"""
+        if not self.rest_fetcher:
+            return
+        try:
+            result = await asyncio.to_thread(self.rest_fetcher)
+            if result.get('code') == '0':
+                self._update(result.get('data', []))
+                self._stats["rest_polls"] += 1
+            else:
+                self._stats["rest_failures"] += 1
+                logger.warning(f"REST轮询行情失败: {result.get('msg', '未知错误')}")
+        except Exception as e:
+            self._stats["rest_failures"] += 1
+            logger.warning(f"REST轮询行情异常: {str(e)}")
+
+    @staticmethod
+    def _subscribe_message(op: str, symbols: Iterable[str]) -> str:
+        return json.dumps({
+            "op": op,
+            "args": [{"channel": "tickers", "instId": inst_id} for inst_id in sorted(symbols)]
+        })
+
+    @staticmethod
+    def _error_symbol(message: Dict, subscribed: Iterable[str]) -> Optional[str]:
+        """从订阅错误消息中找出被拒绝的交易对：优先读取 arg，否则在错误描述中查找已订阅的交易对"""
+        inst_id = (message.get("arg") or {}).get("instId")
+        if inst_id:
+            return inst_id
+        text = str(message.get("msg", ""))
+        matches = [inst_id for inst_id in subscribed if inst_id in text]
+        return max(matches, key=len) if matches else None
+
+    async def _run_websocket(self) -> None:
+        """连接公共频道并持续接收推送，正常停止时返回，连接异常时抛出"""
+        import websockets
+
+        async with websockets.connect(self.ws_url, ping_interval=None, open_timeout=10) as ws:
+            self._stats["ws_connects"] += 1
+            self._rejected = frozenset()
+            subscribed = frozenset(self._symbols)
+            await ws.send(self._subscribe_message("subscribe", subscribed))
+            self.mode = "websocket"
+            logger.info(f"行情WebSocket已连接: {self.ws_url}, 订阅 {len(subscribed)} 个交易对")
+
+            last_message = time.monotonic()
+            while not self._stop_event.is_set():
+                # 订阅列表变化时增量订阅/退订
+                if self._symbols_changed.is_set():
+                    self._symbols_changed.clear()
+                    # 被拒绝的交易对不再重复订阅，移出关注列表后再次加入时才会重试
+                    self._rejected &= self._symbols
+                    current = frozenset(self._symbols) - self._rejected
+                    added, removed = current - subscribed, subscribed - current
+                    if removed:
+                        await ws.send(self._subscribe_message("unsubscribe", removed))
+                    if added:
+                        await ws.send(self._subscribe_message("subscribe", added))
+                    subscribed = current
+                    if not self._symbols:
+                        return
+
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=1)
+                except asyncio.TimeoutError:
+                    if time.monotonic() - last_message >= self.ping_interval:
+                        await ws.send("ping")
+                        last_message = time.monotonic()
+                    continue
+
+                last_message = time.monotonic()
+                if raw == "pong":
+                    continue
+
+                message = json.loads(raw)
+                if message.get("event") == "error":
+                    # 单个交易对订阅失败（如币种下线）只移除该交易对，不影响其他交易对的推送
+                    self._stats["ws_subscribe_errors"] += 1
+                    inst_id = self._error_symbol(message, subscribed)
+                    if inst_id in subscribed:
+                        subscribed = subscribed - {inst_id}
+                        self._rejected |= {inst_id}
+                    logger.warning(f"行情订阅失败{f'（{inst_id}）' if inst_id else ''}: {message.get('msg', message)}")
+                    continue
+                if message.get("arg", {}).get("channel") == "tickers" and message.get("data"):
+                    self._stats["ws_messages"] += 1
+                    self._update(message["data"])
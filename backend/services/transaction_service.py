@@ -0,0 +1,179 @@
+"""
+交易记录服务
+负责从订单响应中提取成交价格、数量等字段，写入 Transaction 的独立列，
+读取交易记录时直接使用这些列，无需逐条解析 response JSON；
+同时提供交易记录分页游标的编解码
+"""
+import base64
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 本地校验失败（余额不足、获取价格失败等）没有交易所错误码，统一记为 ERROR
+LOCAL_ERROR_CODE = "ERROR"
+
+# 成交对账状态
+FILL_PENDING = "pending_fill"  # 已下单，等待后台对账补全成交信息
+FILL_FILLED = "filled"
+FILL_ESTIMATED = "estimated"  # 超时未查到成交，按行情估算
+FILL_CANCELED = "canceled"  # 订单被撤销且没有成交
+
+
+def _to_float(value: Any) -> Optional[float]:
+    """转换为浮点数，空值或无法解析时返回None"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def _first_order_data(order_result: Any) -> Dict:
+    """获取下单响应 data 中的第一条记录"""
+    if not isinstance(order_result, dict):
+        return {}
+    data = order_result.get('data')
+    if isinstance(data, list) and data and isinstance(data[0], dict):
+        return data[0]
+    return {}
+
+
+def load_response(response_text: Optional[str]) -> Optional[Dict]:
+    """解析 Transaction.response，无法解析时返回None"""
+    if not response_text:
+        return None
+    try:
+        response_data = json.loads(response_text)
+    except (json.JSONDecodeError, TypeError):
+        return None
+    return response_data if isinstance(response_data, dict) else None
+
+
+def extract_fill_columns(response_data: Optional[Dict], status: str) -> Dict:
+    """
+    从交易响应中提取成交列
+
+    Args:
+        response_data: 成功交易为 {"order_result": ..., "fill_details": ...}，
+                       失败交易为交易所原始响应或 {"error": ...}
+        status: 交易状态 success/failed
+
+    Returns:
+        {fill_px, fill_sz, fill_amt, ord_id, is_estimated, error_code, fill_status}
+    """
+    columns = {
+        "fill_px": None,
+        "fill_sz": None,
+        "fill_amt": None,
+        "ord_id": None,
+        "is_estimated": False,
+        "error_code": None,
+        "fill_status": None
+    }
+    if not response_data:
+        if status == "failed":
+            columns["error_code"] = LOCAL_ERROR_CODE
+        return columns
+
+    fill_data = response_data.get('fill_details')
+    if isinstance(fill_data, dict):
+        columns["fill_px"] = _to_float(fill_data.get('fillPx'))
+        columns["fill_sz"] = _to_float(fill_data.get('fillSz'))
+        columns["fill_amt"] = _to_float(fill_data.get('fillAmt'))
+        columns["ord_id"] = fill_data.get('ordId') or None
+        columns["is_estimated"] = bool(fill_data.get('estimated'))
+        if fill_data.get('canceled'):
+            columns["fill_status"] = FILL_CANCELED
+        elif columns["fill_sz"] is not None:
+            columns["fill_status"] = FILL_ESTIMATED if columns["is_estimated"] else FILL_FILLED
+
+    order_result = response_data.get('order_result', response_data)
+    order_data = _first_order_data(order_result)
+    if not columns["ord_id"]:
+        columns["ord_id"] = order_data.get('ordId') or None
+
+    if status == "failed":
+        if 'error' in response_data:
+            columns["error_code"] = LOCAL_ERROR_CODE
+        else:
+            # 批量/单笔下单失败时 sCode 比外层 code 更具体
+            s_code = order_data.get('sCode')
+            if s_code and s_code != '0':
+                columns["error_code"] = str(s_code)
+            else:
+                columns["error_code"] = str(order_result.get('code') or LOCAL_ERROR_CODE)
+
+    return columns
+
+
+def apply_fill_columns(transaction, response_data: Optional[Dict]) -> None:
+    """根据响应数据填充交易记录的成交列"""
+    for field, value in extract_fill_columns(response_data, transaction.status).items():
+        setattr(transaction, field, value)
+
+
+def resolve_trade_fields(response_text: Optional[str], direction: str, amount: Optional[float],
+                         fill_px: Optional[float], fill_sz: Optional[float]) -> Tuple[Optional[float], Optional[float]]:
+    """
+    计算交易记录展示用的成交价格和数量
+
+    优先使用成交列；缺少成交详情的旧记录才回退到解析下单响应中的字段
+    """
+    trade_price, trade_quantity = fill_px, fill_sz
+    if trade_price is not None and trade_quantity is not None:
+        return trade_price, trade_quantity
+
+    response_data = load_response(response_text)
+    order_data = _first_order_data((response_data or {}).get('order_result'))
+    if not order_data:
+        return trade_price, trade_quantity
+
+    # 尝试多种可能的字段名获取价格和数量
+    if trade_price is None:
+        for price_field in ['avgPx', 'px', 'fillPx']:
+            trade_price = _to_float(order_data.get(price_field))
+            if trade_price is not None:
+                break
+    if trade_quantity is None:
+        for size_field in ['accFillSz', 'sz', 'fillSz']:
+            trade_quantity = _to_float(order_data.get(size_field))
+            if trade_quantity is not None:
+                break
+
+    # 市价买单中 sz 表示买入金额，有价格无数量时用金额除以价格
+    if trade_price and trade_price > 0 and direction == "buy" and trade_quantity is None:
+        order_amount = _to_float(order_data.get('sz'))
+        if order_amount is not None:
+            trade_quantity = order_amount / trade_price
+
+    # 市价卖单中 sz 表示卖出数量，有数量无价格时用交易金额除以数量
+    if trade_quantity and trade_quantity > 0 and direction == "sell" and trade_price is None:
+        if order_data.get('sz') and amount is not None:
+            trade_price = float(amount) / trade_quantity
+
+    return trade_price, trade_quantity
+
+
+def encode_cursor(executed_at: datetime, transaction_id: int) -> str:
+    """将分页位置 (executed_at, id) 编码为不透明游标"""
+    raw = json.dumps([executed_at.isoformat(), transaction_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    解析分页游标
+
+    Raises:
+        ValueError: 游标格式无效
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        executed_at, transaction_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(executed_at), int(transaction_id)
+    except Exception as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
@@ -0,0 +1,9 @@
+"""
+测试公共配置：后端模块按 backend 目录为根导入（与 uvicorn 启动方式一致）
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
@@ -0,0 +1,59 @@
+"""
+缓存区域测试：异步合并计算在发起方被取消时的行为
+"""
+import asyncio
+
+import pytest
+
+from utils.cache import CacheRegion
+
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    region = CacheRegion("test", ttl=10)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"code": "0"}
+
+    async def scenario():
+        leader = asyncio.create_task(region.get_or_compute_async("key", compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(region.get_or_compute_async("key", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        assert await waiter == {"code": "0"}
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        # 计算只执行一次，结果照常写入缓存
+        assert await region.get_or_compute_async("key", compute) == {"code": "0"}
+        assert len(calls) == 1
+        assert region.get_stats()["hits"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_compute_error_is_shared_and_not_cached():
+    region = CacheRegion("test", ttl=10)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def scenario():
+        results = await asyncio.gather(
+            region.get_or_compute_async("key", compute),
+            region.get_or_compute_async("key", compute),
+            return_exceptions=True
+        )
+        assert [type(result) for result in results] == [ValueError, ValueError]
+        assert len(calls) == 1
+        with pytest.raises(ValueError):
+            await region.get_or_compute_async("key", compute)
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
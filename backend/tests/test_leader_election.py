@@ -0,0 +1,114 @@
+"""
+主进程选举测试：两个 LeaderElection 实例共用同一个临时 SQLite 文件，模拟两个工作进程
+"""
+import time
+
+import pytest
+
+from database import create_sqlite_engine
+from models import LeaderLease
+from services.leader_election import LeaderElection
+
+TTL = 1.0
+HEARTBEAT = 0.1
+
+
+def wait_until(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_sqlite_engine(f"sqlite:///{tmp_path / 'lease.db'}")
+    LeaderLease.__table__.create(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def workers(engine):
+    events = {"a": [], "b": []}
+
+    def make(name):
+        return LeaderElection(
+            engine, ttl=TTL, heartbeat=HEARTBEAT,
+            on_elected=lambda: events[name].append("elected"),
+            on_demoted=lambda: events[name].append("demoted"),
+        )
+
+    elections = {"a": make("a"), "b": make("b")}
+    yield elections, events
+    for election in elections.values():
+        election.stop()
+
+
+def start_both(elections):
+    elections["a"].start()
+    elections["b"].start()
+    assert wait_until(lambda: elections["a"].is_leader or elections["b"].is_leader)
+    leader = "a" if elections["a"].is_leader else "b"
+    return leader, "b" if leader == "a" else "a"
+
+
+def test_exactly_one_leader(workers):
+    elections, events = workers
+    leader, follower = start_both(elections)
+
+    time.sleep(TTL * 1.5)
+    assert elections[leader].is_leader and elections[leader].holds_lease()
+    assert not elections[follower].is_leader and not elections[follower].holds_lease()
+    assert wait_until(lambda: events[leader] == ["elected"])
+    assert events[follower] == []
+
+
+def test_takeover_after_stop(workers):
+    elections, events = workers
+    leader, follower = start_both(elections)
+
+    elections[leader].stop()
+    assert not elections[leader].holds_lease()
+    # 停止时释放租约，不需要等待租约过期
+    assert wait_until(lambda: elections[follower].is_leader, timeout=TTL / 2)
+    assert elections[follower].holds_lease()
+    assert wait_until(lambda: events[follower] == ["elected"])
+    assert events[leader] == ["elected", "demoted"]
+
+
+def test_takeover_after_ttl_lapse(workers, monkeypatch):
+    elections, events = workers
+    leader, follower = start_both(elections)
+
+    # 模拟主进程的数据库卡住：无法续约，租约过期后其他进程接管
+    def stalled():
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(elections[leader], "try_acquire", stalled)
+    assert wait_until(lambda: elections[follower].is_leader, timeout=TTL * 3)
+    assert elections[follower].holds_lease()
+    assert not elections[leader].is_leader
+    assert not elections[leader].holds_lease()
+    assert wait_until(lambda: events[leader] == ["elected", "demoted"])
+    assert wait_until(lambda: events[follower] == ["elected"])
+    assert elections[follower].get_stats()["current_leader"] == elections[follower].holder_id
+
+
+def test_slow_callback_does_not_block_renewal(engine):
+    # 成为主进程的回调耗时超过租约时长，心跳仍按时续约，另一个进程不会接管
+    slow = LeaderElection(engine, ttl=TTL, heartbeat=HEARTBEAT, on_elected=lambda: time.sleep(TTL * 2))
+    other = LeaderElection(engine, ttl=TTL, heartbeat=HEARTBEAT)
+    try:
+        slow.start()
+        other.start()
+        deadline = time.monotonic() + TTL * 2.5
+        while time.monotonic() < deadline:
+            assert slow.is_leader and not other.is_leader
+            time.sleep(HEARTBEAT)
+        assert slow.holds_lease()
+    finally:
+        other.stop()
+        slow.stop()
@@ -0,0 +1,177 @@
+"""
+行情推送测试：用本地 websockets.serve 替身代替OKX公共频道（通过 ws_url 指向本地地址）
+"""
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+websockets = pytest.importorskip("websockets")
+
+from services.ticker_feed import TickerFeed
+
+REJECTED = "BAD-USDT"
+
+
+def wait_until(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+class StubServer:
+    """本地公共频道替身：记录收到的订阅/退订，按订阅推送行情，拒绝 REJECTED 交易对"""
+
+    def __init__(self):
+        self.ops = []
+        self.connections = set()
+        self.url = None
+        self._loop = None
+        self._stop = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._main, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        assert self._ready.wait(5)
+        return self
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._stop.set)
+        self._thread.join(5)
+
+    def drop_connections(self):
+        """模拟服务端断开连接"""
+        for ws in list(self.connections):
+            asyncio.run_coroutine_threadsafe(ws.close(), self._loop).result(5)
+
+    def subscribed(self):
+        """按收到的订阅/退订消息计算当前订阅集合"""
+        current = set()
+        for op, inst_id in self.ops:
+            if op == "subscribe":
+                current.add(inst_id)
+            else:
+                current.discard(inst_id)
+        return current
+
+    async def _handler(self, ws):
+        self.connections.add(ws)
+        try:
+            async for raw in ws:
+                if raw == "ping":
+                    await ws.send("pong")
+                    continue
+                message = json.loads(raw)
+                for arg in message["args"]:
+                    self.ops.append((message["op"], arg["instId"]))
+                    if arg["instId"] == REJECTED:
+                        await ws.send(json.dumps({
+                            "event": "error", "code": "60018",
+                            "msg": f"Wrong URL or channel:tickers,instId:{REJECTED} doesn't exist.",
+                        }))
+                    elif message["op"] == "subscribe":
+                        await ws.send(json.dumps({"event": "subscribe", "arg": arg}))
+                        await ws.send(json.dumps({"arg": arg, "data": [{"instId": arg["instId"], "last": "100"}]}))
+        finally:
+            self.connections.discard(ws)
+
+    def _main(self):
+        async def serve():
+            self._stop = asyncio.Event()
+            async with websockets.serve(self._handler, "127.0.0.1", 0) as server:
+                port = server.sockets[0].getsockname()[1]
+                self.url = f"ws://127.0.0.1:{port}"
+                self._ready.set()
+                await self._stop.wait()
+
+        self._loop = asyncio.new_event_loop()
+        self._loop.run_until_complete(serve())
+        self._loop.close()
+
+
+@pytest.fixture
+def server():
+    stub = StubServer().start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def rest_calls():
+    return []
+
+
+@pytest.fixture
+def feed(server, rest_calls):
+    def rest_fetcher():
+        rest_calls.append(time.monotonic())
+        return {"code": "0", "data": [{"instId": "BTC-USDT", "last": "99"}, {"instId": "ETH-USDT", "last": "98"}]}
+
+    ticker_feed = TickerFeed(rest_fetcher=rest_fetcher, ws_url=server.url, poll_interval=0.05)
+    yield ticker_feed
+    ticker_feed.stop()
+
+
+def test_price_table_fills_from_pushed_tickers(server, feed):
+    feed.set_symbols(["BTC-USDT", "ETH-USDT"])
+    feed.start()
+
+    assert wait_until(lambda: not feed.get_tickers(["BTC-USDT", "ETH-USDT"])[1])
+    assert feed.get_ticker("BTC-USDT")["last"] == "100"
+    stats = feed.get_stats()
+    assert stats["mode"] == "websocket"
+    assert stats["ws_messages"] >= 2
+
+
+def test_subscription_follows_set_symbols(server, feed):
+    feed.set_symbols(["BTC-USDT", "ETH-USDT"])
+    feed.start()
+    assert wait_until(lambda: server.subscribed() == {"BTC-USDT", "ETH-USDT"})
+
+    feed.set_symbols(["ETH-USDT", "SOL-USDT"])
+    assert wait_until(lambda: server.subscribed() == {"ETH-USDT", "SOL-USDT"})
+    assert ("unsubscribe", "BTC-USDT") in server.ops
+    assert server.ops.count(("subscribe", "ETH-USDT")) == 1
+    assert wait_until(lambda: feed.get_ticker("SOL-USDT") is not None)
+    # 移出关注列表的交易对不再保留行情
+    assert feed.get_ticker("BTC-USDT") is None
+    assert feed.get_stats()["ws_connects"] == 1
+
+
+def test_rejected_symbol_is_dropped_without_reconnecting(server, feed):
+    feed.set_symbols(["BTC-USDT", REJECTED])
+    feed.start()
+
+    assert wait_until(lambda: feed.get_stats()["rejected"] == [REJECTED])
+    assert wait_until(lambda: feed.get_ticker("BTC-USDT") is not None)
+
+    # 其他交易对变化时不会重复订阅被拒绝的交易对，连接保持不变
+    feed.set_symbols(["BTC-USDT", "ETH-USDT", REJECTED])
+    assert wait_until(lambda: feed.get_ticker("ETH-USDT") is not None)
+    stats = feed.get_stats()
+    assert server.ops.count(("subscribe", REJECTED)) == 1
+    assert stats["mode"] == "websocket"
+    assert stats["ws_connects"] == 1
+    assert stats["ws_failures"] == 0
+    assert stats["ws_subscribe_errors"] == 1
+
+
+def test_falls_back_to_rest_when_socket_closes(server, feed, rest_calls):
+    feed.set_symbols(["BTC-USDT"])
+    feed.start()
+    assert wait_until(lambda: feed.get_stats()["mode"] == "websocket")
+    assert rest_calls == []
+
+    server.drop_connections()
+    assert wait_until(lambda: len(rest_calls) > 0)
+    # 回退期间REST轮询结果写入行情表，之后重新连接
+    assert wait_until(lambda: feed.get_ticker("BTC-USDT")["last"] == "99")
+    assert feed.get_stats()["ws_failures"] == 1
+    assert wait_until(lambda: feed.get_stats()["ws_connects"] >= 2)
+    assert wait_until(lambda: feed.get_stats()["mode"] == "websocket")
@@ -0,0 +1,290 @@
+"""
+统一缓存模块
+按名称划分缓存区域，每个区域有独立的有效期和容量上限（超出时淘汰最久未使用的条目）；
+未命中时同一个键只计算一次，其他并发请求等待结果（防止缓存击穿）；
+区域可以订阅失效事件（交易写入、任务修改、配置修改），事件触发时清空区域
+"""
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 失效事件
+EVENT_TRANSACTION = "transaction_recorded"  # 写入或修正了交易记录
+EVENT_PLAN = "plan_changed"  # 定投任务被创建、修改或删除
+EVENT_CONFIG = "config_changed"  # API/币种配置被修改
+
+_MISSING = object()
+
+
+class _Flight:
+    """一次进行中的计算，等待者通过 event 获取结果"""
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+def _retrieve_exception(task: "asyncio.Task") -> None:
+    """标记异步计算的异常已读取，所有等待者都已取消时不输出未读取异常的警告"""
+    if not task.cancelled():
+        task.exception()
+
+
+class CacheRegion:
+    """缓存区域（线程安全）"""
+
+    def __init__(self, name: str, ttl: float, max_size: int = 1024):
+        """
+        初始化缓存区域
+
+        Args:
+            name: 区域名称
+            ttl: 默认有效期（秒）
+            max_size: 最大条目数，超出时淘汰最久未使用的条目
+        """
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, 过期时间, 版本号)
+        self._versions = itertools.count(1)
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._async_flights: Dict[Hashable, asyncio.Task] = {}
+        # 每次失效递增；计算开始后发生过失效的结果不写入缓存，避免覆盖为旧数据
+        self._generation = 0
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0,
+                       "expirations": 0, "invalidations": 0}
+
+    def _lookup(self, key: Hashable) -> Any:
+        """查找未过期的条目并标记为最近使用（调用方持有锁）"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        value, expires_at, _ = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self._stats["expirations"] += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key: Hashable, value: Any, ttl: Optional[float]) -> None:
+        """写入条目并按容量淘汰（调用方持有锁）"""
+        self._entries[key] = (value, time.time() + (self.ttl if ttl is None else ttl), next(self._versions))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """读取缓存，未命中或已过期时返回 default"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self._stats["misses"] += 1
+                return default
+            self._stats["hits"] += 1
+            return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """读取未过期的条目，不计入命中统计、不调整淘汰顺序（供状态读取使用）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                return default
+            return entry[0]
+
+    def peek_version(self, key: Hashable) -> Optional[int]:
+        """返回未过期条目的版本号（每次写入递增，仅在本进程内有效），不计入命中统计"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                return None
+            return entry[2]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """写入缓存，ttl 为空时使用区域默认有效期"""
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generation += 1
+
+    def clear(self) -> None:
+        """清空区域（失效事件触发时调用）"""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self._stats["invalidations"] += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any], ttl: Optional[float] = None,
+                       should_cache: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        读取缓存，未命中时调用 compute 计算并写入
+
+        同一个键同时只有一个线程执行 compute，其他线程等待并共享结果（或异常）
+
+        Args:
+            key: 缓存键
+            compute: 计算函数
+            ttl: 有效期，为空时使用区域默认值
+            should_cache: 判断结果是否写入缓存（如只缓存成功的响应），为空时总是写入
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self._stats["hits"] += 1
+                return value
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._stats["misses"] += 1
+            else:
+                self._stats["coalesced"] += 1
+            generation = self._generation
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = compute()
+            flight.value = value
+            return value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if (flight.error is None and self._generation == generation
+                        and (should_cache is None or should_cache(flight.value))):
+                    self._store(key, flight.value, ttl)
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    async def get_or_compute_async(self, key: Hashable, compute: Callable[[], Awaitable[Any]],
+                                   ttl: Optional[float] = None,
+                                   should_cache: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        get_or_compute 的 asyncio 版本：同一事件循环内同一个键只执行一次 compute
+
+        compute 在独立的任务中执行，发起计算的调用方被取消（如客户端断开）时计算继续进行，
+        其他等待者照常拿到结果；与同步版本的进行中计算互不合并，两边的结果都会写入同一个缓存
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self._stats["hits"] += 1
+                return value
+            task = self._async_flights.get(key)
+            if task is None:
+                task = self._async_flights[key] = asyncio.get_running_loop().create_task(
+                    self._fill_async(key, compute, ttl, should_cache, self._generation)
+                )
+                task.add_done_callback(_retrieve_exception)
+                self._stats["misses"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        # shield：调用方被取消时不影响计算本身
+        return await asyncio.shield(task)
+
+    async def _fill_async(self, key: Hashable, compute: Callable[[], Awaitable[Any]], ttl: Optional[float],
+                          should_cache: Optional[Callable[[Any], bool]], generation: int) -> Any:
+        """执行 compute 并按条件写入缓存，结束后移除进行中的计算"""
+        try:
+            value = await compute()
+            with self._lock:
+                if self._generation == generation and (should_cache is None or should_cache(value)):
+                    self._store(key, value, ttl)
+            return value
+        finally:
+            with self._lock:
+                if self._async_flights.get(key) is asyncio.current_task():
+                    self._async_flights.pop(key, None)
+
+    def get_stats(self) -> Dict:
+        """获取区域统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            size = len(self._entries)
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        return {
+            "size": size,
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hit_rate": round(stats["hits"] / lookups, 4) if lookups else None,
+            **stats
+        }
+
+
+class CacheManager:
+    """缓存区域注册表和失效事件分发"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._regions: Dict[str, CacheRegion] = {}
+        self._subscribers: Dict[str, List[Callable[[], None]]] = {}
+        self._event_counts: Dict[str, int] = {}
+
+    def region(self, name: str, ttl: float, max_size: int = 1024,
+               invalidate_on: Iterable[str] = ()) -> CacheRegion:
+        """
+        获取或创建缓存区域
+
+        Args:
+            name: 区域名称，同名区域只创建一次
+            ttl: 默认有效期（秒）
+            max_size: 最大条目数
+            invalidate_on: 触发时清空该区域的事件
+        """
+        with self._lock:
+            region = self._regions.get(name)
+            if region is None:
+                region = self._regions[name] = CacheRegion(name, ttl, max_size)
+                for event in invalidate_on:
+                    self._subscribers.setdefault(event, []).append(region.clear)
+            return region
+
+    def subscribe(self, event: str, callback: Callable[[], None]) -> None:
+        """订阅失效事件"""
+        with self._lock:
+            self._subscribers.setdefault(event, []).append(callback)
+
+    def emit(self, event: str) -> None:
+        """触发失效事件，依次执行订阅的回调（单个回调异常不影响其他回调）"""
+        with self._lock:
+            callbacks = list(self._subscribers.get(event, ()))
+            self._event_counts[event] = self._event_counts.get(event, 0) + 1
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.exception(f"缓存失效回调异常: event={event}, {str(e)}")
+
+    def get_stats(self) -> Dict:
+        """获取全部区域统计和事件计数"""
+        with self._lock:
+            regions = dict(self._regions)
+            events = dict(self._event_counts)
+        return {
+            "regions": {name: region.get_stats() for name, region in regions.items()},
+            "events": events
+        }
+
+
+# 进程内共享的缓存注册表
+shared_caches = CacheManager()
@@ -1,19 +1,213 @@
 """
 OKX客户端工厂模块
 负责根据环境创建合适的OKX客户端实例
+
+客户端按凭证指纹缓存在进程级注册表中，重复调用会拿到同一个已预热的客户端，
+从而复用其 HTTP 连接池和响应缓存。
+代理转发接口为任意调用方的凭证创建客户端，使用单独的注册表，不会挤掉本服务自己的交易客户端。
 """
+import hashlib
 import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
 from .environment import is_local_environment
 
 logger = logging.getLogger(__name__)
 
-def create_okx_client(api_key: str, secret_key: str, passphrase: str):
-    """根据环境创建合适的OKX客户端"""
-    if is_local_environment():
-        logger.info("检测到本地环境，使用代理客户端")
+# 注册表最多保留的客户端数量（测试连接等场景可能带入临时凭证），默认读取 OKX_CLIENT_REGISTRY_SIZE 环境变量
+MAX_REGISTRY_SIZE = int(os.getenv("OKX_CLIENT_REGISTRY_SIZE", "16"))
+
+# 代理转发注册表最多保留的客户端数量，默认读取 RELAY_CLIENT_REGISTRY_SIZE 环境变量
+MAX_RELAY_REGISTRY_SIZE = int(os.getenv("RELAY_CLIENT_REGISTRY_SIZE", "64"))
+
+
+def get_credential_fingerprint(api_key: str, secret_key: str, passphrase: str, mode: str = "") -> str:
+    """计算凭证指纹，避免在注册表中以明文保存密钥作为键"""
+    raw = "\x00".join([mode, api_key or "", secret_key or "", passphrase or ""])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _build_client(local: bool, api_key: str, secret_key: str, passphrase: str):
+    """根据环境实例化客户端"""
+    if local:
+        logger.info("检测到本地环境，创建代理客户端")
         from proxy_api import OKXProxyClient
         return OKXProxyClient(api_key, secret_key, passphrase)
     else:
-        logger.info("检测到生产环境，使用直连客户端")
+        logger.info("检测到生产环境，创建直连客户端")
         from okx_api import OKXClient
-        return OKXClient(api_key, secret_key, passphrase)
\ No newline at end of file
+        return OKXClient(api_key, secret_key, passphrase)
+
+
+def _build_async_client(local: bool, api_key: str, secret_key: str, passphrase: str):
+    """根据环境实例化asyncio客户端"""
+    if local:
+        logger.info("检测到本地环境，创建异步代理客户端")
+        from proxy_api import AsyncOKXProxyClient
+        return AsyncOKXProxyClient(api_key, secret_key, passphrase)
+    else:
+        logger.info("检测到生产环境，创建异步直连客户端")
+        from okx_async_api import AsyncOKXClient
+        return AsyncOKXClient(api_key, secret_key, passphrase)
+
+
+def _in_flight(client) -> int:
+    """客户端当前在途的请求数（不统计在途请求的客户端视为0）"""
+    return getattr(client, "_in_flight", 0)
+
+
+class ClientRegistry:
+    """
+    按凭证指纹缓存客户端的LRU注册表
+
+    超出容量被淘汰或被失效的客户端可能仍有在途请求，先放入待关闭列表，
+    在途请求数降为0后再关闭（每次访问注册表时检查）
+    """
+
+    def __init__(self, name: str, max_size: int):
+        self.name = name
+        self.max_size = max_size
+        self._clients: "OrderedDict[str, object]" = OrderedDict()
+        self._retired: List[object] = []
+        self._lock = threading.Lock()
+        self._stats = {"created": 0, "reused": 0, "evicted": 0, "invalidated": 0}
+
+    def _retire(self, clients: List[object]) -> None:
+        """登记待关闭的客户端并关闭已空闲的（调用方不持有锁）"""
+        with self._lock:
+            self._retired.extend(clients)
+            idle = [client for client in self._retired if _in_flight(client) <= 0]
+            self._retired = [client for client in self._retired if _in_flight(client) > 0]
+        for client in idle:
+            try:
+                client.close()
+            except Exception as e:
+                logger.warning(f"关闭OKX客户端失败: {str(e)}")
+
+    def get_or_create(self, mode: str, builder: Callable, local: bool,
+                      api_key: str, secret_key: str, passphrase: str):
+        """从注册表获取客户端，不存在时创建并登记"""
+        fingerprint = get_credential_fingerprint(api_key, secret_key, passphrase, mode)
+
+        evicted = []
+        with self._lock:
+            client = self._clients.get(fingerprint)
+            if client is not None:
+                self._clients.move_to_end(fingerprint)
+                self._stats["reused"] += 1
+            else:
+                client = builder(local, api_key, secret_key, passphrase)
+                self._clients[fingerprint] = client
+                self._stats["created"] += 1
+
+                while len(self._clients) > self.max_size:
+                    _, old_client = self._clients.popitem(last=False)
+                    self._stats["evicted"] += 1
+                    evicted.append(old_client)
+            has_retired = bool(self._retired)
+
+        if evicted or has_retired:
+            self._retire(evicted)
+        return client
+
+    def invalidate(self, fingerprints: Optional[List[str]] = None) -> int:
+        """移除指定指纹的客户端，fingerprints 为空时清空注册表；返回移除数量"""
+        with self._lock:
+            if fingerprints is None:
+                removed = list(self._clients.values())
+                self._clients.clear()
+            else:
+                removed = [client for client in (self._clients.pop(fp, None) for fp in fingerprints)
+                           if client is not None]
+            self._stats["invalidated"] += len(removed)
+        self._retire(removed)
+        return len(removed)
+
+    def get_stats(self) -> Dict:
+        """获取注册表及各客户端的连接池、缓存统计"""
+        self._retire([])
+        with self._lock:
+            clients = list(self._clients.items())
+            stats = dict(self._stats)
+            retired = len(self._retired)
+
+        return {
+            **stats,
+            "size": len(clients),
+            "max_size": self.max_size,
+            "retired_pending_close": retired,
+            "clients": [
+                {
+                    "fingerprint": fingerprint[:12],
+                    "type": type(client).__name__,
+                    **client.get_pool_stats()
+                }
+                for fingerprint, client in clients
+            ]
+        }
+
+
+# 本服务自己使用的客户端（按当前环境选择直连或代理）
+_registry = ClientRegistry("app", MAX_REGISTRY_SIZE)
+
+# 代理转发接口为调用方创建的直连客户端
+_relay_registry = ClientRegistry("relay", MAX_RELAY_REGISTRY_SIZE)
+
+
+def create_okx_client(api_key: str, secret_key: str, passphrase: str):
+    """根据环境获取合适的OKX客户端（同一凭证复用同一个实例）"""
+    local = is_local_environment()
+    mode = "local" if local else "direct"
+    return _registry.get_or_create(mode, _build_client, local, api_key, secret_key, passphrase)
+
+
+def create_async_okx_client(api_key: str, secret_key: str, passphrase: str):
+    """根据环境获取合适的asyncio版OKX客户端（同一凭证复用同一个实例）"""
+    local = is_local_environment()
+    mode = "async-local" if local else "async-direct"
+    return _registry.get_or_create(mode, _build_async_client, local, api_key, secret_key, passphrase)
+
+
+def get_direct_okx_client(api_key: str, secret_key: str, passphrase: str):
+    """获取直连客户端（不区分环境，供代理转发接口使用，在单独的注册表中复用）"""
+    return _relay_registry.get_or_create("direct", _build_client, False, api_key, secret_key, passphrase)
+
+
+def get_direct_async_okx_client(api_key: str, secret_key: str, passphrase: str):
+    """获取asyncio版直连客户端（不区分环境，供代理转发接口使用，在单独的注册表中复用）"""
+    return _relay_registry.get_or_create("async-direct", _build_async_client, False, api_key, secret_key, passphrase)
+
+
+def invalidate_okx_clients(api_key: Optional[str] = None, secret_key: Optional[str] = None,
+                           passphrase: Optional[str] = None) -> int:
+    """
+    使注册表中的客户端失效
+
+    Args:
+        api_key/secret_key/passphrase: 指定凭证时只移除对应客户端，否则清空注册表
+
+    Returns:
+        被移除的客户端数量
+    """
+    if api_key is None:
+        removed = _registry.invalidate()
+    else:
+        removed = _registry.invalidate([
+            get_credential_fingerprint(api_key, secret_key, passphrase, mode)
+            for mode in ("local", "direct", "async-local", "async-direct")
+        ])
+    if removed:
+        logger.info(f"已失效 {removed} 个OKX客户端")
+    return removed
+
+
+def get_client_registry_stats() -> Dict:
+    """获取客户端注册表及各客户端的连接池、缓存统计"""
+    return _registry.get_stats()
+
+
+def get_relay_registry_stats() -> Dict:
+    """获取代理转发客户端注册表统计"""
+    return _relay_registry.get_stats()
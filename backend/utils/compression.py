@@ -0,0 +1,136 @@
+"""
+响应压缩中间件
+按请求头 Accept-Encoding 协商压缩算法（安装了 brotli 时优先 br，其次 gzip），
+只压缩超过阈值的一次性响应体；流式响应（如 SSE）、已编码或不可压缩的类型原样返回
+"""
+import gzip
+import os
+from typing import Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli 为可选依赖
+    brotli = None
+
+# 小于该字节数的响应不压缩，默认读取 COMPRESSION_MIN_SIZE 环境变量
+DEFAULT_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+# 可压缩的响应类型前缀
+COMPRESSIBLE_TYPES = ("application/json", "text/plain", "text/html", "text/css", "application/javascript")
+
+
+def supported_encodings() -> List[str]:
+    """服务端支持的压缩算法，按优先级排列"""
+    return (["br"] if brotli is not None else []) + ["gzip"]
+
+
+def _parse_accept_encoding(header: str) -> Dict[str, float]:
+    """解析 Accept-Encoding 为 {算法: q值}"""
+    weights: Dict[str, float] = {}
+    for item in header.split(","):
+        parts = item.strip().split(";")
+        coding = parts[0].strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+    return weights
+
+
+def negotiate_encoding(header: Optional[str]) -> Optional[str]:
+    """选择客户端接受（q>0）且服务端支持的压缩算法，同等 q 值时按服务端优先级；都不接受时返回 None"""
+    if not header:
+        return None
+    weights = _parse_accept_encoding(header)
+    best: Optional[Tuple[float, str]] = None
+    for coding in supported_encodings():
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > 0 and (best is None or q > best[0]):
+            best = (q, coding)
+    return best[1] if best else None
+
+
+def compress(body: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 4) -> bytes:
+    """
+    压缩响应体
+
+    gzip 级别 6 和 brotli 质量 4 在压缩率与CPU耗时之间折中，适合每次请求都要压缩的动态响应
+    """
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level)
+
+
+class CompressionMiddleware:
+    """协商压缩中间件（ASGI）"""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = DEFAULT_MIN_SIZE, gzip_level: int = 6,
+                 brotli_quality: int = 4):
+        """
+        Args:
+            app: 下层应用
+            minimum_size: 响应体小于该字节数时不压缩
+            gzip_level: gzip 压缩级别
+            brotli_quality: brotli 压缩质量
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                # 响应头延迟到拿到第一段响应体后再发送，以便决定是否压缩
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough or start_message is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start_message["headers"])
+            if (message.get("more_body", False)
+                    or len(body) < self.minimum_size
+                    or "content-encoding" in headers
+                    or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)):
+                # 流式响应、小响应、已编码或不可压缩的类型原样发送
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding, self.gzip_level, self.brotli_quality)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            # 压缩后的表示与原始字节不同，强 ETag 降为弱 ETag（条件请求使用弱比较，仍能命中 304）
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = "W/" + etag
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,62 @@
+"""
+条件请求模块
+根据接口数据的版本（缓存版本号、最大交易ID、行情时间戳等）计算强 ETag，
+请求头 If-None-Match 与之匹配时直接返回 304，不再计算和序列化响应体
+"""
+import hashlib
+import json
+import uuid
+from typing import Any, Optional
+
+from fastapi import Request, Response
+
+# 进程启动标识：只在本进程内有意义的版本号（如缓存写入序号）需要带上它，
+# 避免重启或请求落到其他工作进程时与旧版本号碰撞
+BOOT_ID = uuid.uuid4().hex[:12]
+
+
+def compute_etag(*parts: Any) -> str:
+    """由版本信息计算强 ETag（带引号）"""
+    raw = json.dumps(parts, separators=(',', ':'), sort_keys=True, default=str)
+    return '"' + hashlib.sha1(raw.encode('utf-8')).hexdigest()[:24] + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match 是否包含该 ETag（按 RFC 7232 使用弱比较，支持逗号分隔的多个值和 *）"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def set_etag(response: Response, etag: str) -> None:
+    """设置 ETag，并要求浏览器每次使用缓存前重新验证"""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+
+
+def conditional_response(request: Request, response: Response, *parts: Any) -> Optional[Response]:
+    """
+    处理条件请求
+
+    计算 ETag 并写入 response；客户端持有的版本仍然有效时返回 304 响应，否则返回 None，
+    由调用方继续生成响应体
+
+    Args:
+        request: 当前请求
+        response: FastAPI 注入的响应对象（用于附加响应头）
+        parts: 决定响应内容的全部版本信息
+    """
+    etag = compute_etag(*parts)
+    set_etag(response, etag)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    return None
@@ -0,0 +1,67 @@
+"""
+快速JSON序列化模块
+数据量大的接口（交易记录、资产历史、行情）直接返回 FastJSONResponse，跳过 FastAPI 默认的
+jsonable_encoder 逐层转换，由 orjson 一次序列化为字节；未安装 orjson 时退回标准库 json。
+输出与默认序列化保持一致：datetime 为 isoformat 字符串、浮点数为最短表示、中文不转义
+"""
+import json
+from decimal import Decimal
+from typing import Any, Mapping, Optional
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson 为可选依赖
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """orjson 不支持的类型：Decimal 与 jsonable_encoder 一样转为浮点数，其余交给 jsonable_encoder"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    return jsonable_encoder(obj)
+
+
+def dumps(content: Any) -> bytes:
+    """序列化为 UTF-8 编码的 JSON 字节"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def backend_name() -> str:
+    """当前使用的序列化实现"""
+    return "orjson" if orjson is not None else "json"
+
+
+class FastJSONResponse(JSONResponse):
+    """使用 dumps 序列化的 JSON 响应"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def fast_json_response(content: Any, response: Optional[Response] = None,
+                       headers: Optional[Mapping[str, str]] = None) -> FastJSONResponse:
+    """
+    生成快速JSON响应
+
+    接口直接返回 Response 时，FastAPI 不会合并注入的 response 上设置的响应头（ETag、X-Next-Cursor 等），
+    这里一并带上
+
+    Args:
+        content: 响应内容
+        response: FastAPI 注入的响应对象
+        headers: 额外的响应头
+    """
+    merged = {}
+    if response is not None:
+        merged.update((key, value) for key, value in response.headers.items() if key != "content-length")
+    if headers:
+        merged.update(headers)
+    return FastJSONResponse(content, headers=merged)
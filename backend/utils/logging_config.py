@@ -0,0 +1,105 @@
+"""
+日志配置模块
+请求线程只把日志记录放入内存队列，由后台线程统一写入控制台和按大小轮转的 JSON-lines 文件；
+大体量的接口响应写入独立的 payload 通道，只在 DEBUG 级别开启且按比例采样
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Optional
+
+# 接口响应等大体量内容的日志通道
+PAYLOAD_LOGGER_NAME = "dca-service.payload"
+
+CONSOLE_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener: Optional[QueueListener] = None
+_payload_sample_rate = 1.0
+
+
+class JsonLineFormatter(logging.Formatter):
+    """每条日志输出为一行紧凑JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+
+
+def setup_logging(log_file: str, level: Optional[str] = None) -> QueueListener:
+    """
+    配置队列化日志，重复调用时直接返回已启动的监听器
+
+    环境变量:
+        LOG_LEVEL: 根日志级别，默认 INFO
+        LOG_MAX_BYTES / LOG_BACKUP_COUNT: 日志文件轮转大小（默认10MB）和保留份数（默认5）
+        LOG_PAYLOAD_LEVEL: payload 通道级别，默认 WARNING（即关闭），设为 DEBUG 开启
+        LOG_PAYLOAD_SAMPLE_RATE: payload 通道采样比例，默认 0.1
+    """
+    global _listener, _payload_sample_rate
+    if _listener is not None:
+        return _listener
+
+    level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+
+    file_handler = RotatingFileHandler(
+        log_file,
+        maxBytes=int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+        backupCount=int(os.getenv('LOG_BACKUP_COUNT', '5')),
+        encoding='utf-8'
+    )
+    file_handler.setFormatter(JsonLineFormatter())
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level)
+
+    payload_logger = logging.getLogger(PAYLOAD_LOGGER_NAME)
+    payload_logger.setLevel(os.getenv('LOG_PAYLOAD_LEVEL', 'WARNING').upper())
+    _payload_sample_rate = float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', '0.1'))
+
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """停止后台写日志线程，刷出队列中剩余的记录"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def log_payload(message: str, payload: Any) -> None:
+    """
+    按采样比例记录接口响应等大体量内容
+
+    payload 通道未开启或未被采样时直接返回，不会序列化 payload
+    """
+    payload_logger = logging.getLogger(PAYLOAD_LOGGER_NAME)
+    if not payload_logger.isEnabledFor(logging.DEBUG):
+        return
+    if _payload_sample_rate < 1 and random.random() >= _payload_sample_rate:
+        return
+    payload_logger.debug("%s: %s", message, payload)
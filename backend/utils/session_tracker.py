@@ -0,0 +1,146 @@
+"""
+数据库会话追踪模块（调试用）
+开启 DB_SESSION_TRACKING 后，SessionLocal 创建的会话会登记创建时间和调用位置，
+关闭时注销；未关闭就被回收的会话计为泄漏，可通过 /api/debug/db 查看当前未关闭的会话
+"""
+import logging
+import os
+import sys
+import threading
+import time
+import weakref
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# 查找调用位置时跳过的模块（会话工厂、SQLAlchemy 和 FastAPI 依赖注入本身）
+_SKIP_PATH_PARTS = (
+    os.sep + "sqlalchemy" + os.sep,
+    os.sep + "fastapi" + os.sep,
+    os.sep + "starlette" + os.sep,
+    os.sep + "contextlib.py",
+    os.path.abspath(__file__),
+)
+
+
+def _find_call_site() -> str:
+    """返回打开会话的业务代码位置（文件:行号 函数名）"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not any(part in filename for part in _SKIP_PATH_PARTS):
+            return f"{os.path.basename(filename)}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+class SessionTracker:
+    """会话追踪器"""
+
+    def __init__(self, leak_warning_age: Optional[float] = None):
+        """
+        初始化会话追踪器
+
+        Args:
+            leak_warning_age: 会话存活超过该时长（秒）视为疑似泄漏，默认读取 DB_SESSION_LEAK_AGE 环境变量，未设置时为60
+        """
+        self.leak_warning_age = (
+            leak_warning_age if leak_warning_age is not None
+            else float(os.getenv("DB_SESSION_LEAK_AGE", "60"))
+        )
+        self._lock = threading.Lock()
+        self._active: Dict[int, Dict] = {}
+        self._stats = {"opened": 0, "closed": 0, "leaked": 0}
+        self._leak_sites: Dict[str, int] = {}
+
+    def register(self, session: Session, site: Optional[str] = None) -> None:
+        """
+        登记新创建的会话
+
+        Args:
+            session: 会话
+            site: 打开位置，为空时从调用栈查找
+        """
+        key = id(session)
+        info = {
+            "site": site or _find_call_site(),
+            "thread": threading.current_thread().name,
+            "opened_at": time.time(),
+        }
+        with self._lock:
+            self._active[key] = info
+            self._stats["opened"] += 1
+        # 会话未关闭就被回收时，finalizer 负责注销并计为泄漏
+        info["finalizer"] = weakref.finalize(session, self._collected, key)
+
+    def release(self, session: Session) -> None:
+        """会话关闭时注销"""
+        with self._lock:
+            info = self._active.pop(id(session), None)
+            if info is None:
+                return
+            self._stats["closed"] += 1
+        info["finalizer"].detach()
+
+    def _collected(self, key: int) -> None:
+        with self._lock:
+            info = self._active.pop(key, None)
+            if info is None:
+                return
+            self._stats["leaked"] += 1
+            self._leak_sites[info["site"]] = self._leak_sites.get(info["site"], 0) + 1
+        logger.warning(f"数据库会话未关闭即被回收: {info['site']}")
+
+    def get_stats(self, limit: int = 20) -> Dict:
+        """
+        获取会话统计
+
+        Args:
+            limit: 返回存活时间最长的会话数量
+        """
+        now = time.time()
+        with self._lock:
+            active = list(self._active.values())
+            stats = dict(self._stats)
+            leak_sites = dict(self._leak_sites)
+
+        by_site: Dict[str, int] = {}
+        for info in active:
+            by_site[info["site"]] = by_site.get(info["site"], 0) + 1
+        oldest: List[Dict] = [
+            {"site": info["site"], "thread": info["thread"], "age": round(now - info["opened_at"], 3)}
+            for info in sorted(active, key=lambda item: item["opened_at"])[:limit]
+        ]
+        return {
+            "enabled": True,
+            "active": len(active),
+            "suspected_leaks": sum(1 for info in active if now - info["opened_at"] > self.leak_warning_age),
+            "leak_warning_age": self.leak_warning_age,
+            "active_by_site": by_site,
+            "leaked_by_site": leak_sites,
+            "oldest": oldest,
+            **stats
+        }
+
+
+class TrackedSession(Session):
+    """
+    创建和关闭时通知追踪器的会话
+
+    追踪器通过 sessionmaker 的 info 参数传入；创建会话时可在 info 中传入 site 指定打开位置（如请求路径）
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._tracker: Optional[SessionTracker] = self.info.get("tracker")
+        if self._tracker is not None:
+            self._tracker.register(self, self.info.get("site"))
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            if self._tracker is not None:
+                self._tracker.release(self)
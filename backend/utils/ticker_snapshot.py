@@ -0,0 +1,180 @@
+"""
+行情快照模块
+将 market/tickers 的全量响应解析一次，建立 instId -> 行情 的哈希索引，
+供行情中心、资产估值和热门币种等多个读取方共享
+"""
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 需要转换为浮点数的行情字段；缺失时按0处理，sodUtc8 缺失时保留None由调用方回退到sodUtc0
+FLOAT_FIELDS = ('last', 'sodUtc0', 'volCcy24h', 'vol24h', 'high24h', 'low24h')
+
+
+class TickerSnapshotError(Exception):
+    """行情快照获取失败"""
+    pass
+
+
+def parse_ticker(raw: Dict) -> Dict:
+    """
+    解析单条原始行情，数值字段统一转换为浮点数
+
+    Raises:
+        ValueError/TypeError: 数值字段无法解析
+    """
+    parsed = {'instId': raw.get('instId', ''), 'ts': raw.get('ts', '')}
+    for field in FLOAT_FIELDS:
+        parsed[field] = float(raw.get(field, 0))
+    sod_utc8 = raw.get('sodUtc8')
+    parsed['sodUtc8'] = float(sod_utc8) if sod_utc8 is not None else None
+    return parsed
+
+
+class TickerSnapshot:
+    """某一时刻的全量行情快照（只读）"""
+
+    def __init__(self, raw_tickers: Iterable[Dict], fetched_at: Optional[float] = None):
+        self.fetched_at = fetched_at if fetched_at is not None else time.time()
+        self._index: Dict[str, Dict] = {}
+        self._usdt_ranking: Optional[List[str]] = None
+
+        for raw in raw_tickers:
+            try:
+                parsed = parse_ticker(raw)
+            except (ValueError, TypeError) as e:
+                logger.warning(f"解析 {raw.get('instId', '')} 行情数据失败: {e}")
+                continue
+            self._index[parsed['instId']] = parsed
+
+    @classmethod
+    def from_result(cls, result: Dict) -> "TickerSnapshot":
+        """从 get_tickers 接口响应构建快照"""
+        if result.get('code') != '0':
+            raise TickerSnapshotError(result.get('msg', '未知错误'))
+        return cls(result.get('data', []))
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, inst_id: str) -> bool:
+        return inst_id in self._index
+
+    def age(self) -> float:
+        """快照已存在的秒数"""
+        return time.time() - self.fetched_at
+
+    def get(self, inst_id: str) -> Optional[Dict]:
+        """按 instId 获取解析后的行情"""
+        return self._index.get(inst_id)
+
+    def lookup(self, inst_ids: Iterable[str]) -> Dict[str, Dict]:
+        """批量查找，只返回存在的交易对"""
+        index = self._index
+        return {inst_id: index[inst_id] for inst_id in inst_ids if inst_id in index}
+
+    def top_by_usdt_volume(self, limit: int = 100) -> List[str]:
+        """按24小时USDT成交额排序的USDT交易对（排序结果在快照内缓存）"""
+        if self._usdt_ranking is None:
+            usdt_pairs = [
+                (ticker['vol24h'] * ticker['last'], inst_id)
+                for inst_id, ticker in self._index.items()
+                if inst_id.endswith('-USDT')
+            ]
+            usdt_pairs.sort(key=lambda pair: pair[0], reverse=True)
+            self._usdt_ranking = [inst_id for _, inst_id in usdt_pairs]
+        return self._usdt_ranking[:limit]
+
+
+class TickerSnapshotStore:
+    """保存最新行情快照，在新鲜度窗口内复用，过期时只由一个线程负责刷新"""
+
+    def __init__(self, max_age: Optional[float] = None):
+        """
+        Args:
+            max_age: 快照新鲜度窗口（秒），默认读取 TICKER_SNAPSHOT_MAX_AGE 环境变量，未设置时为60秒
+        """
+        if max_age is None:
+            max_age = float(os.getenv('TICKER_SNAPSHOT_MAX_AGE', '60'))
+        self.max_age = max_age
+        self._snapshot: Optional[TickerSnapshot] = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stats = {"hits": 0, "refreshes": 0, "failures": 0}
+
+    def peek(self) -> Optional[TickerSnapshot]:
+        """返回新鲜的快照，不触发刷新"""
+        with self._lock:
+            snapshot = self._snapshot
+        if snapshot is not None and snapshot.age() < self.max_age:
+            return snapshot
+        return None
+
+    def update(self, result: Dict) -> TickerSnapshot:
+        """用一次 get_tickers 响应替换当前快照"""
+        try:
+            snapshot = TickerSnapshot.from_result(result)
+        except TickerSnapshotError:
+            self._stats["failures"] += 1
+            raise
+        with self._lock:
+            self._snapshot = snapshot
+        self._stats["refreshes"] += 1
+        return snapshot
+
+    def get(self, fetcher: Callable[[], Dict]) -> TickerSnapshot:
+        """
+        获取新鲜快照，过期时调用 fetcher 刷新
+
+        Raises:
+            TickerSnapshotError: 刷新失败
+        """
+        snapshot = self.peek()
+        if snapshot is not None:
+            self._stats["hits"] += 1
+            return snapshot
+
+        with self._refresh_lock:
+            # 等待期间可能已由其他线程刷新
+            snapshot = self.peek()
+            if snapshot is not None:
+                self._stats["hits"] += 1
+                return snapshot
+            return self.update(fetcher())
+
+    async def get_async(self, fetcher) -> TickerSnapshot:
+        """
+        获取新鲜快照（asyncio版本），fetcher 为返回 get_tickers 响应的协程函数
+
+        Raises:
+            TickerSnapshotError: 刷新失败
+        """
+        snapshot = self.peek()
+        if snapshot is not None:
+            self._stats["hits"] += 1
+            return snapshot
+        return self.update(await fetcher())
+
+    def invalidate(self) -> None:
+        """丢弃当前快照"""
+        with self._lock:
+            self._snapshot = None
+
+    def get_stats(self) -> Dict:
+        """获取快照状态"""
+        with self._lock:
+            snapshot = self._snapshot
+        return {
+            "max_age": self.max_age,
+            "size": len(snapshot) if snapshot else 0,
+            "age_seconds": round(snapshot.age(), 1) if snapshot else None,
+            **self._stats
+        }
+
+
+# 进程内共享的全量现货行情快照
+shared_ticker_snapshots = TickerSnapshotStore()
@@ -73,6 +73,13 @@ export const assetApi = {
       ...options
     });
   },
+  // 获取资产时间序列（window: 1d/7d/30d/1y/all，后端按窗口自动选择精度）
+  getSeries: (window = '30d', maxPoints = 300, options = {}) => {
+    return api.get('/assets/series', {
+      params: { window, max_points: maxPoints },
+      ...options
+    });
+  },
 };
 
 // 账户相关 API
@@ -93,4 +100,16 @@ export const marketApi = {
   getTickers: () => api.get('/market/tickers'),
 };
 
+// 实时事件推送（SSE），浏览器断线后会自动带 Last-Event-ID 重连
+export const streamApi = {
+  // handlers: { snapshot, tickers, assets, execution, transactions_changed }
+  connect: (handlers) => {
+    const source = new EventSource(`${API_BASE_URL}/stream`);
+    Object.entries(handlers).forEach(([type, handler]) => {
+      source.addEventListener(type, (event) => handler(JSON.parse(event.data)));
+    });
+    return source;
+  },
+};
+
 export default api;